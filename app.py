@@ -6,19 +6,43 @@ import threading
 import queue
 import time
 import uuid
+import collections
 import shutil
 import base64
 import gzip
+import hashlib
+import io
+import re
+import sqlite3
+import mimetypes
+import struct
+import tempfile
 import numpy as np
-from io import BytesIO
-from flask import Flask, render_template, request, jsonify, send_from_directory, Response
+from flask import Flask, render_template, request, jsonify, send_from_directory, send_file, Response, abort
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-from PIL import Image
+from PIL import Image, ImageOps, features
 from plyfile import PlyData
 
+# 可选: brotli / zstd 预压缩 (pip install brotli zstandard)，未安装时只生成 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+# 可选: Pillow 未编译 littlecms 时输入预处理不做色彩空间转换
+try:
+    from PIL import ImageCms
+except ImportError:
+    ImageCms = None
+
 # --- 配置 ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CONFIG_FILE = os.path.join(BASE_DIR, 'config.json')
+# 配置文件路径，可用 SHARP_CONFIG 环境变量覆盖 (测试使用临时工作目录)
+CONFIG_FILE = os.environ.get('SHARP_CONFIG', os.path.join(BASE_DIR, 'config.json'))
 app = Flask(__name__, template_folder=os.path.join(BASE_DIR, 'templates'))
 
 # 前端模式: "react" 或 "legacy"
@@ -81,72 +105,1193 @@ app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 app.config['THUMBNAIL_FOLDER'] = THUMBNAIL_FOLDER
 
 
+THUMBNAIL_SIZE = 40  # 1x 短边，对应图库中 40×40 的缩略图位 (object-fit: cover)
+THUMBNAIL_SCALES = (1, 2, 3)  # 按设备像素比选择 (srcset x 描述符)
+THUMBNAIL_VERSION_FILE = os.path.join(THUMBNAIL_FOLDER, '.version')  # 记录生成缩略图时的尺寸，变化后全部重新生成
+THUMBNAIL_QUALITY = 80
+# 缩略图格式 (扩展名, PIL 格式, MIME)，首选格式在前；WebP 不可用时只生成 JPEG
+THUMBNAIL_FORMATS = (('.jpg', 'JPEG', 'image/jpeg'),)
+if features.check('webp'):
+    THUMBNAIL_FORMATS = (('.webp', 'WEBP', 'image/webp'),) + THUMBNAIL_FORMATS
+THUMBNAIL_WORKERS = max(1, int(config.get('thumbnail_workers', 2)))
+# 缩略图在后台线程池中生成，不阻塞上传请求；排队中的原图文件名记录在 thumbnail_pending
+thumbnail_queue = queue.Queue()
+thumbnail_pending = set()
+thumbnail_lock = threading.Lock()
+
+
+def thumbnail_name(name_without_ext, scale, ext):
+    """缩略图文件名: name.webp、name@2x.webp、name@3x.jpg ..."""
+    suffix = '' if scale == 1 else f'@{scale}x'
+    return f'{name_without_ext}{suffix}{ext}'
+
+
+def thumbnail_sizes(src_width, src_height):
+    """各倍数缩略图的尺寸: 短边为 THUMBNAIL_SIZE × 倍数，保持宽高比；原图短边不足时不生成更高倍数 (1x 始终生成)"""
+    short_edge = min(src_width, src_height)
+    sizes = {}
+    for scale in THUMBNAIL_SCALES:
+        edge = THUMBNAIL_SIZE * scale
+        if scale > 1 and edge > short_edge:
+            continue
+        ratio = edge / short_edge
+        sizes[scale] = (max(1, round(src_width * ratio)), max(1, round(src_height * ratio)))
+    return sizes
+
+
+def invalidate_stale_thumbnails():
+    """缩略图尺寸变化后 (升级) 删除旧缩略图，由 backfill_thumbnails 按新尺寸重新生成"""
+    try:
+        with open(THUMBNAIL_VERSION_FILE) as f:
+            if f.read().strip() == str(THUMBNAIL_SIZE):
+                return
+    except OSError:
+        pass
+    removed = 0
+    with os.scandir(THUMBNAIL_FOLDER) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.path != THUMBNAIL_VERSION_FILE:
+                os.remove(entry.path)
+                removed += 1
+    with open(THUMBNAIL_VERSION_FILE, 'w') as f:
+        f.write(str(THUMBNAIL_SIZE))
+    if removed:
+        print(f"🖼️ Thumbnail size changed, removed {removed} old thumbnails")
+
+
 def generate_thumbnail(input_path, filename):
-    """生成缩略图 (200px 宽度, JPEG 80% 质量)"""
+    """生成 1x/2x/3x 缩略图 (1x 短边 40px)，每个尺寸各一份 WebP 和 JPEG
+
+    原图短边不足时不生成更高倍数 (1x 始终生成)。只解码一次:
+    JPEG 通过 draft 模式让解码器直接输出 1/2、1/4 或 1/8 尺寸，不完整解码大图；
+    其他格式先用 reduce 整数倍缩小，再做 LANCZOS。
+    首选格式的 1x 最后写入，它存在即表示整组缩略图已生成
+    """
+    name_without_ext = os.path.splitext(filename)[0]
     try:
-        thumb_path = os.path.join(THUMBNAIL_FOLDER, os.path.splitext(filename)[0] + '.jpg')
         with Image.open(input_path) as img:
+            # 计算各尺寸 (draft 会改变 img.size，需先计算)
+            sizes = thumbnail_sizes(*img.size)
+            img.draft('RGB', sizes[max(sizes)])
             # 转换为 RGB (处理 PNG 透明度)
-            if img.mode in ('RGBA', 'P'):
+            if img.mode != 'RGB':
                 img = img.convert('RGB')
-            # 计算缩放比例
-            width = 200
-            ratio = width / img.width
-            height = int(img.height * ratio)
-            # 生成缩略图
-            img_resized = img.resize((width, height), Image.LANCZOS)
-            img_resized.save(thumb_path, 'JPEG', quality=80)
+            # 原图变小后 (同名重新上传) 删除不再生成的高倍缩略图
+            for scale in THUMBNAIL_SCALES:
+                if scale not in sizes:
+                    for ext, _, _ in THUMBNAIL_FORMATS:
+                        try:
+                            os.remove(os.path.join(THUMBNAIL_FOLDER, thumbnail_name(name_without_ext, scale, ext)))
+                        except OSError:
+                            pass
+            # 从大到小逐级缩小，每个文件写完后再替换，图库不会读到不完整的文件
+            resized = img
+            for scale in sorted(sizes, reverse=True):
+                resized = resized.resize(sizes[scale], Image.LANCZOS, reducing_gap=2.0)
+                for ext, image_format, _ in reversed(THUMBNAIL_FORMATS):
+                    thumb_path = os.path.join(THUMBNAIL_FOLDER, thumbnail_name(name_without_ext, scale, ext))
+                    tmp_path = thumb_path + '.tmp'
+                    try:
+                        resized.save(tmp_path, image_format, quality=THUMBNAIL_QUALITY)
+                        os.replace(tmp_path, thumb_path)
+                    finally:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)  # 保存失败时不留下不完整的文件
         return thumb_path
     except Exception as e:
         print(f"⚠️ Thumbnail generation failed for {filename}: {e}")
         return None
 
 
+def schedule_thumbnail(input_path, filename):
+    """把原图加入缩略图队列 (同一文件排队中时不重复加入)"""
+    with thumbnail_lock:
+        if filename in thumbnail_pending:
+            return
+        thumbnail_pending.add(filename)
+    thumbnail_queue.put((input_path, filename))
+
+
+def thumbnail_worker():
+    """缩略图线程: 生成后更新图库中对应的条目 (模型已生成时)"""
+    while True:
+        input_path, filename = thumbnail_queue.get()
+        try:
+            thumb_path = generate_thumbnail(input_path, filename)
+        finally:
+            with thumbnail_lock:
+                thumbnail_pending.discard(filename)
+        if thumb_path:
+            try:
+                refresh_gallery_thumbnail(os.path.splitext(filename)[0])
+            except Exception as e:
+                print(f"⚠️ Gallery update failed for {filename}: {e}")
+
+
+def backfill_thumbnails():
+    """为缺少缩略图的输入图片补生成缩略图 (如手动拷贝到 inputs/ 的图片)"""
+    try:
+        thumbs = set(os.listdir(THUMBNAIL_FOLDER))
+        with os.scandir(INPUT_FOLDER) as entries:
+            missing = [
+                entry for entry in entries
+                if os.path.splitext(entry.name)[1] in GALLERY_IMAGE_EXTS
+                and thumbnail_name(os.path.splitext(entry.name)[0], 1, THUMBNAIL_FORMATS[0][0]) not in thumbs
+                and entry.is_file()
+            ]
+    except OSError:
+        return
+    if missing:
+        print(f"🖼️ Backfilling {len(missing)} missing thumbnails")
+    for entry in missing:
+        schedule_thumbnail(entry.path, entry.name)
+
+
+# .splat 每点布局 (32 bytes): position 3×f4 | scales 3×f4 | RGBA 4×u1 | rotation 4×u1
+SPLAT_DTYPE = np.dtype([
+    ('position', '<f4', (3,)),
+    ('scale', '<f4', (3,)),
+    ('color', 'u1', (4,)),
+    ('rot', 'u1', (4,)),
+])
+SH_C0 = 0.28209479177387814  # 球谐函数 0 阶系数
+
+# LOD 等级 (点数上限): lod=0 最粗，lod=len(SPLAT_LOD_POINTS) 为完整模型
+SPLAT_LOD_POINTS = (100_000, 500_000)
+
+# 分块转换: 点数超过阈值的二进制 PLY 按 SPLAT_CHUNK_POINTS 分段处理，内存占用与点数无关
+SPLAT_CHUNK_POINTS = 1 << 19
+SPLAT_CHUNKED_MIN_POINTS = int(config.get('splat_chunked_min_points', 2_000_000))
+
+
+def splat_importance_key(vert):
+    """重要性排序键 (越小越重要: 大且不透明的点优先)"""
+    return (
+        -np.exp(vert["scale_0"] + vert["scale_1"] + vert["scale_2"])
+        / (1 + np.exp(-vert["opacity"]))
+    )
+
+
+def splat_importance_order(vert):
+    """按重要性排序的顶点索引"""
+    return np.argsort(splat_importance_key(vert))
+
+
+def pack_splats(vert, indices):
+    """把 indices 指定的顶点批量打包为 SPLAT_DTYPE 结构化数组
+
+    vert 可以是 PlyElement 或任意按字段名取列的结构化数组 (含 memmap)。
+    颜色按逐点实现的方式用 float64 计算 (exp 仍为 float32)，其余保持 float32，
+    在 NumPy 1.x 和 2.x 上输出都与逐点实现逐字节一致。
+    """
+    def column(name):
+        return np.asarray(vert[name][indices], dtype=np.float32)
+
+    out = np.empty(len(indices), dtype=SPLAT_DTYPE)
+
+    # Position: 3 × float32 = 12 bytes
+    position = out['position']
+    for i, name in enumerate(('x', 'y', 'z')):
+        position[:, i] = column(name)
+
+    # Scales: 3 × float32 = 12 bytes (已经是 exp 形式)
+    scale = out['scale']
+    for i in range(3):
+        scale[:, i] = np.exp(column(f"scale_{i}"))
+
+    # Color + Opacity: 4 × uint8 = 4 bytes
+    color = np.empty((len(indices), 4), dtype=np.float64)
+    for i in range(3):
+        color[:, i] = 0.5 + SH_C0 * column(f"f_dc_{i}").astype(np.float64)
+    color[:, 3] = 1 / (1 + np.exp(-column("opacity")).astype(np.float64))
+    out['color'] = (color * 255).clip(0, 255).astype(np.uint8)
+
+    # Rotation quaternion: 4 × uint8 = 4 bytes (normalized)
+    rot = np.stack([column(f"rot_{i}") for i in range(4)], axis=1)
+    # 逐行 dot (与 np.linalg.norm 对单个四元数的计算路径一致, 保证舍入相同)
+    norm = np.sqrt(np.matmul(rot[:, None, :], rot[:, :, None])[:, 0, 0])
+    rot = (rot / norm[:, None]) * 128 + 128
+    out['rot'] = rot.clip(0, 255).astype(np.uint8)
+
+    return out
+
+
+# PLY 标量类型 → NumPy dtype
+PLY_PROPERTY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+PLY_BYTE_ORDERS = {b'binary_little_endian': '<', b'binary_big_endian': '>'}
+
+
+def mmap_ply_vertices(ply_path):
+    """解析 PLY 头部，把 vertex 数据块映射为只读结构化数组 (零拷贝)
+
+    仅支持二进制格式且 vertex 之前的元素均为定长属性；
+    ASCII、list 属性等其它布局返回 None，由调用方回退到 plyfile。
+    """
+    elements = []  # [(name, count, [(property, type), ...]), ...]
+    byte_order = None
+    with open(ply_path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            return None
+        while True:
+            line = f.readline()
+            if not line:
+                return None
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == b'format':
+                byte_order = PLY_BYTE_ORDERS.get(tokens[1])
+            elif tokens[0] == b'element':
+                elements.append((tokens[1].decode('ascii'), int(tokens[2]), []))
+            elif tokens[0] == b'property':
+                prop_type = PLY_PROPERTY_TYPES.get(tokens[1].decode('ascii'))
+                if not elements or prop_type is None:
+                    return None  # list 属性或未知类型
+                elements[-1][2].append((tokens[2].decode('ascii'), prop_type))
+            elif tokens[0] == b'end_header':
+                break
+        offset = f.tell()
+        file_size = os.fstat(f.fileno()).st_size
+
+    if byte_order is None:
+        return None
+    for name, count, props in elements:
+        dtype = np.dtype([(prop, byte_order + prop_type) for prop, prop_type in props])
+        if name == 'vertex':
+            if count == 0 or offset + dtype.itemsize * count > file_size:
+                return None
+            return np.memmap(ply_path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+        offset += dtype.itemsize * count
+    return None
+
+
+def read_ply_vertices(ply_path):
+    """读取 PLY 顶点为结构化数组: 二进制优先 memmap，其它格式回退到 plyfile"""
+    vertices = mmap_ply_vertices(ply_path)
+    if vertices is None:
+        vertices = PlyData.read(ply_path)["vertex"].data
+    return vertices
+
+
+KEY_BINS = 1 << 16  # 分桶直方图的区间数 (取排序键的 16 位)
+
+
+def sortable_key_bits(keys):
+    """float32 键映射为按数值单调递增的 uint32 (-0.0 与 0.0 视为相同)"""
+    bits = (np.asarray(keys, dtype=np.float32) + np.float32(0)).view(np.uint32)
+    return bits ^ np.where(bits >> 31, np.uint32(0xFFFFFFFF), np.uint32(0x80000000))
+
+
+def read_key_chunks(keys, source, chunk_points):
+    """逐块产出 (索引, 键)；source 为 None 时按顺序读取全部 keys，否则读取 source 中的索引"""
+    total = len(keys) if source is None else len(source)
+    for start in range(0, total, chunk_points):
+        if source is None:
+            chunk_keys = np.asarray(keys[start:start + chunk_points])
+            yield np.arange(start, start + len(chunk_keys), dtype=np.int64), chunk_keys
+        else:
+            idx = np.asarray(source[start:start + chunk_points])
+            yield idx, np.asarray(keys[idx])
+
+
+def scatter_by_key_bins(keys, source, dest, shift, chunk_points):
+    """按排序键的某 16 位把索引稳定地分桶写入 dest，返回各桶在 dest 中的 [(起点, 终点)]
+
+    第一遍统计直方图，把相邻区间合并为不超过 chunk_points 个点的桶 (单个区间超过时独占一桶)；
+    第二遍把每块的索引按桶号稳定排序后写到各桶的游标处，桶内保持原索引顺序。
+    """
+    counts = np.zeros(KEY_BINS, dtype=np.int64)
+    for _, chunk_keys in read_key_chunks(keys, source, chunk_points):
+        bins = (sortable_key_bits(chunk_keys) >> shift) & (KEY_BINS - 1)
+        counts += np.bincount(bins, minlength=KEY_BINS)
+
+    bucket_of = np.empty(KEY_BINS, dtype=np.int64)
+    sizes = []
+    filled = 0
+    for b, count in enumerate(counts.tolist()):
+        if filled and filled + count > chunk_points:
+            sizes.append(filled)
+            filled = 0
+        bucket_of[b] = len(sizes)
+        filled += count
+    sizes.append(filled)
+    ends = np.cumsum(sizes)
+    cursors = ends - sizes
+
+    for idx, chunk_keys in read_key_chunks(keys, source, chunk_points):
+        buckets = bucket_of[(sortable_key_bits(chunk_keys) >> shift) & (KEY_BINS - 1)]
+        order = np.argsort(buckets, kind='stable')
+        buckets = buckets[order]
+        present, first, count = np.unique(buckets, return_index=True, return_counts=True)
+        rank = np.arange(len(buckets)) - np.repeat(first, count)
+        dest[cursors[buckets] + rank] = idx[order]
+        cursors[present] += count
+    return [(int(end - size), int(end)) for end, size in zip(ends, sizes) if size]
+
+
+def iter_importance_bands(keys, chunk_points=SPLAT_CHUNK_POINTS, scratch_dir=None):
+    """按重要性顺序逐段产出顶点索引，每段不超过 chunk_points 个点
+
+    keys (可为磁盘 memmap) 顺序读取两遍，按排序键的高 16 位分桶 (scatter_by_key_bins)，
+    各桶的索引写入磁盘临时数组；之后逐桶读取键、按 (key, index) 排序产出，总 I/O 为 O(N)。
+    高 16 位相同的点过多时按低 16 位在桶内再分一次；仍然过多的桶键完全相同，已按索引有序。
+    scratch_dir 为 None 时临时数组放在内存中。
+    """
+    total = len(keys)
+    scratch_files = []
+
+    def scratch(count):
+        if scratch_dir is None:
+            return np.empty(count, dtype=np.int64)
+        scratch_files.append(tempfile.TemporaryFile(dir=scratch_dir))
+        return np.memmap(scratch_files[-1], dtype=np.int64, mode='w+', shape=(count,))
+
+    def sorted_band(idx):
+        idx = np.array(idx)
+        return idx[np.lexsort((idx, np.asarray(keys[idx])))]
+
+    if not total:
+        return
+    try:
+        order = scratch(total)
+        for start, end in scatter_by_key_bins(keys, None, order, 16, chunk_points):
+            if end - start <= chunk_points:
+                yield sorted_band(order[start:end])
+                continue
+            sub = scratch(end - start)
+            for sub_start, sub_end in scatter_by_key_bins(keys, order[start:end], sub, 0, chunk_points):
+                if sub_end - sub_start <= chunk_points:
+                    yield sorted_band(sub[sub_start:sub_end])
+                    continue
+                for i in range(sub_start, sub_end, chunk_points):
+                    yield np.array(sub[i:min(i + chunk_points, sub_end)])
+            del sub
+            if scratch_files:
+                scratch_files.pop().close()
+        del order
+    finally:
+        for f in scratch_files:
+            f.close()
+
+
+def write_splat_chunked(vert, f, keys_path):
+    """分块转换: 重要性键写入磁盘临时文件，再逐段打包写出 .splat"""
+    keys = np.memmap(keys_path, dtype=np.float32, mode='w+', shape=(len(vert),))
+    try:
+        for start in range(0, len(vert), SPLAT_CHUNK_POINTS):
+            chunk = splat_importance_key(vert[start:start + SPLAT_CHUNK_POINTS])
+            # NaN 与 argsort 一致排在最后
+            keys[start:start + len(chunk)] = np.where(np.isnan(chunk), np.inf, chunk)
+        for band in iter_importance_bands(keys, SPLAT_CHUNK_POINTS, os.path.dirname(os.path.abspath(keys_path))):
+            f.write(pack_splats(vert, band).tobytes())
+    finally:
+        del keys
+        os.remove(keys_path)
+
+
+def write_ply_as_splat(ply_path, f):
+    """把 PLY 转换为 .splat 写入文件对象，大模型自动使用分块模式"""
+    vert = read_ply_vertices(ply_path)
+    if isinstance(vert, np.memmap) and len(vert) >= SPLAT_CHUNKED_MIN_POINTS:
+        write_splat_chunked(vert, f, f.name + '.keys.tmp')
+    else:
+        f.write(pack_splats(vert, splat_importance_order(vert)).tobytes())
+
+
 def ply_to_splat(ply_path):
     """将 PLY 文件转换为更紧凑的 .splat 格式
-    
+
     PLY 格式: 每点 56 bytes (14 × float32)
     Splat 格式: 每点 32 bytes (position: 12, scales: 12, color: 4, rot: 4)
     压缩比: ~43% 节省
     """
-    plydata = PlyData.read(ply_path)
-    vert = plydata["vertex"]
-    
-    # 按重要性排序 (大且不透明的点优先)
-    sorted_indices = np.argsort(
-        -np.exp(vert["scale_0"] + vert["scale_1"] + vert["scale_2"])
-        / (1 + np.exp(-vert["opacity"]))
-    )
-    
-    buffer = BytesIO()
-    SH_C0 = 0.28209479177387814  # 球谐函数 0 阶系数
-    
-    for idx in sorted_indices:
-        v = vert[idx]
-        
-        # Position: 3 × float32 = 12 bytes
-        position = np.array([v["x"], v["y"], v["z"]], dtype=np.float32)
-        buffer.write(position.tobytes())
-        
-        # Scales: 3 × float32 = 12 bytes (已经是 exp 形式)
-        scales = np.exp(np.array([v["scale_0"], v["scale_1"], v["scale_2"]], dtype=np.float32))
-        buffer.write(scales.tobytes())
-        
-        # Color + Opacity: 4 × uint8 = 4 bytes
-        color = np.array([
-            0.5 + SH_C0 * v["f_dc_0"],
-            0.5 + SH_C0 * v["f_dc_1"],
-            0.5 + SH_C0 * v["f_dc_2"],
-            1 / (1 + np.exp(-v["opacity"])),
-        ])
-        buffer.write((color * 255).clip(0, 255).astype(np.uint8).tobytes())
-        
-        # Rotation quaternion: 4 × uint8 = 4 bytes (normalized)
-        rot = np.array([v["rot_0"], v["rot_1"], v["rot_2"], v["rot_3"]], dtype=np.float32)
-        rot_normalized = (rot / np.linalg.norm(rot)) * 128 + 128
-        buffer.write(rot_normalized.clip(0, 255).astype(np.uint8).tobytes())
-    
-    return buffer.getvalue()
+    vert = read_ply_vertices(ply_path)
+
+    sorted_indices = splat_importance_order(vert)
+    return pack_splats(vert, sorted_indices).tobytes()
+
+
+# .spz (SPZ v2，gaussian-splats-3d 原生支持): 文件头 + 按属性分块存储，整体 gzip
+# 每点 19 bytes (gzip 前): position 3×24bit 定点 | alpha u8 | color 3×u8 | scale 3×u8 (对数量化) | rotation 3×u8 (xyz, w≥0)
+SPZ_MAGIC = 0x5053474e  # "NGSP"
+SPZ_VERSION = 2
+SPZ_COLOR_SCALE = 0.15
+SPZ_MAX_POINTS = 10_000_000  # gaussian-splats-3d 的读取上限
+SPZ_ATTRIBUTES = ('positions', 'alphas', 'colors', 'scales', 'rotations')  # 文件中的存储顺序
+
+
+def spz_column(chunk, name):
+    """读取一列为 float64 (NaN/Inf 置为有限值，量化和误差统计使用同一份数据)"""
+    return np.nan_to_num(np.asarray(chunk[name], dtype=np.float64), posinf=0.0, neginf=0.0)
+
+
+def spz_fractional_bits(vert):
+    """定点小数位数: 24 位有符号整数容纳全部坐标时的最高精度"""
+    extent = 0.0
+    for start in range(0, len(vert), SPLAT_CHUNK_POINTS):
+        chunk = vert[start:start + SPLAT_CHUNK_POINTS]
+        for name in ('x', 'y', 'z'):
+            extent = max(extent, float(np.abs(spz_column(chunk, name)).max(initial=0.0)))
+    if extent == 0:
+        return 23
+    return int(np.clip(np.floor(np.log2((2 ** 23 - 1) / extent)), 0, 23))
+
+
+def spz_rotations(chunk):
+    """归一化四元数 (w, x, y, z)，并翻转为 w ≥ 0 (只存 xyz，w 由单位长度恢复)"""
+    rot = np.stack([spz_column(chunk, f"rot_{i}") for i in range(4)], axis=1)
+    norm = np.linalg.norm(rot, axis=1)
+    rot[norm == 0] = (1, 0, 0, 0)
+    rot /= np.where(norm == 0, 1, norm)[:, None]
+    rot[rot[:, 0] < 0] *= -1
+    return rot
+
+
+def pack_spz_attributes(chunk, fractional_bits):
+    """把一段顶点量化为 SPZ 各属性的 uint8 数组"""
+    n = len(chunk)
+    xyz = np.stack([spz_column(chunk, name) for name in ('x', 'y', 'z')], axis=1)
+    fixed = np.round(xyz * (1 << fractional_bits)).clip(-(1 << 23), (1 << 23) - 1).astype('<i4')
+    dc = np.stack([spz_column(chunk, f"f_dc_{i}") for i in range(3)], axis=1)
+    log_scale = np.stack([spz_column(chunk, f"scale_{i}") for i in range(3)], axis=1)
+
+    def to_u8(values):
+        return np.round(values).clip(0, 255).astype(np.uint8)
+
+    return {
+        'positions': fixed.view(np.uint8).reshape(n, 3, 4)[:, :, :3].reshape(n, 9),  # 小端低 3 字节
+        'alphas': to_u8(255 / (1 + np.exp(-spz_column(chunk, "opacity")))),
+        'colors': to_u8((dc * SPZ_COLOR_SCALE + 0.5) * 255),
+        'scales': to_u8((log_scale + 10) * 16),
+        'rotations': to_u8((spz_rotations(chunk)[:, 1:] + 1) * 127.5),
+    }
+
+
+def spz_chunk_errors(chunk, attrs, fractional_bits):
+    """按 viewer 的解码方式还原一段量化数据，返回与源 PLY 的误差统计"""
+    n = len(chunk)
+    xyz = np.stack([spz_column(chunk, name) for name in ('x', 'y', 'z')], axis=1)
+    raw = attrs['positions'].reshape(n, 3, 3).astype(np.int32)
+    fixed = raw[:, :, 0] | (raw[:, :, 1] << 8) | (raw[:, :, 2] << 16)
+    fixed = np.where(fixed & 0x800000, fixed - (1 << 24), fixed)
+    position_error = np.linalg.norm(fixed / (1 << fractional_bits) - xyz, axis=1)
+
+    log_scale = np.stack([spz_column(chunk, f"scale_{i}") for i in range(3)], axis=1)
+    scale_error = np.abs(attrs['scales'] / 16 - 10 - log_scale)
+
+    rot = spz_rotations(chunk)
+    decoded = attrs['rotations'] / 127.5 - 1
+    w = np.sqrt(np.maximum(0, 1 - (decoded ** 2).sum(axis=1)))
+    decoded = np.concatenate([w[:, None], decoded], axis=1)
+    decoded /= np.linalg.norm(decoded, axis=1)[:, None]
+    dot = np.abs((rot * decoded).sum(axis=1)).clip(0, 1)
+    rotation_error = np.degrees(2 * np.arccos(dot))
+
+    # 颜色与不透明度按显示值 (0-255) 比较
+    dc = np.stack([spz_column(chunk, f"f_dc_{i}") for i in range(3)], axis=1)
+    color = (0.5 + SH_C0 * dc).clip(0, 1) * 255
+    color_decoded = (0.5 + SH_C0 * (attrs['colors'] / 255 - 0.5) / SPZ_COLOR_SCALE).clip(0, 1) * 255
+    alpha = 255 / (1 + np.exp(-spz_column(chunk, "opacity")))
+
+    return {
+        'position_sq': float((position_error ** 2).sum()),
+        'position_max': float(position_error.max(initial=0)),
+        'scale_sum': float(scale_error.sum()),
+        'scale_max': float(scale_error.max(initial=0)),
+        'rotation_sum': float(rotation_error.sum()),
+        'rotation_max': float(rotation_error.max(initial=0)),
+        'color_sq': float(((color_decoded - color) ** 2).sum()),
+        'alpha_sq': float(((attrs['alphas'] - alpha) ** 2).sum()),
+    }
+
+
+def write_ply_as_spz(ply_path, f):
+    """把 PLY 转换为 .spz 写入文件对象 (分块量化，内存占用与点数无关)，返回相对源 PLY 的量化误差"""
+    vert = read_ply_vertices(ply_path)
+    count = len(vert)
+    if count > SPZ_MAX_POINTS:
+        raise ValueError(f'Too many points for .spz: {count} > {SPZ_MAX_POINTS}')
+    fractional_bits = spz_fractional_bits(vert)
+
+    # 各属性先写入临时文件，再按 SPZ 的属性顺序拼接
+    parts = {name: tempfile.TemporaryFile() for name in SPZ_ATTRIBUTES}
+    totals = collections.Counter()
+    try:
+        for start in range(0, count, SPLAT_CHUNK_POINTS):
+            chunk = vert[start:start + SPLAT_CHUNK_POINTS]
+            attrs = pack_spz_attributes(chunk, fractional_bits)
+            for name in SPZ_ATTRIBUTES:
+                parts[name].write(attrs[name].tobytes())
+            for key, value in spz_chunk_errors(chunk, attrs, fractional_bits).items():
+                totals[key] = max(totals[key], value) if key.endswith('_max') else totals[key] + value
+
+        with gzip.GzipFile(filename='', mode='wb', fileobj=f, compresslevel=GZIP_LEVEL, mtime=0) as gz:
+            gz.write(struct.pack('<IIIBBBB', SPZ_MAGIC, SPZ_VERSION, count, 0, fractional_bits, 0, 0))
+            for name in SPZ_ATTRIBUTES:
+                parts[name].seek(0)
+                shutil.copyfileobj(parts[name], gz, EXPORT_CHUNK_SIZE)
+    finally:
+        for part in parts.values():
+            part.close()
+
+    n = max(count, 1)
+    return {
+        'points': count,
+        'position_step': 1 / (1 << fractional_bits),
+        'position_rms': (totals['position_sq'] / n) ** 0.5,
+        'position_max': totals['position_max'],
+        'scale_log_mean': totals['scale_sum'] / (3 * n),
+        'scale_log_max': totals['scale_max'],
+        'rotation_mean_deg': totals['rotation_sum'] / n,
+        'rotation_max_deg': totals['rotation_max'],
+        'color_rms': (totals['color_sq'] / (3 * n)) ** 0.5,
+        'alpha_rms': (totals['alpha_sq'] / n) ** 0.5,
+    }
+
+
+# --- .splat 转换缓存 (磁盘持久化, LRU 淘汰) ---
+SPLAT_FORMAT_VERSION = 1  # 转换输出格式变化时递增，旧缓存自动失效
+SPZ_FORMAT_VERSION = 1
+CACHE_FOLDER = os.path.join(WORKSPACE_FOLDER, '.cache')
+SPLAT_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'splat')
+SPLAT_CACHE_MAX_BYTES = int(config.get('splat_cache_max_mb', 2048)) * 1024 * 1024
+# 预压缩变体 (gzip / brotli / zstd) 单独存放、单独计算预算，不会挤掉 .splat 缓存
+ENCODED_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'encoded')
+ENCODED_CACHE_MAX_BYTES = int(config.get('encoded_cache_max_mb', 1024)) * 1024 * 1024
+CACHE_BUDGETS = {SPLAT_CACHE_FOLDER: SPLAT_CACHE_MAX_BYTES, ENCODED_CACHE_FOLDER: ENCODED_CACHE_MAX_BYTES}
+os.makedirs(SPLAT_CACHE_FOLDER, exist_ok=True)
+os.makedirs(ENCODED_CACHE_FOLDER, exist_ok=True)
+
+splat_cache_lock = threading.Lock()  # 保护 splat_cache_key_locks 与淘汰过程 (两个缓存目录共用)
+splat_cache_key_locks = {}  # 缓存条目 -> [锁, 使用者数]，避免并发重复转换；无人使用时移除
+
+
+def splat_cache_path(ply_path):
+    """根据 PLY 路径 + mtime + size + 格式版本计算缓存文件路径"""
+    st = os.stat(ply_path)
+    raw = f"{os.path.abspath(ply_path)}|{st.st_mtime_ns}|{st.st_size}|v{SPLAT_FORMAT_VERSION}"
+    key = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return os.path.join(SPLAT_CACHE_FOLDER, key + '.splat')
+
+
+def spz_cache_path(ply_path):
+    """.spz 缓存文件路径 (与 .splat 相同的键规则，格式版本独立)"""
+    st = os.stat(ply_path)
+    raw = f"{os.path.abspath(ply_path)}|{st.st_mtime_ns}|{st.st_size}|spz{SPZ_FORMAT_VERSION}"
+    key = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return os.path.join(SPLAT_CACHE_FOLDER, key + '.spz')
+
+
+def evict_cache(folder, keep=None):
+    """按最近使用时间 (mtime) 淘汰缓存目录中的文件，直到总大小不超过该目录的预算"""
+    max_bytes = CACHE_BUDGETS[folder]
+    entries = []
+    total = 0
+    for name in os.listdir(folder):
+        if name.endswith('.tmp'):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        print(f"🧹 Evicted {removed} files from {os.path.basename(folder)} cache ({total / 1024 / 1024:.1f}MB kept)")
+
+
+def cached_artifact(cache_path, write):
+    """
+    缓存条目的通用读取，返回已打开的缓存文件 (调用方负责关闭)
+    命中时刷新 LRU 时间，未命中时调用 write(tmp_path) 生成；文件在返回前打开，之后被淘汰也能完整读取
+    """
+    with splat_cache_lock:
+        entry = splat_cache_key_locks.setdefault(cache_path, [threading.Lock(), 0])
+        entry[1] += 1
+
+    try:
+        with entry[0]:
+            try:
+                f = open(cache_path, 'rb')
+            except FileNotFoundError:
+                f = None
+            if f is not None:
+                try:
+                    os.utime(cache_path, None)  # 命中: 刷新最近使用时间
+                except OSError:
+                    pass  # 打开后刚被淘汰，已打开的文件仍可读取
+                return f
+
+            tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+            try:
+                write(tmp_path)
+                os.replace(tmp_path, cache_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            f = open(cache_path, 'rb')
+    finally:
+        with splat_cache_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                splat_cache_key_locks.pop(cache_path, None)
+
+    with splat_cache_lock:
+        evict_cache(os.path.dirname(cache_path), keep=cache_path)
+    return f
+
+
+def get_cached_splat(ply_path):
+    """返回 PLY 对应的已打开 .splat 缓存文件，未命中时转换并写入缓存"""
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            write_ply_as_splat(ply_path, f)
+
+    return cached_artifact(splat_cache_path(ply_path), write)
+
+
+def get_cached_spz(ply_path):
+    """返回 (已打开的 .spz 缓存文件, 量化误差)；误差在转换时计算，保存在旁边的 .json 中"""
+    cache_path = spz_cache_path(ply_path)
+    metrics_path = cache_path + '.json'
+
+    def write(tmp_path):
+        started = time.time()
+        with open(tmp_path, 'wb') as f:
+            metrics = write_ply_as_spz(ply_path, f)
+        spz_size = os.path.getsize(tmp_path)
+        metrics['bytes'] = spz_size
+        with open(metrics_path, 'w') as f:
+            json.dump(metrics, f)
+        ply_size = os.path.getsize(ply_path)
+        print(f"🧮 SPZ {os.path.basename(ply_path)}: {metrics['points']} points, "
+              f"{ply_size / 1024 / 1024:.1f}MB → {spz_size / 1024 / 1024:.1f}MB "
+              f"({spz_size * 100 / max(ply_size, 1):.0f}%, {time.time() - started:.1f}s); "
+              f"position RMS {metrics['position_rms']:.2e} (max {metrics['position_max']:.2e}), "
+              f"log-scale max {metrics['scale_log_max']:.3f}, "
+              f"rotation mean {metrics['rotation_mean_deg']:.2f}° (max {metrics['rotation_max_deg']:.2f}°), "
+              f"color RMS {metrics['color_rms']:.2f}/255, alpha RMS {metrics['alpha_rms']:.2f}/255")
+
+    spz_file = cached_artifact(cache_path, write)
+    try:
+        with open(metrics_path) as f:
+            metrics = json.load(f)
+    except (OSError, ValueError):
+        metrics = None  # 误差文件已被淘汰，不影响模型本身
+    return spz_file, metrics
+
+
+def get_cached_splat_gzip(ply_path):
+    """返回已打开的 .splat 缓存 gzip 压缩版本 (mtime=0，输出稳定；与按 Accept-Encoding 提供的 gzip 变体是同一个文件)"""
+    with get_cached_splat(ply_path) as splat_file:
+        def write(tmp_path):
+            splat_file.seek(0)
+            with open(tmp_path, 'wb') as dst:
+                compress_stream(splat_file, dst, 'gzip')
+
+        return cached_artifact(encoded_variant_base(splat_file.name) + ENCODING_SUFFIXES['gzip'], write)
+
+
+def discard_cached_splat(ply_path):
+    """删除 PLY 对应的缓存条目及其压缩变体 (模型被删除时调用，须在删除 PLY 之前)"""
+    splat_path = splat_cache_path(ply_path)
+    spz_path = spz_cache_path(ply_path)
+    paths = [splat_path, spz_path, spz_path + '.json']
+    for base in (encoded_variant_base(splat_path), encoded_variant_base(ply_path)):
+        for suffix in ENCODING_SUFFIXES.values():
+            paths += [base + suffix, base + suffix + ENCODING_SKIP_SUFFIX]
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def iter_file_range(f, start, length, chunk_size=256 * 1024):
+    """从文件对象中分块读取 [start, start + length) 区间"""
+    f.seek(start)
+    remaining = length
+    while remaining > 0:
+        chunk = f.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+# --- 预压缩变体 (gzip / brotli / zstd) ---
+# 模型文件的压缩版本在后台生成，存放在 .cache/encoded/ (独立的 LRU 预算)；
+# 缓存键包含源文件的 mtime + size，源文件变化后旧变体不会再被使用，随 LRU 淘汰
+COMPRESSIBLE_EXTS = ('.ply', '.splat')
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br', 'zstd': '.zst'}
+# 压缩后至少节省这个比例才保留变体；不值得的变体删除并留下空的 .skip 标记，不再重复生成
+ENCODING_MIN_SAVING = float(config.get('encoding_min_saving', 0.1))
+ENCODING_SKIP_SUFFIX = '.skip'
+CONTENT_ENCODINGS = ['gzip'] + (['br'] if brotli else []) + (['zstd'] if zstandard else [])
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # 11 对几百 MB 的模型太慢
+ZSTD_LEVEL = 10
+compress_queue = queue.Queue()
+compress_pending = set()
+compress_lock = threading.Lock()
+
+
+def compress_stream(src, dst, encoding):
+    """流式压缩文件对象 (gzip 头部 mtime=0，同一输入输出稳定)"""
+    if encoding == 'gzip':
+        with gzip.GzipFile(filename='', mode='wb', fileobj=dst, compresslevel=GZIP_LEVEL, mtime=0) as gz:
+            shutil.copyfileobj(src, gz, EXPORT_CHUNK_SIZE)
+    elif encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in iter(lambda: src.read(EXPORT_CHUNK_SIZE), b''):
+            dst.write(compressor.process(chunk))
+        dst.write(compressor.finish())
+    elif encoding == 'zstd':
+        zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(src, dst)
+    else:
+        raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def compress_file(src_path, dst_path, encoding):
+    """流式压缩文件"""
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        compress_stream(src, dst, encoding)
+
+
+def encoded_variant_base(path):
+    """压缩变体的路径前缀 (加上编码后缀即为变体路径)；.splat 缓存文件本身已按内容寻址，其余文件按路径 + mtime + size 计算键"""
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(SPLAT_CACHE_FOLDER):
+        return os.path.join(ENCODED_CACHE_FOLDER, os.path.basename(path))
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+    key = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return os.path.join(ENCODED_CACHE_FOLDER, key + os.path.splitext(path)[1])
+
+
+def build_encoded_variants(path):
+    """生成文件缺少的压缩变体，并记录每种格式的压缩率和 CPU 耗时；节省不足 ENCODING_MIN_SAVING 的变体不保留"""
+    base = encoded_variant_base(path)
+    size = os.path.getsize(path)
+    for encoding in CONTENT_ENCODINGS:
+        variant_path = base + ENCODING_SUFFIXES[encoding]
+        if os.path.exists(variant_path) or os.path.exists(variant_path + ENCODING_SKIP_SUFFIX):
+            continue
+        cpu_started = time.thread_time()
+        started = time.time()
+        with cached_artifact(variant_path, lambda tmp_path: compress_file(path, tmp_path, encoding)) as f:
+            variant_size = os.fstat(f.fileno()).st_size
+        kept = variant_size <= size * (1 - ENCODING_MIN_SAVING)
+        if not kept:
+            open(variant_path + ENCODING_SKIP_SUFFIX, 'wb').close()
+            try:
+                os.remove(variant_path)
+            except OSError:
+                pass
+        print(f"🗜️ {encoding}: {os.path.basename(path)} {size / 1024 / 1024:.1f}MB → "
+              f"{variant_size / 1024 / 1024:.1f}MB ({variant_size * 100 / max(size, 1):.0f}%), "
+              f"CPU {time.thread_time() - cpu_started:.2f}s, wall {time.time() - started:.2f}s"
+              f"{'' if kept else ', not worth keeping'}")
+
+
+def schedule_encoded_variants(path):
+    """把文件加入后台压缩队列 (同一文件排队中时不重复加入)"""
+    with compress_lock:
+        if path in compress_pending:
+            return
+        compress_pending.add(path)
+    compress_queue.put(path)
+
+
+def compress_worker():
+    """后台压缩线程: 逐个生成压缩变体，不占用请求线程"""
+    while True:
+        path = compress_queue.get()
+        try:
+            build_encoded_variants(path)
+        except Exception as e:
+            print(f"⚠️ Compression failed for {os.path.basename(path)}: {e}")
+        finally:
+            with compress_lock:
+                compress_pending.discard(path)
+
+
+def select_encoded_variant(path):
+    """
+    按 Accept-Encoding 选择已生成的最小压缩变体，返回 (encoding, variant_path)
+    没有可用变体时返回 (None, None)，缺少的变体在后台生成；Range 请求 (断点续传) 始终针对原始内容
+    """
+    if request.range:
+        return None, None
+    accepted = [encoding for encoding in CONTENT_ENCODINGS if request.accept_encodings[encoding] > 0]
+    if not accepted:
+        return None, None
+    base = encoded_variant_base(path)
+    best = None
+    missing = False
+    for encoding in accepted:
+        variant_path = base + ENCODING_SUFFIXES[encoding]
+        try:
+            size = os.path.getsize(variant_path)
+        except OSError:
+            # 压缩效果不足而放弃的变体不再生成
+            missing = missing or not os.path.exists(variant_path + ENCODING_SKIP_SUFFIX)
+            continue
+        if best is None or size < best[0]:
+            best = (size, encoding, variant_path)
+    if missing:
+        schedule_encoded_variants(path)
+    if best is None:
+        return None, None
+    try:
+        os.utime(best[2], None)  # 刷新 LRU 时间
+    except OSError:
+        return None, None
+    return best[1], best[2]
+
+
+# --- 条件请求与缓存 (ETag / Range / 内容寻址 URL) ---
+IMMUTABLE_MAX_AGE = 31536000  # 1 年
+
+
+def file_version(mtime, size):
+    """由 mtime + size 生成文件版本号: 既是强 ETag，也是内容寻址 URL (/v/<version>/) 中的版本段"""
+    return hashlib.sha1(f'{mtime!r}|{size}'.encode()).hexdigest()[:16]
+
+
+def set_cache_headers(response, immutable):
+    """带有当前版本号的 URL 内容不会再变化，可长期缓存；其余 URL 每次用 ETag 重新验证"""
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def send_versioned_file(directory, filename, version=None, **kwargs):
+    """
+    发送文件，ETag 使用 file_version；Range (206/416) 和 If-None-Match (304) 由 send_file 处理
+    模型文件按 Accept-Encoding 提供预压缩变体 (ETag 带编码后缀)
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    st = os.stat(path)
+    etag = file_version(st.st_mtime, st.st_size)
+    immutable = version == etag
+    max_age = IMMUTABLE_MAX_AGE if immutable else None
+    if not path.endswith(COMPRESSIBLE_EXTS):
+        response = send_file(path, etag=etag, max_age=max_age, last_modified=st.st_mtime, **kwargs)
+        return set_cache_headers(response, immutable)
+
+    encoding, variant_path = select_encoded_variant(path)
+    if encoding:
+        variant_kwargs = {'download_name': os.path.basename(path), **kwargs}
+        try:
+            response = send_file(
+                variant_path, etag=f'{etag}-{encoding}', max_age=max_age, last_modified=st.st_mtime,
+                mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream', **variant_kwargs
+            )
+            response.headers['Content-Encoding'] = encoding
+        except FileNotFoundError:
+            encoding = None  # 变体刚被淘汰，发送原始内容
+    if not encoding:
+        response = send_file(path, etag=etag, max_age=max_age, last_modified=st.st_mtime, **kwargs)
+    response.vary.add('Accept-Encoding')
+    return set_cache_headers(response, immutable)
+
+
+def send_file_range(f, length, etag, immutable=False, mimetype='application/octet-stream'):
+    """
+    流式发送已打开文件的前 length 字节，支持单个 Range 请求 (206/416) 和 If-Range
+    调用方应在准备内容之前先处理 If-None-Match
+    """
+    start, end = 0, length
+    status = 200
+    byte_range = request.range
+    if_range = request.if_range
+    # 多段 Range 或 If-Range 与当前版本不符时忽略 Range，返回完整内容
+    if byte_range and byte_range.units == 'bytes' and len(byte_range.ranges) == 1 \
+            and (if_range.etag == etag or (if_range.etag is None and if_range.date is None)):
+        bounds = byte_range.range_for_length(length)
+        if bounds is None:
+            f.close()
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{length}'
+            return response
+        start, end = bounds
+        status = 206
+
+    response = Response(iter_file_range(f, start, end - start), status=status, mimetype=mimetype)
+    response.call_on_close(f.close)
+    response.headers['Content-Length'] = str(end - start)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{end - 1}/{length}'
+    response.set_etag(etag)
+    return set_cache_headers(response, immutable)
+
+
+def not_modified(etags, immutable=False):
+    """If-None-Match 命中任一当前 ETag (原始内容或某个压缩变体) 时返回 304 响应，否则返回 None"""
+    for etag in etags:
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return set_cache_headers(response, immutable)
+    return None
+
+
+# --- 分享导出 (流式 HTML) ---
+EXPORT_CHUNK_SIZE = 3 * 64 * 1024  # 3 的倍数，分块 Base64 可直接拼接
+EXPORT_PLACEHOLDER_RE = re.compile(
+    r'\{\{(MODEL_NAME|MODEL_DATA|MODEL_ENCODING|MODEL_FORMAT|THREE_JS_DATA|SPLATS_JS_DATA|LIB_ENCODING)\}\}'
+)
+# 压缩模式: none = 全部 Base64; model = 模型 gzip; all = 模型与 JS 库都 gzip
+EXPORT_COMPRESS_MODES = ('none', 'model', 'all')
+# 模型格式: splat = 每点 32 bytes; spz = 量化 + gzip (自带压缩，不再做模型 gzip)
+EXPORT_MODEL_FORMATS = ('splat', 'spz')
+SHARE_TEMPLATE_PATH = os.path.join(BASE_DIR, 'templates', 'share_template.html')
+THREE_JS_PATH = os.path.join(BASE_DIR, 'static', 'lib', 'three.module.js')
+SPLATS_JS_PATH = os.path.join(BASE_DIR, 'static', 'lib', 'gaussian-splats-3d.module.js')
+
+export_asset_lock = threading.Lock()
+export_asset_cache = {}  # (path, build) -> ((mtime_ns, size), 预处理结果)
+
+
+def load_export_asset(path, build):
+    """读取导出用的静态文件并缓存 build(bytes) 的结果，文件变化时自动重建"""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with export_asset_lock:
+        cached = export_asset_cache.get((path, build))
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+    with open(path, 'rb') as f:
+        value = build(f.read())
+    with export_asset_lock:
+        export_asset_cache[(path, build)] = (stamp, value)
+    return value
+
+
+def compile_share_template(data):
+    """把分享模板切分为静态片段: 偶数位为 bytes，奇数位为占位符名"""
+    pieces = EXPORT_PLACEHOLDER_RE.split(data.decode('utf-8'))
+    return tuple(p.encode('utf-8') if i % 2 == 0 else p for i, p in enumerate(pieces))
+
+
+def js_base64(data):
+    """JS 源码 → Base64"""
+    return base64.b64encode(data)
+
+
+def js_gzip_base64(data):
+    """JS 源码 → gzip → Base64 (页面内用 DecompressionStream 解压)"""
+    return base64.b64encode(gzip.compress(data, compresslevel=9, mtime=0))
+
+
+def export_parts_size(parts):
+    """计算导出片段的总字节数 (文件按 Base64 编码后长度计)"""
+    total = 0
+    for part in parts:
+        if isinstance(part, bytes):
+            total += len(part)
+        else:
+            total += (os.fstat(part.fileno()).st_size + 2) // 3 * 4
+    return total
+
+
+def iter_export_parts(parts):
+    """按顺序输出导出片段: bytes 原样输出，文件对象分块 Base64 编码"""
+    for part in parts:
+        if isinstance(part, bytes):
+            yield part
+        else:
+            for chunk in iter(lambda: part.read(EXPORT_CHUNK_SIZE), b''):
+                yield base64.b64encode(chunk)
+
+
+# --- 输入预处理 (EXIF 方向 / 缩小 / sRGB) ---
+# 推理前把输入规范化: 按 EXIF 方向旋转、长边缩小到工作分辨率、转换为 sRGB 的 RGB 图片。
+# 结果按内容哈希缓存在 .cache/preprocessed/，原图保持不变
+PREPROCESS_INPUTS = bool(config.get('preprocess_inputs', True))
+PREPROCESS_MAX_EDGE = int(config.get('preprocess_max_edge', 2048))  # 长边上限 (0 = 不缩小)
+PREPROCESS_FORMAT_VERSION = 1  # 规范化方式变化时递增，旧缓存自动失效
+PREPROCESS_QUALITY = 95
+PREPROCESS_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'preprocessed')
+EXIF_ORIENTATION = 0x0112
+
+
+def is_srgb_profile(icc):
+    """ICC 配置是否为 sRGB (无法解析时按 sRGB 处理，不做转换)"""
+    try:
+        profile = ImageCms.ImageCmsProfile(io.BytesIO(icc))
+        return 'srgb' in ImageCms.getProfileDescription(profile).lower()
+    except Exception:
+        return True
+
+
+def preprocess_steps(img):
+    """根据图片头信息判断需要哪些规范化步骤 (不解码像素)"""
+    steps = []
+    if img.getexif().get(EXIF_ORIENTATION, 1) not in (0, 1):
+        steps.append('orientation')
+    if PREPROCESS_MAX_EDGE and max(img.size) > PREPROCESS_MAX_EDGE:
+        steps.append('resize')
+    icc = img.info.get('icc_profile')
+    if icc and ImageCms and not is_srgb_profile(icc):
+        steps.append('srgb')
+    elif img.mode != 'RGB':
+        steps.append('rgb')
+    return steps
+
+
+def normalize_image(input_path, output_path, steps):
+    """按 steps 规范化图片并写入 output_path (格式由扩展名决定)，返回规范化后的尺寸"""
+    with Image.open(input_path) as img:
+        if 'resize' in steps:
+            # JPEG 直接按 1/2、1/4 或 1/8 解码 (不小于目标尺寸)
+            scale = PREPROCESS_MAX_EDGE / max(img.size)
+            img.draft(img.mode, (round(img.width * scale), round(img.height * scale)))
+        icc = img.info.get('icc_profile')
+        # 旋转后的图片 EXIF 中不再带方向；其余 EXIF (焦距等) 保留给 sharp
+        img = ImageOps.exif_transpose(img)
+        exif = img.getexif()
+        if 'srgb' in steps:
+            try:
+                img = ImageCms.profileToProfile(
+                    img, ImageCms.ImageCmsProfile(io.BytesIO(icc)), ImageCms.createProfile('sRGB'),
+                    outputMode='RGB'
+                )
+                icc = None
+            except Exception as e:
+                print(f"⚠️ Color conversion failed for {os.path.basename(input_path)}: {e}")
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if max(img.size) > PREPROCESS_MAX_EDGE > 0:
+            scale = PREPROCESS_MAX_EDGE / max(img.size)
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(size, Image.LANCZOS, reducing_gap=2.0)
+        image_format = Image.registered_extensions()[os.path.splitext(output_path)[1].lower()]
+        # 临时文件名唯一，多个 worker 同时规范化同一张图时互不覆盖
+        tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+        extra = {}
+        if exif:
+            extra['exif'] = exif
+        if icc:
+            extra['icc_profile'] = icc
+        try:
+            img.save(tmp_path, image_format, quality=PREPROCESS_QUALITY, **extra)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return img.size
+
+
+def preprocess_cache_path(digest, ext):
+    return os.path.join(PREPROCESS_CACHE_FOLDER, f'{digest}-{PREPROCESS_MAX_EDGE}-v{PREPROCESS_FORMAT_VERSION}{ext}')
+
+
+def get_normalized_input(input_path):
+    """返回 (送入推理的图片路径, 预处理记录)；不需要规范化时返回原图和 None
+
+    规范化结果按内容哈希缓存；命中缓存时记录节省的处理时间
+    """
+    with Image.open(input_path) as img:
+        steps = preprocess_steps(img)
+        original_size = img.size
+    if not steps:
+        return input_path, None
+
+    ext = os.path.splitext(input_path)[1].lower()
+    cache_path = preprocess_cache_path(hash_file(input_path), ext)
+    try:
+        with open(cache_path + '.json') as f:
+            record = json.load(f)
+        if os.path.exists(cache_path):
+            return cache_path, dict(record, cached=True, saved_seconds=record['seconds'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    started = time.time()
+    os.makedirs(PREPROCESS_CACHE_FOLDER, exist_ok=True)
+    size = normalize_image(input_path, cache_path, steps)
+    record = {
+        'steps': steps,
+        'original_size': list(original_size),
+        'size': list(size),
+        'seconds': round(time.time() - started, 3)
+    }
+    tmp_path = f"{cache_path}.{uuid.uuid4().hex}.json.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, cache_path + '.json')
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return cache_path, dict(record, cached=False)
+
+
+def prepare_task_input(task):
+    """推理前的预处理阶段: 返回送入 sharp 的图片路径，并把预处理记录写入任务 (调用方不持有 task_lock)"""
+    if not PREPROCESS_INPUTS:
+        return task['input_path']
+    with task_lock:
+        task['stage'] = 'normalizing'
+        task_changed([task], persist=False)
+    try:
+        path, record = get_normalized_input(task['input_path'])
+    except Exception as e:
+        print(f"⚠️ Preprocessing failed for {task['filename']}, using the original: {e}")
+        return task['input_path']
+    if record:
+        with task_lock:
+            task['preprocess'] = record
+        (w, h), (nw, nh) = record['original_size'], record['size']
+        if record['cached']:
+            print(f"🧼 {task['filename']}: normalized copy from cache ({nw}×{nh}), saved {record['saved_seconds']:.2f}s")
+        else:
+            print(f"🧼 Normalized {task['filename']}: {w}×{h} → {nw}×{nh} ({', '.join(record['steps'])}) "
+                  f"in {record['seconds']:.2f}s, {1 - nw * nh / (w * h):.0%} fewer pixels")
+    return path
+
+
+def discard_preprocessed_input(digest):
+    """删除某个内容哈希的规范化缓存"""
+    try:
+        names = os.listdir(PREPROCESS_CACHE_FOLDER)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(digest + '-'):
+            try:
+                os.remove(os.path.join(PREPROCESS_CACHE_FOLDER, name))
+            except OSError:
+                pass
+
 
 # --- 后台任务队列系统 (线程安全版) ---
 task_queue = queue.Queue()
@@ -158,6 +1303,155 @@ running_processes = {}  # 存储运行中的进程，用于取消任务
 TASK_RETENTION_SECONDS = 3600  # 已完成任务保留1小时
 CLEANUP_INTERVAL = 300  # 每5分钟清理一次
 
+# 任务持久化: 任务记录保存在工作目录的 SQLite 库中，重启 (包括 /api/restart) 后自动恢复
+TASK_DB_PATH = os.path.join(WORKSPACE_FOLDER, '.tasks.db')
+task_db = sqlite3.connect(TASK_DB_PATH, check_same_thread=False)
+task_db.execute('PRAGMA journal_mode=WAL')
+task_db.execute('PRAGMA synchronous=NORMAL')
+task_db.execute(
+    'CREATE TABLE IF NOT EXISTS tasks (id TEXT PRIMARY KEY, created_at REAL NOT NULL, data TEXT NOT NULL)'
+)
+task_db.commit()
+
+
+def save_tasks(tasks):
+    """把任务的当前状态写入任务库，多个任务在同一个事务中提交 (调用方需持有 task_lock)"""
+    with task_db:
+        task_db.executemany(
+            'INSERT OR REPLACE INTO tasks (id, created_at, data) VALUES (?, ?, ?)',
+            [(task['id'], task['created_at'], json.dumps(task)) for task in tasks]
+        )
+
+
+def delete_tasks(task_ids):
+    """从任务库删除任务 (调用方需持有 task_lock)"""
+    with task_db:
+        task_db.executemany('DELETE FROM tasks WHERE id = ?', [(task_id,) for task_id in task_ids])
+
+
+# 任务变更版本号: 每次变化递增，/api/tasks?since=<version> 只返回之后的变化。
+# 以启动时刻的毫秒数为起点，重启后客户端手里的旧版本号不会大于新的版本号
+task_version = int(time.time() * 1000)
+removed_tasks = collections.deque()  # 已删除任务 (version, id)，供增量查询返回
+REMOVED_TASKS_KEEP = 1000
+removed_floor = task_version  # 早于该版本的删除记录已被丢弃，需要全量同步
+TASK_ERROR_SUMMARY_CHARS = 200
+
+
+def next_task_version():
+    """分配下一个任务变更版本号 (调用方需持有 task_lock)"""
+    global task_version
+    task_version += 1
+    return task_version
+
+
+def forget_task(task_id):
+    """从内存中移除任务并记录删除版本 (调用方需持有 task_lock)"""
+    global removed_floor
+    task_status.pop(task_id, None)
+    log = task_logs.pop(task_id, None)
+    if log:
+        log.close()
+    try:
+        os.remove(task_log_path(task_id))
+    except OSError:
+        pass
+    removed_tasks.append((next_task_version(), task_id))
+    while len(removed_tasks) > REMOVED_TASKS_KEEP:
+        removed_floor = removed_tasks.popleft()[0]
+    publish_event('task_removed', {'id': task_id, 'version': task_version})
+
+
+def public_task(task):
+    """任务的对外表示: 去掉内部路径，错误日志只保留最后一行摘要 (完整内容见 /api/task/<id>/error)"""
+    data = {k: v for k, v in task.items() if k not in ('input_path', 'output_folder')}
+    error = data.get('error')
+    if error:
+        lines = [line for line in error.splitlines() if line.strip()]
+        data['error'] = (lines[-1] if lines else error).strip()[-TASK_ERROR_SUMMARY_CHARS:]
+    return data
+
+
+def restore_tasks():
+    """启动时从任务库恢复任务，未完成 (排队中/处理中被中断) 的任务按原顺序重新排队"""
+    with task_lock:
+        rows = task_db.execute('SELECT data FROM tasks ORDER BY created_at').fetchall()
+        requeued = []
+        for (data,) in rows:
+            task = json.loads(data)
+            if task['status'] in ('pending', 'processing'):
+                task['status'] = 'pending'
+                for key in ('progress', 'stage', 'slot'):
+                    task.pop(key, None)
+                requeued.append(task)
+            task_status[task['id']] = task
+        task_changed(requeued)
+    for task in requeued:
+        task_queue.put(task['id'])
+    if rows:
+        print(f"📂 Restored {len(rows)} tasks ({len(requeued)} re-queued)")
+
+
+# 事件推送 (SSE): 每个 /api/events 连接一个有界队列
+event_subscribers = set()
+event_lock = threading.Lock()
+EVENT_QUEUE_SIZE = 1000  # 订阅者积压超过该数量时断开，浏览器重连后重新获取快照
+EVENT_KEEPALIVE_SECONDS = 15
+
+
+def publish_event(event, data):
+    """向所有事件订阅者推送一条事件"""
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    with event_lock:
+        for subscriber in list(event_subscribers):
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                event_subscribers.discard(subscriber)
+
+
+def task_changed(tasks, persist=True):
+    """任务状态变化: 状态转换写入任务库，并推送给事件订阅者 (调用方需持有 task_lock)
+
+    persist=False 用于进度/阶段这类高频更新，只推送不落盘。
+    """
+    tasks = list(tasks)
+    for task in tasks:
+        task['version'] = next_task_version()
+    if persist:
+        save_tasks(tasks)
+    for task in tasks:
+        publish_event('task', public_task(task))
+
+# 工作池配置: 同时运行的 sharp predict 进程数，以及每个进程的资源上限
+WORKER_COUNT = max(1, int(config.get('worker_count', 1)))
+# 每个进程的计算线程数 (0 = 不限制; 多槽位时默认平分 CPU 核心，避免线程互相争抢)
+WORKER_THREADS_PER_PROCESS = int(config.get('worker_threads_per_process', 0))
+if not WORKER_THREADS_PER_PROCESS and WORKER_COUNT > 1:
+    WORKER_THREADS_PER_PROCESS = max(1, (os.cpu_count() or 1) // WORKER_COUNT)
+# 每个进程的虚拟内存上限 (MB, 0 = 不限制，仅 POSIX 系统生效)
+WORKER_MEMORY_LIMIT_MB = int(config.get('worker_memory_limit_mb', 0))
+worker_slots = {}  # 槽位号 -> 正在运行的 task_id
+
+# 批处理: 一次 sharp predict 调用最多处理的任务数 (模型只加载一次)，1 = 不合并
+BATCH_MAX_SIZE = max(1, int(config.get('batch_max_size', 8)))
+STAGING_FOLDER = os.path.join(CACHE_FOLDER, 'staging')
+
+# 常驻预测进程: "cli" = 每批任务启动一次 sharp predict，"resident" = 每个槽位常驻一个预测进程，
+# "stand-in" = 常驻模拟进程 (不加载模型，用于测试协议和监管逻辑)
+PREDICTOR_MODE = config.get('predictor_mode', 'cli')
+PREDICTOR_SCRIPT = os.path.join(BASE_DIR, 'sharp_predictor.py')
+PREDICTOR_ARGS = [str(arg) for arg in config.get('predictor_args', [])]  # 传给 sharp_predictor.py 的额外参数，如 ["--device", "cuda"]
+PREDICTOR_MESSAGE_PREFIX = '@@sharp '
+PREDICTOR_MAX_JOBS = int(config.get('predictor_max_jobs', 50))  # 处理 N 个任务后回收进程
+PREDICTOR_MAX_MEMORY_MB = int(config.get('predictor_max_memory_mb', 0))  # 常驻内存超过该值时回收 (0 = 不限制)
+PREDICTOR_MAX_START_FAILURES = 3  # 连续启动失败后回退到 sharp predict 命令行
+# 进度阶段 → 进度百分比 (与命令行输出的解析保持一致)
+PREDICT_STAGE_PROGRESS = {
+    'downloading': 5, 'loading': 10, 'processing': 15, 'preprocessing': 25,
+    'inference': 50, 'postprocessing': 80, 'saving': 95,
+}
+
 
 def cleanup_old_tasks():
     """定期清理已完成的旧任务，防止内存泄漏"""
@@ -167,156 +1461,1050 @@ def cleanup_old_tasks():
         with task_lock:
             old_ids = [
                 k for k, v in task_status.items()
-                if v['created_at'] < cutoff and v['status'] in ('completed', 'failed')
+                if v['created_at'] < cutoff and v['status'] in ('completed', 'failed', 'cancelled')
             ]
             for task_id in old_ids:
-                del task_status[task_id]
+                forget_task(task_id)
+            delete_tasks(old_ids)
             if old_ids:
                 print(f"🧹 Cleaned up {len(old_ids)} old tasks")
+        cleanup_stale_uploads()
 
 
-def worker():
-    """后台工作线程，持续处理队列中的任务"""
-    print("👷 Worker thread started...")
-    while True:
-        task_id = task_queue.get()
-        if task_id is None:
+def predict_env():
+    """sharp predict 子进程的环境变量，限制每个进程的计算线程数"""
+    env = os.environ.copy()
+    if WORKER_THREADS_PER_PROCESS:
+        threads = str(WORKER_THREADS_PER_PROCESS)
+        for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                    'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS'):
+            env[var] = threads
+    return env
+
+
+def limit_memory(cmd):
+    """
+    为预测子进程加上虚拟内存上限: 经 sh 设置 ulimit -v 后 exec 原命令 (进程号不变)，超限时由进程自身报内存错误退出
+    不使用 preexec_fn: 多线程进程中 fork 后执行 Python 代码可能死锁
+    """
+    if not WORKER_MEMORY_LIMIT_MB or os.name != 'posix':
+        return cmd
+    script = (f'ulimit -v {WORKER_MEMORY_LIMIT_MB * 1024} '
+              f'|| echo "⚠️ ulimit -v unsupported, running without memory limit" >&2; exec "$@"')
+    return ['sh', '-c', script, 'sh'] + list(cmd)
+
+
+# 任务日志: 每个任务在内存中只保留最近 task_log_lines 行，完整输出可选写入工作目录下的 .logs/
+TASK_LOG_LINES = max(1, int(config.get('task_log_lines', 200)))
+TASK_LOG_TO_FILE = bool(config.get('task_log_to_file', True))
+TASK_LOG_FOLDER = os.path.join(WORKSPACE_FOLDER, '.logs')
+TASK_LOG_READ_MAX = 256 * 1024  # /api/task/<id>/log 单次从文件读取的上限
+task_logs = {}  # task_id -> TaskLog
+
+
+def task_log_path(task_id):
+    return os.path.join(TASK_LOG_FOLDER, f'{task_id}.log')
+
+
+class TaskLog:
+    """单个任务的输出日志 (环形缓冲)，偏移量按完整日志的字节数计算
+
+    所有方法都需在持有 task_lock 时调用。
+    """
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.lines = collections.deque(maxlen=TASK_LOG_LINES)  # (起始偏移, 行)
+        self.file = None
+        # 重新排队的任务 (包括重启后恢复的) 在已有日志后继续追加
+        path = task_log_path(task_id)
+        self.size = os.path.getsize(path) if TASK_LOG_TO_FILE and os.path.exists(path) else 0
+
+    def append(self, line):
+        data = line.encode('utf-8', 'replace')
+        self.lines.append((self.size, line))
+        self.size += len(data)
+        if TASK_LOG_TO_FILE:
+            if self.file is None:
+                os.makedirs(TASK_LOG_FOLDER, exist_ok=True)
+                self.file = open(task_log_path(self.task_id), 'ab', buffering=0)
+            self.file.write(data)
+
+    def tail(self):
+        """内存中保留的最近几行"""
+        return ''.join(line for _, line in self.lines)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def task_log(task_id):
+    """获取 (或创建) 任务的日志 (调用方需持有 task_lock)"""
+    log = task_logs.get(task_id)
+    if log is None:
+        log = task_logs[task_id] = TaskLog(task_id)
+    return log
+
+
+# sharp / torch.hub 的模型下载与加载输出: 只匹配消息开头 (允许日志级别前缀)，避免把文件名中的 "download" 误判为全局输出
+PREDICT_GLOBAL_LINE_RE = re.compile(
+    r'^(?:[^/\\]*?\b(?:info|warning)\b[\]:\s-]*)?(downloading|no checkpoint provided|loading checkpoint)\b'
+)
+PREDICT_GLOBAL_STAGES = {'downloading': 'downloading', 'no checkpoint provided': 'downloading', 'loading checkpoint': 'loading'}
+
+
+def find_started_task(line_lower, candidates, tasks):
+    """根据 "Processing <file>" 行判断批次中开始处理的是哪个任务"""
+    if not re.search(r'\bprocessing\b', line_lower):
+        return None
+    for tid in candidates:
+        if tasks[tid]['filename'].lower() in line_lower:
+            return tid
+    # 回退到按文件名主干匹配，优先匹配更长的名字
+    for tid in sorted(candidates, key=lambda t: -len(tasks[t]['filename'])):
+        if tasks[tid]['filename'].split('.')[0].lower() in line_lower:
+            return tid
+    return None
+
+
+def finish_batch_task(task_id, task, started_at):
+    """检查任务的输出文件，标记完成或失败；已取消的任务丢弃本次写出的输出 (调用方需持有 task_lock)"""
+    name_without_ext = os.path.splitext(task['filename'])[0]
+    expected_ply = os.path.join(task['output_folder'], name_without_ext + ".ply")
+    if task['status'] == 'cancelled':
+        if os.path.exists(expected_ply) and os.path.getmtime(expected_ply) >= started_at - 2:
+            os.remove(expected_ply)
+            print(f"🗑️ Discarded output of cancelled task {task_id}")
+        return
+    # 只认本次运行写出的文件，避免把同名的旧模型当作结果
+    if os.path.exists(expected_ply) and os.path.getmtime(expected_ply) >= started_at - 2:
+        task['status'] = 'completed'
+        task['progress'] = 100
+        task['stage'] = 'done'
+        print(f"✅ Task {task_id} completed successfully.")
+        publish_event('gallery', {'action': 'add', 'item': index_gallery_item(name_without_ext)})
+    else:
+        task['status'] = 'failed'
+        task['error'] = 'Output file not found after execution.'
+        print(f"❌ Task {task_id} failed: Output missing.")
+
+
+def requeue_batch_tasks(task_ids, tasks):
+    """把批次中尚未处理的任务放回队列 (调用方需持有 task_lock)"""
+    requeued = 0
+    for tid in task_ids:
+        task = tasks[tid]
+        if task['status'] != 'processing':
+            continue
+        task['status'] = 'pending'
+        for key in ('progress', 'stage', 'slot'):
+            task.pop(key, None)
+        task_queue.put(tid)
+        requeued += 1
+    if requeued:
+        print(f"🔁 Re-queued {requeued} unfinished tasks from the interrupted batch")
+
+
+def collect_batch(task_id):
+    """从队列中再取出若干待处理任务，与 task_id 合并为一次 sharp predict 调用"""
+    batch = [task_id]
+    # 多槽位时把积压的任务平分给各槽位，而不是让第一个槽位全部吞下
+    limit = min(BATCH_MAX_SIZE, -(-(task_queue.qsize() + 1) // WORKER_COUNT))
+    with task_lock:
+        output_folder = task_status[task_id]['output_folder']
+        filenames = {task_status[task_id]['filename']}
+    deferred = []
+    while len(batch) < limit:
+        try:
+            next_id = task_queue.get_nowait()
+        except queue.Empty:
+            break
+        if next_id is None:
+            deferred.append(next_id)
             break
-        
         with task_lock:
-            task = task_status.get(task_id)
+            task = task_status.get(next_id)
             if not task or task['status'] == 'cancelled':
-                # 任务被取消或不存在，跳过
                 task_queue.task_done()
                 continue
-            input_path = task['input_path']
-            output_folder = task['output_folder']
-            filename = task['filename']
-        
-        print(f"🔄 Processing task {task_id}: {filename}")
-        with task_lock:
-            task_status[task_id]['status'] = 'processing'
-            task_status[task_id]['progress'] = 0
-            task_status[task_id]['stage'] = 'starting'
-        
+            # 同一批次必须写入同一输出目录，且暂存目录中文件名不能重复
+            if task['output_folder'] != output_folder or task['filename'] in filenames:
+                deferred.append(next_id)
+                continue
+            filenames.add(task['filename'])
+        batch.append(next_id)
+    for next_id in deferred:
+        task_queue.put(next_id)
+        task_queue.task_done()
+    return batch
+
+
+def run_batch(slot, batch):
+    """运行一次 sharp predict 处理一批任务，并把进度和结果归属到各个任务"""
+    with task_lock:
+        tasks = {tid: task_status[tid] for tid in batch}
+        for task in tasks.values():
+            task['status'] = 'processing'
+            task['progress'] = 0
+            task['stage'] = 'starting'
+            task['slot'] = slot
+        worker_slots[slot] = batch[0]
+        task_changed(tasks.values())
+    output_folder = tasks[batch[0]]['output_folder']
+    names = ', '.join(task['filename'] for task in tasks.values())
+    print(f"🔄 Processing {len(batch)} task(s) on slot {slot}: {names}")
+
+    pending = list(batch)  # 尚未在输出中出现的任务
+    current = None  # 正在处理的任务
+    staging_dir = None
+    process = None
+    started_at = time.time()
+    try:
+        sources = {tid: prepare_task_input(task) for tid, task in tasks.items()}
+        if len(batch) == 1 and sources[batch[0]] == tasks[batch[0]]['input_path']:
+            input_path = tasks[batch[0]]['input_path']
+        else:
+            # 把输入硬链接到暂存目录，一次调用处理整批图片，模型只加载一次；
+            # 规范化后的输入以原文件名暂存，输出的模型名不变
+            staging_dir = os.path.join(STAGING_FOLDER, uuid.uuid4().hex)
+            os.makedirs(staging_dir)
+            for tid, task in tasks.items():
+                staged_path = os.path.join(staging_dir, task['filename'])
+                try:
+                    os.link(sources[tid], staged_path)
+                except OSError:
+                    shutil.copy2(sources[tid], staged_path)
+            input_path = staging_dir
+
         # 构建命令
         cmd = [
             "sharp", "predict",
             "-i", input_path,
             "-o", output_folder
         ]
-        
-        process = None
-        try:
-            # 使用 Popen 异步执行，实时读取输出解析进度
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
-            )
-            
-            # 存储进程引用，用于取消
+
+        # 使用 Popen 异步执行，实时读取输出解析进度
+        process = subprocess.Popen(
+            limit_memory(cmd),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=predict_env()
+        )
+
+        # 存储进程引用，用于取消 (只登记单任务批次；多任务批次中取消任务不终止共享进程，
+        # 该任务的输出在完成时丢弃，其余任务不必重新加载模型)
+        with task_lock:
+            if len(batch) == 1:
+                running_processes[batch[0]] = process
+
+        # 实时读取共享输出，按文件解析各任务的进度
+        interrupted = False
+        for line in iter(process.stdout.readline, ''):
+            line_lower = line.lower()
+
             with task_lock:
-                running_processes[task_id] = process
-            
-            # 实时读取输出并解析进度
-            output_lines = []
-            cancelled = False
-            for line in iter(process.stdout.readline, ''):
-                if not line:
+                waiting = pending + ([current] if current else [])
+                # 批次中剩余任务全部被取消，没有继续运行的必要
+                if all(tasks[tid]['status'] == 'cancelled' for tid in waiting):
+                    interrupted = True
                     break
-                
-                # 检查是否被取消
-                with task_lock:
-                    if task_status.get(task_id, {}).get('status') == 'cancelled':
-                        cancelled = True
-                        break
-                
-                output_lines.append(line)
-                line_lower = line.lower()
-                
-                # 解析进度阶段
-                with task_lock:
-                    if 'downloading' in line_lower or 'download' in line_lower:
-                        task_status[task_id]['progress'] = 5
-                        task_status[task_id]['stage'] = 'downloading'
-                    elif 'loading checkpoint' in line_lower:
-                        task_status[task_id]['progress'] = 10
-                        task_status[task_id]['stage'] = 'loading'
-                    elif 'processing' in line_lower and filename.split('.')[0].lower() in line_lower:
-                        task_status[task_id]['progress'] = 15
-                        task_status[task_id]['stage'] = 'processing'
-                    elif 'preprocessing' in line_lower:
-                        task_status[task_id]['progress'] = 25
-                        task_status[task_id]['stage'] = 'preprocessing'
+
+                # 日志归属: 正在处理的文件 (优先按文件名匹配)；模型下载/加载阶段的输出属于所有等待中的任务
+                started = find_started_task(line_lower, pending, tasks)
+                global_match = None if started else PREDICT_GLOBAL_LINE_RE.match(line_lower.strip())
+                owner = started or current
+                for tid in ([owner] if owner and not global_match else waiting):
+                    task_log(tid).append(line)
+
+                if global_match:
+                    stage = PREDICT_GLOBAL_STAGES[global_match.group(1)]
+                    for tid in waiting:
+                        tasks[tid]['progress'] = PREDICT_STAGE_PROGRESS[stage]
+                        tasks[tid]['stage'] = stage
+                    task_changed([tasks[tid] for tid in waiting], persist=False)
+                    continue
+
+                if started:
+                    # 上一个文件已处理完，立即归属结果
+                    if current:
+                        finish_batch_task(current, tasks[current], started_at)
+                        task_changed([tasks[current]])
+                        running_processes.pop(current, None)
+                    pending.remove(started)
+                    current = started
+                    worker_slots[slot] = current
+                    if tasks[current]['status'] == 'cancelled':
+                        # 已取消的任务仍由共享进程处理 (输出在完成时丢弃)，不中断其余任务
+                        continue
+                    tasks[current]['progress'] = 15
+                    tasks[current]['stage'] = 'processing'
+                    task_changed([tasks[current]], persist=False)
+                elif current:
+                    previous_stage = tasks[current]['stage']
+                    if 'preprocessing' in line_lower:
+                        tasks[current]['progress'] = 25
+                        tasks[current]['stage'] = 'preprocessing'
                     elif 'inference' in line_lower:
-                        task_status[task_id]['progress'] = 50
-                        task_status[task_id]['stage'] = 'inference'
+                        tasks[current]['progress'] = 50
+                        tasks[current]['stage'] = 'inference'
                     elif 'postprocessing' in line_lower:
-                        task_status[task_id]['progress'] = 80
-                        task_status[task_id]['stage'] = 'postprocessing'
+                        tasks[current]['progress'] = 80
+                        tasks[current]['stage'] = 'postprocessing'
                     elif 'saving' in line_lower:
-                        task_status[task_id]['progress'] = 95
-                        task_status[task_id]['stage'] = 'saving'
-            
-            # 如果被取消，终止进程
-            if cancelled:
-                process.terminate()
-                try:
-                    process.wait(timeout=5)
-                except:
-                    process.kill()
-                print(f"🛑 Task {task_id} cancelled by user.")
-                task_queue.task_done()
-                continue
-            
-            process.stdout.close()
+                        tasks[current]['progress'] = 95
+                        tasks[current]['stage'] = 'saving'
+                    if tasks[current]['stage'] != previous_stage:
+                        task_changed([tasks[current]], persist=False)
+
+        if interrupted:
+            process.terminate()
+        process.stdout.close()
+        try:
+            return_code = process.wait(timeout=5 if interrupted else None)
+        except subprocess.TimeoutExpired:
+            process.kill()
             return_code = process.wait()
-            
-            if return_code == 0:
-                # 检查输出文件是否存在
-                name_without_ext = os.path.splitext(filename)[0]
-                expected_ply = os.path.join(output_folder, name_without_ext + ".ply")
-                
-                with task_lock:
-                    if os.path.exists(expected_ply):
-                        task_status[task_id]['status'] = 'completed'
-                        task_status[task_id]['progress'] = 100
-                        task_status[task_id]['stage'] = 'done'
-                        print(f"✅ Task {task_id} completed successfully.")
-                    else:
-                        task_status[task_id]['status'] = 'failed'
-                        task_status[task_id]['error'] = 'Output file not found after execution.'
-                        print(f"❌ Task {task_id} failed: Output missing.")
+
+        with task_lock:
+            if interrupted or all(task['status'] == 'cancelled' for task in tasks.values()):
+                # 取消停止了进程，其余未完成的任务重新排队
+                print(f"🛑 Task {current or batch[0]} cancelled by user.")
+                requeue_batch_tasks(pending + ([current] if current else []), tasks)
+            elif return_code == 0:
+                for tid in ([current] if current else []) + pending:
+                    finish_batch_task(tid, tasks[tid], started_at)
             else:
-                stderr_output = ''.join(output_lines)
+                # 失败归属到正在处理的文件；尚未轮到的任务重新排队
+                failed = [current] if current else pending
+                for tid in failed:
+                    if tasks[tid]['status'] != 'cancelled':
+                        tasks[tid]['status'] = 'failed'
+                        tasks[tid]['error'] = task_log(tid).tail() or "Unknown error"
+                        print(f"❌ Task {tid} failed with return code {return_code}")
+                if current:
+                    requeue_batch_tasks(pending, tasks)
+
+    except Exception as e:
+        with task_lock:
+            for tid in ([current] if current else []) + pending:
+                if tasks[tid]['status'] != 'cancelled':
+                    tasks[tid]['status'] = 'failed'
+                    tasks[tid]['error'] = str(e)
+        print(f"❌ Batch on slot {slot} exception: {e}")
+        if process and process.poll() is None:
+            process.kill()
+    finally:
+        # 清理进程引用和暂存目录，记录整批任务的最终状态
+        with task_lock:
+            for tid in batch:
+                running_processes.pop(tid, None)
+                if tid in task_logs:
+                    task_logs[tid].close()
+            worker_slots.pop(slot, None)
+            task_changed(tasks.values())
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+class ResidentPredictor:
+    """一个槽位的常驻预测进程 (sharp_predictor.py)
+
+    模型只加载一次，任务通过 stdin/stdout 的行协议逐个提交。进程崩溃后自动重启，
+    处理 PREDICTOR_MAX_JOBS 个任务或内存超过 PREDICTOR_MAX_MEMORY_MB 后回收。
+    """
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.process = None
+        self.jobs = 0
+        self.start_failures = 0
+        self.job_id = None
+        self.log = collections.deque(maxlen=TASK_LOG_LINES)  # 任务之外 (启动阶段) 的输出
+        self.write_lock = threading.Lock()
+
+    def send(self, message):
+        with self.write_lock:
+            self.process.stdin.write(json.dumps(message) + '\n')
+            self.process.stdin.flush()
+
+    def read_message(self):
+        """读取下一条协议消息，其余输出行写入当前任务的日志 (没有任务时记入启动日志)；进程退出时返回 None"""
+        for line in iter(self.process.stdout.readline, ''):
+            if line.startswith(PREDICTOR_MESSAGE_PREFIX):
+                try:
+                    return json.loads(line[len(PREDICTOR_MESSAGE_PREFIX):])
+                except ValueError:
+                    pass
+            if self.job_id:
                 with task_lock:
-                    # 检查是否是因为取消而失败
-                    if task_status.get(task_id, {}).get('status') != 'cancelled':
-                        task_status[task_id]['status'] = 'failed'
-                        task_status[task_id]['error'] = stderr_output if stderr_output else "Unknown error"
-                print(f"❌ Task {task_id} failed with return code {return_code}")
+                    task_log(self.job_id).append(line)
+            else:
+                self.log.append(line)
+        return None
+
+    def start(self):
+        cmd = [sys.executable, PREDICTOR_SCRIPT]
+        if PREDICTOR_MODE == 'stand-in':
+            cmd.append('--stand-in')
+        cmd += PREDICTOR_ARGS
+        self.log.clear()
+        self.jobs = 0
+        self.process = subprocess.Popen(
+            limit_memory(cmd),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=predict_env()
+        )
+        message = self.read_message()
+        if message and message.get('type') == 'ready':
+            self.start_failures = 0
+            print(f"🔥 Resident predictor ready on slot {self.slot} (pid {message.get('pid')})")
+            return True
+        if message and message.get('type') == 'unsupported':
+            # 已安装的 sharp 接口不兼容，重试也无济于事: 直接回退到命令行
+            self.start_failures = PREDICTOR_MAX_START_FAILURES
+            print(f"⚠️ Resident predictor unsupported on slot {self.slot} ({message.get('error')}), "
+                  f"falling back to sharp predict")
+            self.stop()
+            return False
+        self.start_failures += 1
+        print(f"⚠️ Resident predictor failed to start on slot {self.slot}:\n{''.join(list(self.log)[-20:])}")
+        self.stop()
+        return False
+
+    def stop(self):
+        """请求进程退出，超时则强制结束"""
+        if not self.process:
+            return
+        try:
+            self.send({'type': 'shutdown'})
+        except (OSError, ValueError):
+            pass
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def ensure_started(self):
+        """确保进程在运行；连续启动失败后返回 False，由调用方回退到命令行"""
+        if self.process and self.process.poll() is None:
+            return True
+        self.process = None
+        if self.start_failures >= PREDICTOR_MAX_START_FAILURES:
+            return False
+        return self.start()
+
+    def terminate(self):
+        """取消当前任务 (与 Popen.terminate 同名，cancel_task 通过 running_processes 统一调用)"""
+        if self.job_id and self.process:
+            try:
+                self.send({'type': 'cancel', 'job': self.job_id})
+            except (OSError, ValueError):
+                pass
 
+    def run(self, task_id):
+        """提交一个任务并跟踪进度直到完成"""
+        with task_lock:
+            task = task_status[task_id]
+            task['status'] = 'processing'
+            task['progress'] = 0
+            task['stage'] = 'starting'
+            task['slot'] = self.slot
+            worker_slots[self.slot] = task_id
+            running_processes[task_id] = self
+            self.job_id = task_id
+            task_changed([task])
+            name_without_ext = os.path.splitext(task['filename'])[0]
+            expected_ply = os.path.join(task['output_folder'], name_without_ext + ".ply")
+        print(f"🔄 Processing task {task_id} on resident slot {self.slot}: {task['filename']}")
+
+        result = None
+        try:
+            input_path = prepare_task_input(task)
+            self.send({'type': 'job', 'job': task_id, 'input': input_path, 'output': expected_ply})
+            while True:
+                message = self.read_message()
+                if message is None:
+                    break
+                if message.get('job') != task_id:
+                    continue
+                if message.get('type') == 'progress':
+                    with task_lock:
+                        if task['status'] == 'processing':
+                            task['stage'] = message.get('stage')
+                            task['progress'] = PREDICT_STAGE_PROGRESS.get(message.get('stage'), task['progress'])
+                            task_changed([task], persist=False)
+                    continue
+                result = message
+                break
         except Exception as e:
             with task_lock:
-                if task_status.get(task_id, {}).get('status') != 'cancelled':
-                    task_status[task_id]['status'] = 'failed'
-                    task_status[task_id]['error'] = str(e)
-            print(f"❌ Task {task_id} exception: {e}")
+                task_log(task_id).append(f"{e}\n")
+
+        with task_lock:
+            task_log(task_id).close()
+            if result is None:
+                # 进程崩溃: 当前任务失败，随后重启进程
+                if task['status'] != 'cancelled':
+                    task['status'] = 'failed'
+                    task['error'] = task_log(task_id).tail() or 'Resident predictor exited unexpectedly.'
+                print(f"💥 Resident predictor on slot {self.slot} crashed during task {task_id}")
+            elif result.get('type') == 'done' and task['status'] != 'cancelled':
+                if os.path.exists(expected_ply):
+                    task['status'] = 'completed'
+                    task['progress'] = 100
+                    task['stage'] = 'done'
+                    print(f"✅ Task {task_id} completed successfully.")
+                    publish_event('gallery', {'action': 'add', 'item': index_gallery_item(name_without_ext)})
+                else:
+                    task['status'] = 'failed'
+                    task['error'] = 'Output file not found after execution.'
+                    print(f"❌ Task {task_id} failed: Output missing.")
+            elif result.get('type') == 'error' and task['status'] != 'cancelled':
+                task['status'] = 'failed'
+                task['error'] = task_log(task_id).tail() + (result.get('error') or 'Unknown error')
+                print(f"❌ Task {task_id} failed: {result.get('error')}")
+            elif task['status'] == 'cancelled':
+                print(f"🛑 Task {task_id} cancelled by user.")
+            running_processes.pop(task_id, None)
+            worker_slots.pop(self.slot, None)
+            self.job_id = None
+            task_changed([task])
+
+        if result is None:
+            self.stop()
+        else:
+            self.jobs += 1
+            rss_mb = result.get('rss_mb')
+            if self.jobs >= PREDICTOR_MAX_JOBS or \
+                    (PREDICTOR_MAX_MEMORY_MB and rss_mb and rss_mb > PREDICTOR_MAX_MEMORY_MB):
+                print(f"♻️ Recycling resident predictor on slot {self.slot} "
+                      f"after {self.jobs} jobs ({rss_mb or 0:.0f} MB)")
+                self.stop()
+        # 立即重启，让下一个任务不用等待模型加载
+        self.ensure_started()
+
+
+def worker(slot):
+    """后台工作线程，持续从队列中取出任务并分批处理 (每个槽位一个线程)"""
+    print(f"👷 Worker thread started (slot {slot})...")
+    predictor = None
+    if PREDICTOR_MODE in ('resident', 'stand-in'):
+        predictor = ResidentPredictor(slot)
+        predictor.ensure_started()  # 启动时预热模型
+    while True:
+        task_id = task_queue.get()
+        if task_id is None:
+            break
+        
+        with task_lock:
+            task = task_status.get(task_id)
+            if not task or task['status'] == 'cancelled':
+                # 任务被取消或不存在，跳过
+                task_queue.task_done()
+                continue
+        
+        if predictor and predictor.ensure_started():
+            try:
+                predictor.run(task_id)
+            finally:
+                task_queue.task_done()
+            continue
+        
+        batch = collect_batch(task_id)
+        try:
+            run_batch(slot, batch)
         finally:
-            # 清理进程引用
+            for _ in batch:
+                task_queue.task_done()
+
+
+# --- 图库索引 (SQLite) ---
+# /api/gallery 直接读取索引；任务完成、删除时更新单条记录，并定期与磁盘对账
+GALLERY_DB_PATH = os.path.join(WORKSPACE_FOLDER, '.gallery.db')
+GALLERY_RECONCILE_SECONDS = int(config.get('gallery_reconcile_seconds', 300))
+GALLERY_IMAGE_EXTS = ['.jpg', '.jpeg', '.png', '.webp', '.JPG', '.PNG']
+GALLERY_EVENT_MAX_ITEMS = 50  # 对账变化较多时只通知前端整体刷新
+GALLERY_PAGE_MAX = 200  # 单页最多条目数
+GALLERY_SORT_COLUMNS = {'date': 'mtime', 'size': 'size'}
+gallery_lock = threading.Lock()
+# 图库变化版本号: 索引每次写入都会递增，作为 /api/gallery 的 ETag (以启动时间起步，重启后也不会重复)
+gallery_version = int(time.time() * 1000)
+gallery_db = sqlite3.connect(GALLERY_DB_PATH, check_same_thread=False)
+gallery_db.execute('PRAGMA journal_mode=WAL')
+gallery_db.execute('PRAGMA synchronous=NORMAL')
+gallery_db.execute(
+    'CREATE TABLE IF NOT EXISTS gallery '
+    '(id TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL, image TEXT, thumb TEXT)'
+)
+gallery_db.execute('CREATE INDEX IF NOT EXISTS gallery_mtime ON gallery (mtime, id)')
+gallery_db.execute('CREATE INDEX IF NOT EXISTS gallery_size ON gallery (size, id)')
+gallery_db.commit()
+
+
+def gallery_item(row):
+    """由索引行构造图库条目 (模型、原图、缩略图地址及大小)，不访问磁盘"""
+    name_without_ext, mtime, size, image, thumb = row
+    ply_rel_path = os.path.relpath(os.path.join(OUTPUT_FOLDER, name_without_ext + '.ply'), BASE_DIR)
+    version = file_version(mtime, size)  # 模型变化后 URL 随之变化，浏览器可长期缓存
+    img_rel_path = os.path.relpath(os.path.join(INPUT_FOLDER, image), BASE_DIR) if image else None
+    # 缩略图不回退到原图 (手机上会加载整张大图)，还在生成时前端先显示占位
+    thumb_pending = bool(image and not thumb and image in thumbnail_pending)
+    thumb_url = None
+    thumb_srcset = None
+    if thumb:
+        # thumb 为已生成的最大倍数缩略图，由文件名后缀得到倍数
+        suffix = thumb[len(name_without_ext):]
+        max_scale = next(
+            (scale for scale in THUMBNAIL_SCALES if suffix.startswith(f'@{scale}x.')), 1
+        )
+        thumb_rel_dir = os.path.relpath(THUMBNAIL_FOLDER, BASE_DIR)
+
+        def thumb_file_url(scale, ext):
+            return f'/files/{thumb_rel_dir}/{thumbnail_name(name_without_ext, scale, ext)}'
+
+        thumb_url = thumb_file_url(1, '.jpg')
+        # 按 MIME 类型给出 srcset，用于 <picture><source type=...>；
+        # 缩略图位尺寸固定，使用像素密度描述符 (1x/2x/3x) 由设备像素比直接选择
+        thumb_srcset = {
+            mime: ', '.join(
+                f'{thumb_file_url(scale, ext)} {scale}x'
+                for scale in THUMBNAIL_SCALES if scale <= max_scale
+            )
+            for ext, _, mime in THUMBNAIL_FORMATS
+        }
+    return {
+        'id': name_without_ext,
+        'name': name_without_ext,
+        'model_url': f'/files/v/{version}/{ply_rel_path}',
+        'splat_url': f'/api/model/v/{version}/{name_without_ext}.splat',
+        'spz_url': f'/api/model/v/{version}/{name_without_ext}.spz',
+        'image_url': f'/files/{img_rel_path}' if img_rel_path else None,
+        'thumb_url': thumb_url,
+        'thumb_srcset': thumb_srcset,
+        'thumb_pending': thumb_pending,
+        'size': size,
+        'mtime': mtime,
+        'version': version
+    }
+
+
+def find_gallery_images(name_without_ext, inputs=None, thumbs=None):
+    """查找模型对应的原图和缩略图文件名；传入目录列表 (集合) 时只查集合，不访问磁盘"""
+    def exists(names, folder, filename):
+        if names is not None:
+            return filename in names
+        return os.path.exists(os.path.join(folder, filename))
+
+    for ext in GALLERY_IMAGE_EXTS:
+        image = name_without_ext + ext
+        if exists(inputs, INPUT_FOLDER, image):
+            # 检查缩略图是否已生成 (首选格式的 1x 最后写入)，返回最大倍数的文件名
+            ext = THUMBNAIL_FORMATS[0][0]
+            if not exists(thumbs, THUMBNAIL_FOLDER, thumbnail_name(name_without_ext, 1, ext)):
+                return image, None
+            for scale in sorted(THUMBNAIL_SCALES, reverse=True):
+                thumb = thumbnail_name(name_without_ext, scale, ext)
+                if exists(thumbs, THUMBNAIL_FOLDER, thumb):
+                    return image, thumb
+    return None, None
+
+
+def index_gallery_item(name_without_ext):
+    """把单个模型写入 (或更新) 图库索引并返回图库条目；模型不存在时移出索引并返回 None"""
+    try:
+        st = os.stat(os.path.join(OUTPUT_FOLDER, name_without_ext + '.ply'))
+    except OSError:
+        unindex_gallery_item(name_without_ext)
+        return None
+    row = (name_without_ext, st.st_mtime, st.st_size) + find_gallery_images(name_without_ext)
+    global gallery_version
+    with gallery_lock, gallery_db:
+        gallery_db.execute('INSERT OR REPLACE INTO gallery VALUES (?, ?, ?, ?, ?)', row)
+        gallery_version += 1
+    return gallery_item(row)
+
+
+def unindex_gallery_item(name_without_ext):
+    """把模型移出图库索引"""
+    global gallery_version
+    with gallery_lock, gallery_db:
+        if gallery_db.execute('DELETE FROM gallery WHERE id = ?', (name_without_ext,)).rowcount:
+            gallery_version += 1
+
+
+def refresh_gallery_thumbnail(name_without_ext):
+    """缩略图生成后更新已在图库中的条目，并原地通知前端"""
+    with gallery_lock:
+        indexed = gallery_db.execute('SELECT 1 FROM gallery WHERE id = ?', (name_without_ext,)).fetchone()
+    if not indexed:
+        return
+    item = index_gallery_item(name_without_ext)
+    if item:
+        publish_event('gallery', {'action': 'update', 'item': item})
+
+
+def reconcile_gallery():
+    """与磁盘对账: 每个目录只列一次，找出新增、变化和已删除的模型，只写入有差异的行"""
+    global gallery_version
+    started = time.time()
+
+    def list_names(folder):
+        try:
+            return set(os.listdir(folder))
+        except OSError:
+            return set()
+
+    inputs = list_names(INPUT_FOLDER)
+    thumbs = list_names(THUMBNAIL_FOLDER)
+    rows = {}
+    try:
+        with os.scandir(OUTPUT_FOLDER) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.ply') or not entry.is_file():
+                    continue
+                st = entry.stat()
+                name_without_ext = os.path.splitext(entry.name)[0]
+                rows[name_without_ext] = (name_without_ext, st.st_mtime, st.st_size) + \
+                    find_gallery_images(name_without_ext, inputs, thumbs)
+    except OSError:
+        pass
+
+    with gallery_lock:
+        indexed = {
+            row[0]: row
+            for row in gallery_db.execute('SELECT id, mtime, size, image, thumb FROM gallery')
+        }
+        changed = [row for name, row in rows.items() if indexed.get(name) != row]
+        removed = [name for name in indexed if name not in rows]
+        if changed or removed:
+            with gallery_db:
+                gallery_db.executemany('INSERT OR REPLACE INTO gallery VALUES (?, ?, ?, ?, ?)', changed)
+                gallery_db.executemany('DELETE FROM gallery WHERE id = ?', [(name,) for name in removed])
+            gallery_version += 1
+
+    if not changed and not removed:
+        return
+    print(f"🗂️ Gallery index reconciled: {len(changed)} updated, {len(removed)} removed "
+          f"({len(rows)} models, {time.time() - started:.2f}s)")
+    if len(changed) + len(removed) > GALLERY_EVENT_MAX_ITEMS:
+        publish_event('gallery', {'action': 'reset'})
+        return
+    for row in changed:
+        publish_event('gallery', {'action': 'add', 'item': gallery_item(row)})
+    for name in removed:
+        publish_event('gallery', {'action': 'delete', 'id': name})
+
+
+def gallery_reconcile_loop():
+    """定期对账，捕获在应用之外增删的模型 (如手动拷贝到 outputs/)"""
+    while True:
+        time.sleep(GALLERY_RECONCILE_SECONDS)
+        try:
+            reconcile_gallery()
+        except Exception as e:
+            print(f"⚠️ Gallery reconcile failed: {e}")
+
+
+# --- 上传去重 (内容哈希) ---
+# 上传时边写盘边计算 SHA-256，内容哈希 → 输入文件名记录在图库库中:
+# 重复上传的图片直接复用已有模型，同名但内容不同的图片改用带哈希后缀的文件名，不覆盖之前的输入
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_NAME_HASH_CHARS = (8, 16, 64)  # 同名冲突时依次尝试的哈希后缀长度
+upload_lock = threading.Lock()
+gallery_db.execute('CREATE TABLE IF NOT EXISTS uploads (hash TEXT PRIMARY KEY, filename TEXT NOT NULL)')
+gallery_db.execute('CREATE INDEX IF NOT EXISTS uploads_filename ON uploads (filename)')
+gallery_db.commit()
+
+
+def hash_file(path):
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_upload(file):
+    """把上传流写入输入目录下的临时文件，同时计算内容哈希，返回 (临时路径, 哈希)"""
+    tmp_path = os.path.join(INPUT_FOLDER, f'.upload-{uuid.uuid4().hex}.tmp')
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest()
+
+
+def record_upload_hash(digest, filename):
+    """记录内容哈希对应的输入文件名"""
+    with gallery_lock, gallery_db:
+        gallery_db.execute('INSERT OR REPLACE INTO uploads VALUES (?, ?)', (digest, filename))
+
+
+def forget_upload_hashes(name_without_ext):
+    """删除图库项目时移除其输入文件的哈希记录，返回被移除的哈希"""
+    filenames = [name_without_ext + ext for ext in GALLERY_IMAGE_EXTS]
+    with gallery_lock, gallery_db:
+        digests = [
+            digest for (digest,) in gallery_db.execute(
+                f'SELECT hash FROM uploads WHERE filename IN ({",".join("?" * len(filenames))})', filenames
+            )
+        ]
+        gallery_db.executemany('DELETE FROM uploads WHERE filename = ?', [(filename,) for filename in filenames])
+    return digests
+
+
+def model_name_taken(name_without_ext):
+    """模型名是否已被占用: 任意扩展名的同名输入、同名模型或正在排队/处理的同名任务"""
+    if any(os.path.exists(os.path.join(INPUT_FOLDER, name_without_ext + ext)) for ext in GALLERY_IMAGE_EXTS):
+        return True
+    if os.path.exists(os.path.join(OUTPUT_FOLDER, name_without_ext + '.ply')):
+        return True
+    with task_lock:
+        return any(
+            os.path.splitext(task['filename'])[0] == name_without_ext
+            for task in task_status.values() if task['status'] in ('pending', 'processing')
+        )
+
+
+def claim_upload(tmp_path, digest, filename):
+    """为上传的文件确定输入文件名，返回 (文件名, 是否为已有内容) (调用方需持有 upload_lock)
+
+    内容已存在时删除临时文件、复用已有输入；否则把临时文件移动到最终位置。
+    模型名已被其他内容占用 (其他扩展名的同名输入、同名模型或任务) 时，文件名加上内容哈希后缀
+    """
+    with gallery_lock:
+        row = gallery_db.execute('SELECT filename FROM uploads WHERE hash = ?', (digest,)).fetchone()
+    if row and os.path.exists(os.path.join(INPUT_FOLDER, row[0])):
+        os.remove(tmp_path)
+        return row[0], True
+
+    stem, ext = os.path.splitext(filename)
+    for candidate in [filename] + [f'{stem}-{digest[:n]}{ext}' for n in UPLOAD_NAME_HASH_CHARS]:
+        input_path = os.path.join(INPUT_FOLDER, candidate)
+        if os.path.exists(input_path):
+            # 建立哈希索引之前上传的同一张图片
+            if hash_file(input_path) == digest:
+                record_upload_hash(digest, candidate)
+                os.remove(tmp_path)
+                return candidate, True
+            continue
+        if not model_name_taken(os.path.splitext(candidate)[0]):
+            break
+    else:
+        # 所有候选名都被其他内容占用: 使用随机后缀，保证不覆盖已有文件
+        candidate = f'{stem}-{uuid.uuid4().hex}{ext}'
+        input_path = os.path.join(INPUT_FOLDER, candidate)
+    if os.path.exists(input_path):
+        os.remove(tmp_path)
+        raise FileExistsError(f'Input file already exists: {candidate}')
+    os.replace(tmp_path, input_path)
+    record_upload_hash(digest, candidate)
+    return candidate, False
+
+
+def queue_uploaded_files(claimed):
+    """为已保存的上传文件创建任务并入队，返回 (任务列表, 新入队数, 重复数)
+
+    claimed 为 claim_upload 的结果 [(文件名, 是否为已有内容)]。内容重复时不重新推理:
+    同一张图片正在排队或处理时返回原来的任务，模型已存在时任务直接完成
+    """
+    created_tasks = []
+    reused_tasks = []  # 内容重复: 正在处理的同一张图片的任务
+    reused_models = []  # 内容重复且模型已存在，直接完成
+    duplicate_count = 0
+
+    for filename, duplicate in claimed:
+        input_path = os.path.join(app.config['INPUT_FOLDER'], filename)
+        name_without_ext = os.path.splitext(filename)[0]
+        reuse_model = False
+
+        if duplicate:
+            duplicate_count += 1
+            # 同一批上传中已经加入过
+            if any(task['filename'] == filename for task in created_tasks):
+                continue
             with task_lock:
-                running_processes.pop(task_id, None)
-        
-        task_queue.task_done()
+                active = next((
+                    task for task in task_status.values()
+                    if task['filename'] == filename and task['status'] in ('pending', 'processing')
+                ), None)
+            if active:
+                reused_tasks.append(active)
+                print(f"♻️ Duplicate upload: {filename} is already queued (ID: {active['id']})")
+                continue
+            reuse_model = os.path.exists(os.path.join(app.config['OUTPUT_FOLDER'], name_without_ext + '.ply'))
+        else:
+            # 缩略图交给后台线程池生成
+            schedule_thumbnail(input_path, filename)
+
+        task_id = str(uuid.uuid4())
+        task_info = {
+            'id': task_id,
+            'status': 'pending',
+            'filename': filename,
+            'input_path': input_path,
+            'output_folder': app.config['OUTPUT_FOLDER'],
+            'created_at': time.time(),
+            'error': None
+        }
+        if reuse_model:
+            # 相同内容的模型已存在，不再重新推理
+            task_info.update({'status': 'completed', 'progress': 100, 'stage': 'done', 'duplicate': True})
+            reused_models.append(name_without_ext)
+            print(f"♻️ Duplicate upload: {filename} reuses the existing model (ID: {task_id})")
+        else:
+            print(f"📥 Task added: {filename} (ID: {task_id})")
+        created_tasks.append(task_info)
+
+    # 所有任务在一个事务中写入任务库，再统一入队
+    with task_lock:
+        for task_info in created_tasks:
+            task_status[task_info['id']] = task_info
+        task_changed(created_tasks)
+        tasks = [public_task(task) for task in created_tasks + reused_tasks]
+    queued = [task_info for task_info in created_tasks if task_info['status'] == 'pending']
+    for task_info in queued:
+        task_queue.put(task_info['id'])
+    for name_without_ext in reused_models:
+        publish_event('gallery', {'action': 'add', 'item': index_gallery_item(name_without_ext)})
+    return tasks, len(queued), duplicate_count
+
+
+# --- 分块断点续传上传 ---
+# POST /api/uploads 创建上传 → PUT /api/uploads/<id>?offset=N 依次追加分块 → POST .../finalize 校验哈希并入队。
+# 分块直接追加到输入目录下的 .part 文件，同时增量计算哈希；元数据另存一份 .json，服务器重启后仍可续传
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024  # 建议的分块大小 (客户端可以更小)
+UPLOAD_SESSION_SECONDS = 24 * 3600  # 超过该时间未完成的上传被清理
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+upload_sessions = {}  # 上传 ID → 会话 (文件名、大小、期望哈希、增量哈希状态)
+
+
+def upload_part_path(upload_id):
+    return os.path.join(INPUT_FOLDER, f'.upload-{upload_id}.part')
+
+
+def upload_meta_path(upload_id):
+    return os.path.join(INPUT_FOLDER, f'.upload-{upload_id}.json')
 
 
-# 启动后台线程
-threading.Thread(target=worker, daemon=True).start()
-# 启动清理线程
-threading.Thread(target=cleanup_old_tasks, daemon=True).start()
+def get_upload_session(upload_id):
+    """取得上传会话；内存中没有时 (服务器重启后) 从元数据文件恢复，哈希在完成时重新计算"""
+    if not UPLOAD_ID_RE.match(upload_id):
+        return None
+    with upload_lock:
+        session = upload_sessions.get(upload_id)
+        if session is None:
+            try:
+                with open(upload_meta_path(upload_id)) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if not os.path.exists(upload_part_path(upload_id)):
+                return None
+            session = dict(meta, id=upload_id, hasher=None, hashed=0, lock=threading.Lock())
+            upload_sessions[upload_id] = session
+        return session
+
+
+def discard_upload_session(upload_id):
+    """删除上传会话及其临时文件；持有会话锁的请求看到 closed 后返回 404
+
+    文件在 upload_lock 内删除，避免并发请求在删除过程中从残留的元数据恢复出新会话
+    """
+    with upload_lock:
+        session = upload_sessions.pop(upload_id, None)
+        if session:
+            session['closed'] = True
+        for path in (upload_part_path(upload_id), upload_meta_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def cleanup_stale_uploads():
+    """清理长时间未完成的上传 (.part / .json) 和中断的单次上传 (.tmp)"""
+    cutoff = time.time() - UPLOAD_SESSION_SECONDS
+    removed = 0
+    stale = []
+    try:
+        with os.scandir(INPUT_FOLDER) as entries:
+            for entry in entries:
+                if not entry.name.startswith('.upload-'):
+                    continue
+                upload_id = entry.name[len('.upload-'):].split('.')[0]
+                # 以 .part 的修改时间 (最后一次写入分块) 为准
+                if entry.name.endswith('.json') and os.path.exists(upload_part_path(upload_id)):
+                    continue
+                if entry.stat().st_mtime < cutoff:
+                    stale.append(entry.name)
+    except OSError:
+        return
+    for name in stale:
+        upload_id = name[len('.upload-'):].split('.')[0]
+        if name.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(INPUT_FOLDER, name))
+            except OSError:
+                pass
+            removed += 1
+            continue
+        # 与分块和完成请求使用同一把会话锁，不在写入或完成的过程中删除文件
+        session = get_upload_session(upload_id)
+        if session is None:
+            discard_upload_session(upload_id)
+            removed += 1
+            continue
+        with session['lock']:
+            try:
+                # 等待锁期间可能刚写入了新的分块
+                fresh = os.path.getmtime(upload_part_path(upload_id)) >= cutoff
+            except OSError:
+                fresh = False
+            if session.get('closed') or fresh:
+                continue
+            discard_upload_session(upload_id)
+        removed += 1
+    if removed:
+        print(f"🧹 Cleaned up {removed} stale upload files")
+
+
+# debug 模式下 werkzeug reloader 的父进程只负责监视文件变化，不恢复任务、不启动后台线程，
+# 否则父子进程会重复处理同一批任务
+if not (__name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'):
+    restore_tasks()
+    # 启动后台线程 (每个槽位一个)
+    for slot in range(1, WORKER_COUNT + 1):
+        threading.Thread(target=worker, args=(slot,), daemon=True).start()
+    # 启动清理线程
+    threading.Thread(target=cleanup_old_tasks, daemon=True).start()
+    # 启动后台压缩线程
+    threading.Thread(target=compress_worker, daemon=True).start()
+    # 缩略图尺寸变化后 (升级) 先删除旧缩略图，随后的对账会更新图库
+    invalidate_stale_thumbnails()
+    # 启动时先同步对账一次 (首次运行时建立索引)，之后在后台定期对账
+    reconcile_gallery()
+    threading.Thread(target=gallery_reconcile_loop, daemon=True).start()
+    # 启动缩略图线程池，并补齐缺失的缩略图
+    for _ in range(THUMBNAIL_WORKERS):
+        threading.Thread(target=thumbnail_worker, daemon=True).start()
+    backfill_thumbnails()
 
 
 # --- 路由 ---
@@ -348,11 +2536,13 @@ def index():
 @app.route('/assets/<path:filename>')
 def react_assets(filename):
     """服务 React 静态资源"""
-    return send_from_directory(
+    response = send_from_directory(
         os.path.join(REACT_BUILD_DIR, 'assets'), 
         filename,
-        max_age=31536000  # 1 year cache
+        max_age=IMMUTABLE_MAX_AGE  # 1 year cache (文件名带内容哈希)
     )
+    response.cache_control.immutable = True
+    return response
 
 
 # React 前端根目录静态文件 (favicon, manifest 等)
@@ -373,43 +2563,100 @@ def react_root_static(filename):
     abort(404)
 
 
+def encode_gallery_cursor(row, column):
+    """分页游标: 上一页最后一条的排序值和 id (不透明字符串)"""
+    key = row[1] if column == 'mtime' else row[2]
+    return base64.urlsafe_b64encode(json.dumps([key, row[0]]).encode()).decode().rstrip('=')
+
+
+def decode_gallery_cursor(cursor):
+    """解析分页游标，格式不正确时返回 None"""
+    try:
+        key, item_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(key, (int, float)) or not isinstance(item_id, str):
+        return None
+    return key, item_id
+
+
 @app.route('/api/gallery')
 def get_gallery():
-    """获取图库列表"""
-    items = []
-    if os.path.exists(OUTPUT_FOLDER):
-        files = [f for f in os.listdir(OUTPUT_FOLDER) if f.endswith('.ply')]
-        files.sort(key=lambda x: os.path.getmtime(os.path.join(OUTPUT_FOLDER, x)), reverse=True)
-
-        for ply_filename in files:
-            name_without_ext = os.path.splitext(ply_filename)[0]
-            ply_path = os.path.join(OUTPUT_FOLDER, ply_filename)
-            ply_rel_path = os.path.relpath(ply_path, BASE_DIR)
-            
-            # 获取文件大小
-            ply_size = os.path.getsize(ply_path)
-            
-            img_rel_path = None
-            thumb_rel_path = None
-            for ext in ['.jpg', '.jpeg', '.png', '.webp', '.JPG', '.PNG']:
-                possible_img = os.path.join(INPUT_FOLDER, name_without_ext + ext)
-                if os.path.exists(possible_img):
-                    img_rel_path = os.path.relpath(possible_img, BASE_DIR)
-                    # 检查缩略图是否存在
-                    thumb_path = os.path.join(THUMBNAIL_FOLDER, name_without_ext + '.jpg')
-                    if os.path.exists(thumb_path):
-                        thumb_rel_path = os.path.relpath(thumb_path, BASE_DIR)
-                    break
-            
-            items.append({
-                'id': name_without_ext,
-                'name': name_without_ext,
-                'model_url': f'/files/{ply_rel_path}',
-                'image_url': f'/files/{img_rel_path}' if img_rel_path else None,
-                'thumb_url': f'/files/{thumb_rel_path}' if thumb_rel_path else (f'/files/{img_rel_path}' if img_rel_path else None),
-                'size': ply_size
-            })
-    return jsonify(items)
+    """
+    获取图库列表 (从图库索引读取，不扫描目录)
+    参数: limit (每页条数), cursor (上一页返回的 next_cursor), q (名称前缀),
+          sort (date / size), order (desc / asc)
+    不带 limit 和 cursor 时返回完整列表 (数组)，否则返回 {items, next_cursor, total, version}
+    图库未变化时，带 If-None-Match 的请求返回 304
+    """
+    etag = f'gallery-{gallery_version}'
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    sort = request.args.get('sort', 'date')
+    order = request.args.get('order', 'desc')
+    if sort not in GALLERY_SORT_COLUMNS or order not in ('desc', 'asc'):
+        return jsonify({'error': 'Invalid sort'}), 400
+    column = GALLERY_SORT_COLUMNS[sort]
+    paged = 'limit' in request.args or 'cursor' in request.args
+    limit = None
+    if paged:
+        try:
+            limit = min(max(int(request.args.get('limit', 50)), 1), GALLERY_PAGE_MAX)
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+
+    where = []
+    params = []
+    prefix = request.args.get('q', '')
+    if prefix:
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        where.append("id LIKE ? ESCAPE '\\'")
+        params.append(escaped + '%')
+    filter_sql = f' WHERE {" AND ".join(where)}' if where else ''
+    filter_params = list(params)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = decode_gallery_cursor(cursor)
+        if position is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        # 按 (排序值, id) 定位，删除或新增条目不会导致翻页重复或遗漏
+        op = '<' if order == 'desc' else '>'
+        where.append(f'({column} {op} ? OR ({column} = ? AND id {op} ?))')
+        params += [position[0], position[0], position[1]]
+
+    direction = 'DESC' if order == 'desc' else 'ASC'
+    sql = 'SELECT id, mtime, size, image, thumb FROM gallery'
+    if where:
+        sql += f' WHERE {" AND ".join(where)}'
+    sql += f' ORDER BY {column} {direction}, id {direction}'
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit + 1)
+
+    with gallery_lock:
+        version = gallery_version
+        rows = gallery_db.execute(sql, params).fetchall()
+        total = gallery_db.execute('SELECT COUNT(*) FROM gallery' + filter_sql, filter_params).fetchone()[0] \
+            if paged else len(rows)
+
+    if paged:
+        next_cursor = encode_gallery_cursor(rows[limit - 1], column) if len(rows) > limit else None
+        response = jsonify({
+            'items': [gallery_item(row) for row in rows[:limit]],
+            'next_cursor': next_cursor,
+            'total': total,
+            'version': version
+        })
+    else:
+        response = jsonify([gallery_item(row) for row in rows])
+    response.set_etag(f'gallery-{version}')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 @app.route('/api/generate', methods=['POST'])
@@ -422,54 +2669,255 @@ def generate():
     if not files or files[0].filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    created_tasks = []
-
+    claimed = []
     for file in files:
         if file:
-            filename = secure_filename(file.filename)
-            input_path = os.path.join(app.config['INPUT_FOLDER'], filename)
-            file.save(input_path)
-            
-            # 生成缩略图
-            generate_thumbnail(input_path, filename)
-            
-            task_id = str(uuid.uuid4())
-            task_info = {
-                'id': task_id,
-                'status': 'pending',
-                'filename': filename,
-                'input_path': input_path,
-                'output_folder': app.config['OUTPUT_FOLDER'],
-                'created_at': time.time(),
-                'error': None
-            }
-            
-            with task_lock:
-                task_status[task_id] = task_info
-            task_queue.put(task_id)
-            created_tasks.append(task_info)
-            print(f"📥 Task added: {filename} (ID: {task_id})")
+            # 边写盘边计算内容哈希，确定不会覆盖其他图片的文件名
+            tmp_path, digest = save_upload(file)
+            with upload_lock:
+                claimed.append(claim_upload(tmp_path, digest, secure_filename(file.filename)))
+
+    tasks, queued, duplicate_count = queue_uploaded_files(claimed)
+    return jsonify({
+        'success': True,
+        'message': f'{queued} tasks queued',
+        'duplicates': duplicate_count,
+        'tasks': tasks
+    })
+
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """创建分块上传: {filename, size, sha256 (可选)} → {id, offset, chunk_size}"""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename') or ''))
+    size = data.get('size')
+    sha256 = data.get('sha256')
+    if not filename:
+        return jsonify({'error': 'Missing filename'}), 400
+    if not isinstance(size, int) or isinstance(size, bool) or size < 1:
+        return jsonify({'error': 'Invalid size'}), 400
+    if sha256 is not None and not re.fullmatch(r'[0-9a-fA-F]{64}', str(sha256)):
+        return jsonify({'error': 'Invalid sha256'}), 400
+
+    upload_id = uuid.uuid4().hex
+    meta = {
+        'filename': filename,
+        'size': size,
+        'sha256': sha256.lower() if sha256 else None,
+        'created_at': time.time()
+    }
+    open(upload_part_path(upload_id), 'wb').close()
+    with open(upload_meta_path(upload_id), 'w') as f:
+        json.dump(meta, f)
+    with upload_lock:
+        upload_sessions[upload_id] = dict(
+            meta, id=upload_id, hasher=hashlib.sha256(), hashed=0, lock=threading.Lock()
+        )
+    return jsonify({'id': upload_id, 'offset': 0, 'size': size, 'chunk_size': UPLOAD_CHUNK_BYTES})
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """查询上传进度 (续传时从返回的 offset 继续)"""
+    session = get_upload_session(upload_id)
+    if not session:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        offset = os.path.getsize(upload_part_path(upload_id))
+    except OSError:
+        return jsonify({'error': 'Upload not found'}), 404  # 刚完成或被放弃
+    return jsonify({
+        'id': upload_id,
+        'filename': session['filename'],
+        'size': session['size'],
+        'offset': offset,
+        'chunk_size': UPLOAD_CHUNK_BYTES
+    })
+
 
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """追加一个分块: 请求体为原始字节，?offset= 必须等于已接收的字节数，否则返回 409 和当前 offset"""
+    session = get_upload_session(upload_id)
+    if not session:
+        return jsonify({'error': 'Upload not found'}), 404
+    offset = request.args.get('offset', type=int)
+    part_path = upload_part_path(upload_id)
+
+    with session['lock']:
+        # 等待锁期间上传可能已完成或被放弃
+        if session.get('closed'):
+            return jsonify({'error': 'Upload not found'}), 404
+        current = os.path.getsize(part_path)
+        if offset != current:
+            return jsonify({'error': 'Offset mismatch', 'offset': current}), 409
+        # 增量哈希只在与文件内容同步时继续 (重启后恢复的会话在完成时重新计算)
+        hasher = session['hasher'] if session['hashed'] == current else None
+        written = current
+        try:
+            with open(part_path, 'ab') as f:
+                for chunk in iter(lambda: request.stream.read(UPLOAD_CHUNK_SIZE), b''):
+                    if written + len(chunk) > session['size']:
+                        f.truncate(current)
+                        written = current
+                        hasher = None
+                        return jsonify({'error': 'Chunk exceeds declared size', 'offset': current}), 400
+                    f.write(chunk)
+                    if hasher:
+                        hasher.update(chunk)
+                    written += len(chunk)
+        finally:
+            # 连接中断时已写入的部分保留，客户端从新的 offset 续传
+            session['hashed'] = written if hasher else -1
+
+    return jsonify({'id': upload_id, 'offset': written, 'size': session['size']})
+
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """完成上传: 校验大小和 SHA-256，随即创建任务并入队 (不等待同批的其他文件)"""
+    session = get_upload_session(upload_id)
+    if not session:
+        return jsonify({'error': 'Upload not found'}), 404
+    part_path = upload_part_path(upload_id)
+    expected = (request.get_json(silent=True) or {}).get('sha256') or session['sha256']
+
+    with session['lock']:
+        if session.get('closed'):
+            return jsonify({'error': 'Upload not found'}), 404
+        received = os.path.getsize(part_path)
+        if received != session['size']:
+            return jsonify({'error': 'Upload incomplete', 'offset': received}), 409
+        if session['hasher'] is not None and session['hashed'] == received:
+            digest = session['hasher'].hexdigest()
+        else:
+            digest = hash_file(part_path)
+        if expected and digest != str(expected).lower():
+            discard_upload_session(upload_id)
+            return jsonify({'error': 'Hash mismatch', 'sha256': digest}), 400
+        with upload_lock:
+            claimed = claim_upload(part_path, digest, session['filename'])
+        discard_upload_session(upload_id)
+
+    tasks, queued, duplicate_count = queue_uploaded_files([claimed])
     return jsonify({
         'success': True,
-        'message': f'{len(created_tasks)} tasks queued',
-        'tasks': created_tasks
+        'message': f'{queued} tasks queued',
+        'duplicates': duplicate_count,
+        'sha256': digest,
+        'tasks': tasks
     })
 
 
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """放弃上传并删除已接收的数据"""
+    session = get_upload_session(upload_id)
+    if not session:
+        return jsonify({'error': 'Upload not found'}), 404
+    with session['lock']:
+        if session.get('closed'):
+            return jsonify({'error': 'Upload not found'}), 404
+        discard_upload_session(upload_id)
+    return jsonify({'success': True})
+
+
 @app.route('/api/tasks')
 def get_tasks():
-    """获取所有任务状态，支持智能轮询"""
+    """获取任务状态，支持智能轮询和增量查询 (?since=<version> 只返回之后变化或删除的任务)"""
+    since = request.args.get('since', type=int)
     with task_lock:
-        tasks = list(task_status.values())
+        # 没有版本号、版本号来自更新的进程 (重启前) 或删除记录已被丢弃时返回全量
+        full = since is None or since > task_version or since < removed_floor
+        tasks = [
+            public_task(t) for t in task_status.values()
+            if full or t.get('version', 0) > since
+        ]
+        removed = [] if full else [task_id for version, task_id in removed_tasks if version > since]
+        # 计算是否有活跃任务，前端用于智能轮询
+        has_active = any(t['status'] in ('pending', 'processing') for t in task_status.values())
+        workers = [
+            {'slot': slot, 'task_id': worker_slots.get(slot)}
+            for slot in range(1, WORKER_COUNT + 1)
+        ]
+        version = task_version
     tasks.sort(key=lambda x: x['created_at'], reverse=True)
     
-    # 计算是否有活跃任务，前端用于智能轮询
-    has_active = any(t['status'] in ('pending', 'processing') for t in tasks)
-    
     return jsonify({
         'tasks': tasks,
-        'has_active': has_active  # 新增：告知前端是否需要频繁轮询
+        'removed': removed,  # 增量查询时已删除的任务 ID
+        'full': full,  # True 表示 tasks 是完整列表，前端应整体替换
+        'version': version,  # 下次轮询传入 ?since=
+        'has_active': has_active,  # 新增：告知前端是否需要频繁轮询
+        'workers': workers  # 各槽位当前运行的任务
+    })
+
+
+@app.route('/api/task/<task_id>/error')
+def get_task_error(task_id):
+    """获取任务的完整错误日志 (任务列表中只包含最后一行摘要)"""
+    with task_lock:
+        task = task_status.get(task_id)
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        return jsonify({'id': task_id, 'status': task['status'], 'error': task.get('error') or ''})
+
+
+@app.route('/api/task/<task_id>/log')
+def get_task_log(task_id):
+    """增量读取任务输出: ?offset= 传入上次返回的 next_offset，可持续轮询运行中的任务"""
+    offset = request.args.get('offset', 0, type=int)
+    if offset < 0:
+        return jsonify({'error': 'offset must be >= 0'}), 400
+    path = task_log_path(task_id)
+    with task_lock:
+        task = task_status.get(task_id)
+        log = task_logs.get(task_id)
+        if not task and not log and not os.path.exists(path):
+            return jsonify({'error': 'Task not found'}), 404
+        running = bool(task) and task['status'] in ('pending', 'processing')
+        size = log.size if log else None
+        text = None
+        truncated = False
+        start_offset = offset  # 返回文本实际对应的起始偏移
+        # 请求的位置仍在内存环形缓冲内: 直接返回 (offset 落在行中间时返回该行剩余部分)
+        if log and (offset >= log.size or (log.lines and offset >= log.lines[0][0])):
+            parts = []
+            for start, line in log.lines:
+                if start >= offset:
+                    parts.append(line)
+                elif offset < log.size:
+                    data = line.encode('utf-8', 'replace')
+                    if start + len(data) > offset:
+                        parts.append(data[offset - start:].decode('utf-8', 'replace'))
+            text = ''.join(parts)
+            next_offset = max(offset, log.size)
+        elif log and not TASK_LOG_TO_FILE:
+            # 更早的内容已被覆盖且没有日志文件，只能从缓冲区最早的一行开始
+            text = log.tail()
+            start_offset = log.lines[0][0] if log.lines else log.size
+            next_offset = log.size
+            truncated = True
+    if text is None:
+        # 从日志文件读取 (较早的内容，或服务重启后的历史任务)
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(TASK_LOG_READ_MAX)
+            size = size if size is not None else os.path.getsize(path)
+        except OSError:
+            data = b''
+            size = size or 0
+        text = data.decode('utf-8', 'replace')
+        next_offset = offset + len(data)
+    return jsonify({
+        'id': task_id,
+        'offset': start_offset,  # 内容被截断时大于请求的 offset
+        'next_offset': next_offset,
+        'text': text,
+        'truncated': truncated,  # True 表示 offset 之后的部分内容已不可用 (text 从返回的 offset 开始)
+        'done': not running and next_offset >= (size or 0)  # 任务已结束且已读到末尾
     })
 
 
@@ -483,10 +2931,12 @@ def cancel_task(task_id):
         
         if task['status'] == 'pending':
             task['status'] = 'cancelled'
+            task_changed([task])
             return jsonify({'success': True, 'message': 'Task cancelled'})
         elif task['status'] == 'processing':
             # 标记为取消状态，worker 会检测到并终止进程
             task['status'] = 'cancelled'
+            task_changed([task])
             # 尝试立即终止进程
             process = running_processes.get(task_id)
             if process:
@@ -499,6 +2949,44 @@ def cancel_task(task_id):
             return jsonify({'success': False, 'error': f"Task already {task['status']}"}), 400
 
 
+@app.route('/api/events')
+def task_events():
+    """Server-Sent Events: 推送任务状态/进度变化和图库增删，连接时先发送一次任务快照"""
+    subscriber = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+    # 在 task_lock 内同时取快照和订阅，保证两者之间不丢事件
+    with task_lock:
+        tasks = sorted(task_status.values(), key=lambda x: x['created_at'], reverse=True)
+        snapshot = json.dumps({
+            'tasks': [public_task(t) for t in tasks],
+            'has_active': any(t['status'] in ('pending', 'processing') for t in tasks),
+            'version': task_version
+        })
+        with event_lock:
+            event_subscribers.add(subscriber)
+
+    def generate_events():
+        try:
+            yield 'retry: 3000\n\n'
+            yield f"event: snapshot\ndata: {snapshot}\n\n"
+            while True:
+                try:
+                    message = subscriber.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    if subscriber not in event_subscribers:
+                        return  # 积压过多已被断开
+                    yield ': keepalive\n\n'
+                    continue
+                yield message
+        finally:
+            with event_lock:
+                event_subscribers.discard(subscriber)
+
+    response = Response(generate_events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 
 @app.route('/api/delete/<item_id>', methods=['DELETE'])
 def delete_item(item_id):
@@ -507,6 +2995,7 @@ def delete_item(item_id):
         # 删除模型
         ply_path = os.path.join(OUTPUT_FOLDER, item_id + ".ply")
         if os.path.exists(ply_path):
+            discard_cached_splat(ply_path)
             os.remove(ply_path)
         
         # 删除原图 (尝试所有可能的扩展名)
@@ -514,7 +3003,18 @@ def delete_item(item_id):
             img_path = os.path.join(INPUT_FOLDER, item_id + ext)
             if os.path.exists(img_path):
                 os.remove(img_path)
-                
+
+        # 删除各尺寸缩略图
+        for scale in THUMBNAIL_SCALES:
+            for ext in ('.webp', '.jpg'):
+                thumb_path = os.path.join(THUMBNAIL_FOLDER, thumbnail_name(item_id, scale, ext))
+                if os.path.exists(thumb_path):
+                    os.remove(thumb_path)
+        
+        unindex_gallery_item(item_id)
+        for digest in forget_upload_hashes(item_id):
+            discard_preprocessed_input(digest)
+        publish_event('gallery', {'action': 'delete', 'id': item_id})
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -522,12 +3022,12 @@ def delete_item(item_id):
 
 @app.route('/api/download/<item_id>')
 def download_model(item_id):
-    """下载模型文件"""
+    """下载模型文件 (支持断点续传)"""
     ply_path = os.path.join(OUTPUT_FOLDER, item_id + ".ply")
     if not os.path.exists(ply_path):
         return jsonify({'error': 'File not found'}), 404
     
-    return send_from_directory(
+    return send_versioned_file(
         OUTPUT_FOLDER, 
         item_id + ".ply",
         as_attachment=True,
@@ -535,9 +3035,118 @@ def download_model(item_id):
     )
 
 
+@app.route('/api/model/<model_id>.splat')
+@app.route('/api/model/v/<version>/<model_id>.splat')
+def get_model_splat(model_id, version=None):
+    """以紧凑 .splat 格式提供模型 (读取转换缓存，未命中时转换)
+
+    .splat 按重要性排序，任意前缀都是有效的粗糙模型:
+    - ?lod=0..k: 按 SPLAT_LOD_POINTS 截断，k = len(SPLAT_LOD_POINTS) 为完整模型
+    - ?max_points=N: 只返回前 N 个点
+    支持 Range / ETag；带当前版本号的 URL (/api/model/v/<version>/) 可长期缓存
+    """
+    ply_path = os.path.join(OUTPUT_FOLDER, f"{model_id}.ply")
+    try:
+        st = os.stat(ply_path)
+    except OSError:
+        return jsonify({'error': 'Model not found'}), 404
+
+    max_points = None
+    lod = request.args.get('lod', type=int)
+    if lod is not None:
+        if not 0 <= lod <= len(SPLAT_LOD_POINTS):
+            return jsonify({'error': f'lod must be between 0 and {len(SPLAT_LOD_POINTS)}'}), 400
+        if lod < len(SPLAT_LOD_POINTS):
+            max_points = SPLAT_LOD_POINTS[lod]
+    if 'max_points' in request.args:
+        limit = request.args.get('max_points', type=int)
+        if limit is None or limit < 1:
+            return jsonify({'error': 'max_points must be a positive integer'}), 400
+        max_points = limit if max_points is None else min(max_points, limit)
+
+    # ETag 由源 PLY 版本、转换格式版本和截断点数决定，命中时无需转换或读取缓存
+    ply_version = file_version(st.st_mtime, st.st_size)
+    immutable = version == ply_version
+    etag = f"{ply_version}-v{SPLAT_FORMAT_VERSION}-{max_points or 'all'}"
+    # 完整模型按 Accept-Encoding 提供预压缩变体；截断的 LOD 前缀较小，始终发送原始内容
+    encodings = CONTENT_ENCODINGS if max_points is None else []
+    response = not_modified([etag] + [f'{etag}-{encoding}' for encoding in encodings], immutable)
+    if response:
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    try:
+        f = get_cached_splat(ply_path)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    total_points = os.fstat(f.fileno()).st_size // SPLAT_DTYPE.itemsize
+    points = total_points if max_points is None else min(max_points, total_points)
+    length = points * SPLAT_DTYPE.itemsize
+
+    encoding, variant_path = select_encoded_variant(f.name) if encodings else (None, None)
+    if encoding:
+        try:
+            variant_file = open(variant_path, 'rb')
+        except OSError:
+            encoding = None  # 变体刚被淘汰，发送原始内容
+    if encoding:
+        f.close()
+        f = variant_file
+        response = send_file_range(f, os.fstat(f.fileno()).st_size, f'{etag}-{encoding}', immutable)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_file_range(f, length, etag, immutable)
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.headers['X-Splat-Points'] = str(points)
+    response.headers['X-Splat-Total-Points'] = str(total_points)
+    response.headers['Access-Control-Expose-Headers'] = 'X-Splat-Points, X-Splat-Total-Points'
+    return response
+
+
+@app.route('/api/model/<model_id>.spz')
+@app.route('/api/model/v/<version>/<model_id>.spz')
+def get_model_spz(model_id, version=None):
+    """以量化压缩的 .spz 格式提供模型 (自带 gzip，体积约为 .splat 的一半或更小)
+
+    响应头 X-Quantization-Error 为相对源 PLY 的误差统计 (JSON)
+    """
+    ply_path = os.path.join(OUTPUT_FOLDER, f"{model_id}.ply")
+    try:
+        st = os.stat(ply_path)
+    except OSError:
+        return jsonify({'error': 'Model not found'}), 404
+
+    ply_version = file_version(st.st_mtime, st.st_size)
+    immutable = version == ply_version
+    etag = f"{ply_version}-spz{SPZ_FORMAT_VERSION}"
+    response = not_modified([etag], immutable)
+    if response:
+        return response
+
+    try:
+        f, metrics = get_cached_spz(ply_path)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    response = send_file_range(f, os.fstat(f.fileno()).st_size, etag, immutable)
+    if metrics:
+        response.headers['X-Splat-Points'] = str(metrics['points'])
+        response.headers['X-Quantization-Error'] = json.dumps(
+            {key: float(f'{value:.4g}') if isinstance(value, float) else value for key, value in metrics.items()},
+            separators=(',', ':')
+        )
+    response.headers['Access-Control-Expose-Headers'] = 'X-Splat-Points, X-Quantization-Error'
+    return response
+
+
 @app.route('/files/<path:filename>')
-def serve_files(filename):
-    return send_from_directory(BASE_DIR, filename)
+@app.route('/files/v/<version>/<path:filename>')
+def serve_files(filename, version=None):
+    """服务工作区文件 (支持 Range 和条件请求)；/files/v/<version>/ 与当前版本一致时可长期缓存"""
+    return send_versioned_file(BASE_DIR, filename, version)
 
 
 @app.route('/api/settings', methods=['GET', 'POST'])
@@ -700,9 +3309,10 @@ def export_model(model_id):
     
     优化措施:
     1. PLY → .splat 格式 (每点 56 bytes → 32 bytes, 节省 43%)
+    2. 流式输出: 模板片段与 Base64 分块按顺序写出，内存占用与模型大小无关
+    3. 可选 gzip 压缩 (?compress=model|all)，页面打开时用 DecompressionStream 解压
     
     注意: 返回普通 HTML 文件 (浏览器可直接打开)
-    如需进一步压缩，请使用外部 gzip 工具
     """
     # 查找 .ply 文件
     ply_filename = f"{model_id}.ply"
@@ -711,50 +3321,73 @@ def export_model(model_id):
     if not os.path.exists(ply_path):
         return jsonify({'error': 'Model not found'}), 404
     
+    compress = request.args.get('compress', 'none')
+    if compress not in EXPORT_COMPRESS_MODES:
+        return jsonify({'error': f'Invalid compress mode: {compress}'}), 400
+    model_format = request.args.get('format', 'splat')
+    if model_format not in EXPORT_MODEL_FORMATS:
+        return jsonify({'error': f'Invalid model format: {model_format}'}), 400
+    
+    files = []
     try:
-        print(f"📦 Exporting {model_id} with optimization...")
-        
-        # 转换 PLY → .splat 格式 (更紧凑)
-        splat_data = ply_to_splat(ply_path)
-        model_data = base64.b64encode(splat_data).decode('utf-8')
+        print(f"📦 Exporting {model_id} with optimization (compress={compress}, format={model_format})...")
         
         ply_size = os.path.getsize(ply_path)
-        splat_size = len(splat_data)
-        print(f"   PLY: {ply_size / 1024 / 1024:.1f}MB → Splat: {splat_size / 1024 / 1024:.1f}MB ({100 - splat_size * 100 // ply_size}% smaller)")
-        
-        # 读取库文件并转 Base64 data URL
-        lib_dir = os.path.join(BASE_DIR, 'static', 'lib')
-        three_js_path = os.path.join(lib_dir, 'three.module.js')
-        splats_js_path = os.path.join(lib_dir, 'gaussian-splats-3d.module.js')
-        
-        with open(three_js_path, 'rb') as f:
-            three_js_b64 = base64.b64encode(f.read()).decode('utf-8')
-        with open(splats_js_path, 'rb') as f:
-            splats_js_b64 = base64.b64encode(f.read()).decode('utf-8')
-        
-        three_data_url = f"data:text/javascript;base64,{three_js_b64}"
-        splats_data_url = f"data:text/javascript;base64,{splats_js_b64}"
+        model_encoding = b'base64' if compress == 'none' else b'gzip'
+        # 提前打开文件，避免流式输出期间缓存条目被淘汰
+        if model_format == 'spz':
+            # PLY → .spz (量化并自带 gzip，无需再压缩)
+            model_file = get_cached_spz(ply_path)[0]
+            files.append(model_file)
+            spz_size = os.fstat(model_file.fileno()).st_size
+            size_log = f"   PLY: {ply_size / 1024 / 1024:.1f}MB → SPZ: {spz_size / 1024 / 1024:.1f}MB ({100 - spz_size * 100 // ply_size}% smaller)"
+            model_encoding = b'base64'
+        else:
+            # 转换 PLY → .splat 格式 (更紧凑，优先读取转换缓存)
+            model_file = get_cached_splat(ply_path)
+            files.append(model_file)
+            splat_size = os.fstat(model_file.fileno()).st_size
+            size_log = f"   PLY: {ply_size / 1024 / 1024:.1f}MB → Splat: {splat_size / 1024 / 1024:.1f}MB ({100 - splat_size * 100 // ply_size}% smaller)"
+            if compress != 'none':
+                model_file = get_cached_splat_gzip(ply_path)
+                files.append(model_file)
+                gzip_size = os.fstat(model_file.fileno()).st_size
+                size_log += (
+                    f" → Gzip: {gzip_size / 1024 / 1024:.1f}MB ({100 - gzip_size * 100 // splat_size}% smaller,"
+                    f" 打开时需在浏览器中解压 {splat_size / 1024 / 1024:.1f}MB)"
+                )
+        print(size_log)
         
-        # 读取分享模板
-        template_path = os.path.join(BASE_DIR, 'templates', 'share_template.html')
-        with open(template_path, 'r', encoding='utf-8') as f:
-            template = f.read()
+        # 预编译模板与库数据 (内存缓存，文件变化时自动失效)
+        template = load_export_asset(SHARE_TEMPLATE_PATH, compile_share_template)
+        lib_build = js_gzip_base64 if compress == 'all' else js_base64
         
-        # 替换占位符
-        html_content = template.replace('{{MODEL_DATA}}', model_data)
-        html_content = html_content.replace('{{MODEL_NAME}}', model_id)
-        html_content = html_content.replace('{{THREE_DATA_URL}}', three_data_url)
-        html_content = html_content.replace('{{SPLATS_DATA_URL}}', splats_data_url)
+        # 组装输出片段: 仅模型数据需要逐次编码
+        values = {
+            'MODEL_NAME': model_id.encode('utf-8'),
+            'MODEL_DATA': model_file,
+            'MODEL_ENCODING': model_encoding,
+            'MODEL_FORMAT': model_format.encode('ascii'),
+            'THREE_JS_DATA': load_export_asset(THREE_JS_PATH, lib_build),
+            'SPLATS_JS_DATA': load_export_asset(SPLATS_JS_PATH, lib_build),
+            'LIB_ENCODING': b'gzip' if compress == 'all' else b'base64',
+        }
+        parts = [piece if i % 2 == 0 else values[piece] for i, piece in enumerate(template)]
         
-        html_size = len(html_content.encode('utf-8'))
+        html_size = export_parts_size(parts)
         print(f"   ✅ 导出完成: {ply_size / 1024 / 1024:.1f}MB → {html_size / 1024 / 1024:.1f}MB (原始 HTML 约 {100 * ply_size // html_size}% 大小)")
         
         # 返回 HTML 文件 (可直接在浏览器打开)
-        response = Response(html_content, mimetype='text/html')
+        response = Response(iter_export_parts(parts), mimetype='text/html')
+        response.headers['Content-Length'] = str(html_size)
         response.headers['Content-Disposition'] = f'attachment; filename="{model_id}_share.html"'
+        for f in files:
+            response.call_on_close(f.close)
         return response
         
     except Exception as e:
+        for f in files:
+            f.close()
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
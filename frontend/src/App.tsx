@@ -1,7 +1,7 @@
 import { useEffect, useCallback } from 'react'
 import { useTranslation } from 'react-i18next'
 import { useAppStore } from '@/store'
-import { fetchGallery, fetchSettings, fetchTasks, generateFromImages } from '@/api'
+import { fetchGallery, fetchSettings, fetchTasks, uploadImage } from '@/api'
 import { Sidebar, Settings } from '@/components/layout'
 import { GalleryList } from '@/components/gallery'
 import { Loading } from '@/components/common'
@@ -24,8 +24,9 @@ function App() {
     sidebarOpen,
     setBootComplete, 
     setBootError,
-    setGalleryItems,
+    setGalleryPage,
     setTasks,
+    addTasks,
     setLocalAccess,
     setCurrentModel,
     setLoading,
@@ -38,8 +39,7 @@ function App() {
     async function init() {
       try {
         // Fetch gallery
-        const gallery = await fetchGallery()
-        setGalleryItems(gallery)
+        setGalleryPage(await fetchGallery())
 
         // Fetch tasks
         const tasksData = await fetchTasks()
@@ -56,28 +56,39 @@ function App() {
       }
     }
     init()
-  }, [setBootComplete, setBootError, setGalleryItems, setTasks, setLocalAccess])
+  }, [setBootComplete, setBootError, setGalleryPage, setTasks, setLocalAccess])
 
   // Handle file upload
   const handleUpload = useCallback(async (files: FileList) => {
-    try {
-      setLoading(true, t('uploadingFiles', { count: files.length }))
-      const result = await generateFromImages(files)
-      setLoading(false)
-      
-      if (result.success && result.tasks) {
-        setTasks(result.tasks, true)
+    // Upload one file at a time: each is queued as soon as it arrives, so inference overlaps the rest
+    const images = Array.from(files).filter((file) => file.type.startsWith('image/'))
+    const errors: string[] = []
+    for (let i = 0; i < images.length; i++) {
+      setLoading(true, t('uploadingFiles', { count: images.length - i }))
+      try {
+        const result = await uploadImage(images[i])
+        if (result.success && result.tasks) {
+          addTasks(result.tasks)
+        }
+      } catch (error) {
+        const message = error instanceof Error ? error.message : 'Unknown error'
+        errors.push(`${images[i].name}: ${message}`)
       }
-    } catch (error) {
-      setLoading(false)
-      const message = error instanceof Error ? error.message : 'Unknown error'
-      alert(`${t('uploadFailed')}: ${message}`)
     }
-  }, [t, setLoading, setTasks])
+    setLoading(false)
+    if (errors.length) {
+      alert(`${t('uploadFailed')}: ${errors.join('\n')}`)
+    }
+  }, [t, setLoading, addTasks])
 
   // Handle model selection
   const handleSelectModel = useCallback((item: GalleryItem) => {
-    setCurrentModel(item.id, item.model_url)
+    // Prefer the cached compact .splat over the raw PLY
+    if (item.splat_url) {
+      setCurrentModel(item.id, item.splat_url, 'splat')
+    } else {
+      setCurrentModel(item.id, item.model_url)
+    }
     
     // On mobile, close sidebar after selection
     if (window.innerWidth <= 768 && sidebarOpen) {
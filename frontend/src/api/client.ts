@@ -98,6 +98,30 @@ export async function apiPostFormData<T>(
   return response.json();
 }
 
+export async function apiPutBinary<T>(
+  url: string,
+  body: Blob,
+  timeout = 120000
+): Promise<T> {
+  const response = await fetchWithTimeout(url, {
+    method: 'PUT',
+    headers: { 'Content-Type': 'application/octet-stream' },
+    body,
+    timeout,
+  });
+  
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => null);
+    throw new ApiError(
+      errorData?.error || `HTTP error! status: ${response.status}`,
+      response.status,
+      errorData
+    );
+  }
+  
+  return response.json();
+}
+
 export async function apiDelete<T>(url: string): Promise<T> {
   const response = await fetchWithTimeout(url, {
     method: 'DELETE',
@@ -1,11 +1,18 @@
 import { apiGet, apiDelete } from './client';
-import type { GalleryItem } from '@/types';
+import type { GalleryListResponse, GalleryQuery } from '@/types';
+
+export const GALLERY_PAGE_SIZE = 50;
 
 /**
- * Fetch gallery items from API
+ * Fetch one page of gallery items (first page when no cursor is given)
  */
-export async function fetchGallery(): Promise<GalleryItem[]> {
-  return apiGet<GalleryItem[]>('/api/gallery');
+export async function fetchGallery(query: GalleryQuery = {}): Promise<GalleryListResponse> {
+  const params = new URLSearchParams({ limit: String(query.limit ?? GALLERY_PAGE_SIZE) });
+  if (query.cursor) params.set('cursor', query.cursor);
+  if (query.q) params.set('q', query.q);
+  if (query.sort) params.set('sort', query.sort);
+  if (query.order) params.set('order', query.order);
+  return apiGet<GalleryListResponse>(`/api/gallery?${params}`);
 }
 
 /**
@@ -24,11 +31,86 @@ export function downloadModel(id: string): void {
   window.location.href = `/api/download/${id}`;
 }
 
+/**
+ * Level-of-detail request for a cached .splat model
+ * (lod 0 is the coarsest prefix of the importance-sorted splats)
+ */
+export function modelLodUrl(splatUrl: string, lod: number): string {
+  const separator = splatUrl.includes('?') ? '&' : '?';
+  return `${splatUrl}${separator}lod=${lod}`;
+}
+
+// Bytes per splat in the .splat format (position, scale, color, rotation)
+const SPLAT_ROW_BYTES = 32;
+
+export interface SplatPayload {
+  blob: Blob;
+  points: number;
+  totalPoints: number;
+}
+
+/**
+ * Download a .splat model (or LOD prefix) with optional progress reporting
+ */
+export async function fetchSplat(
+  url: string,
+  signal?: AbortSignal,
+  onProgress?: (percent: number) => void
+): Promise<SplatPayload> {
+  const response = await fetch(url, { signal });
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  const points = Number(response.headers.get('X-Splat-Points')) || 0;
+  const totalPoints = Number(response.headers.get('X-Splat-Total-Points')) || points;
+  // Content-Length is the compressed size when the server sends a gzip/br variant;
+  // the decoded body is always points * SPLAT_ROW_BYTES
+  const length = points * SPLAT_ROW_BYTES || Number(response.headers.get('Content-Length')) || 0;
+  let blob: Blob;
+  if (onProgress && length && response.body) {
+    const reader = response.body.getReader();
+    const chunks: BlobPart[] = [];
+    let received = 0;
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      chunks.push(value as BlobPart);
+      received += value.length;
+      onProgress(Math.min((received / length) * 100, 100));
+    }
+    blob = new Blob(chunks);
+  } else {
+    blob = await response.blob();
+  }
+
+  return { blob, points, totalPoints };
+}
+
+/**
+ * Export compression mode
+ * - none: plain base64 payloads
+ * - model: gzip the model, decompressed in the page on open
+ * - all: gzip the model and the bundled JS libraries
+ */
+export type ExportCompression = 'none' | 'model' | 'all';
+
+/**
+ * Export model format
+ * - splat: 32 bytes per point
+ * - spz: quantized, about half the size of splat (already gzipped)
+ */
+export type ExportFormat = 'splat' | 'spz';
+
 /**
  * Export model as standalone HTML
  */
-export async function exportModel(id: string): Promise<Blob> {
-  const response = await fetch(`/api/export/${id}`);
+export async function exportModel(
+  id: string,
+  compress: ExportCompression = 'none',
+  format: ExportFormat = 'splat'
+): Promise<Blob> {
+  const response = await fetch(`/api/export/${id}?compress=${compress}&format=${format}`);
   if (!response.ok) {
     throw new Error('Export failed');
   }
@@ -1,11 +1,32 @@
-import { apiGet, apiPost, apiPostFormData } from './client';
-import type { TasksResponse, GenerateResponse } from '@/types';
+import { ApiError, apiGet, apiPost, apiPostFormData, apiPutBinary } from './client';
+import type { TasksResponse, GenerateResponse, UploadSession } from '@/types';
+
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const UPLOAD_RETRIES = 5;
+const UPLOAD_STORAGE_PREFIX = 'sharp-upload:';
+
+/**
+ * Fetch tasks with status
+ * (with `since`, only tasks changed or removed after that version)
+ */
+export async function fetchTasks(since?: number): Promise<TasksResponse> {
+  return apiGet<TasksResponse>(since === undefined ? '/api/tasks' : `/api/tasks?since=${since}`);
+}
+
+/**
+ * Fetch the full error log of a failed task
+ */
+export async function fetchTaskError(
+  taskId: string
+): Promise<{ id: string; status: string; error: string }> {
+  return apiGet(`/api/task/${taskId}/error`);
+}
 
 /**
- * Fetch all tasks with status
+ * Open the server-sent event stream of task and gallery updates
  */
-export async function fetchTasks(): Promise<TasksResponse> {
-  return apiGet<TasksResponse>('/api/tasks');
+export function openTaskEvents(): EventSource {
+  return new EventSource('/api/events');
 }
 
 /**
@@ -33,3 +54,72 @@ export async function generateFromImages(
   
   return apiPostFormData<GenerateResponse>('/api/generate', formData);
 }
+
+/**
+ * localStorage key remembering the unfinished upload of a file (resume after reload)
+ */
+function uploadStorageKey(file: File): string {
+  return `${UPLOAD_STORAGE_PREFIX}${file.name}:${file.size}:${file.lastModified}`;
+}
+
+/**
+ * Upload one image in resumable chunks; the server queues its task as soon as it is finalized.
+ * Failed chunks are retried from the offset the server actually received.
+ * The file is never read whole: the server hashes chunks as they arrive and returns the SHA-256 on finalize.
+ */
+export async function uploadImage(
+  file: File,
+  onProgress?: (loaded: number, total: number) => void
+): Promise<GenerateResponse> {
+  const key = uploadStorageKey(file);
+
+  let session: UploadSession | null = null;
+  const savedId = localStorage.getItem(key);
+  if (savedId) {
+    session = await apiGet<UploadSession>(`/api/uploads/${savedId}`).catch(() => null);
+  }
+  if (!session) {
+    session = await apiPost<UploadSession>('/api/uploads', {
+      filename: file.name,
+      size: file.size,
+    });
+    localStorage.setItem(key, session.id);
+  }
+
+  const uploadId = session.id;
+  const chunkSize = session.chunk_size || UPLOAD_CHUNK_SIZE;
+  let offset = session.offset;
+  let failures = 0;
+  while (offset < file.size) {
+    try {
+      const result = await apiPutBinary<UploadSession>(
+        `/api/uploads/${uploadId}?offset=${offset}`,
+        file.slice(offset, offset + chunkSize)
+      );
+      offset = result.offset;
+      failures = 0;
+      onProgress?.(offset, file.size);
+    } catch (error) {
+      if (++failures > UPLOAD_RETRIES) {
+        throw error;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** (failures - 1)));
+      // Continue from what the server has (a dropped chunk may be partially written)
+      offset = await apiGet<UploadSession>(`/api/uploads/${uploadId}`)
+        .then((status) => status.offset)
+        .catch(() => offset);
+    }
+  }
+
+  try {
+    const result = await apiPost<GenerateResponse>(`/api/uploads/${uploadId}/finalize`, {});
+    localStorage.removeItem(key);
+    return result;
+  } catch (error) {
+    // Rejected or expired upload: start over next time
+    if (error instanceof ApiError && (error.status === 400 || error.status === 404)) {
+      localStorage.removeItem(key);
+    }
+    throw error;
+  }
+}
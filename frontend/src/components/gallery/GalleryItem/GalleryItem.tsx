@@ -33,15 +33,21 @@ export function GalleryItem({
       className={`${styles.item} ${isActive ? styles.active : ''}`}
       onClick={onSelect}
     >
-      <img 
-        src={item.thumb_url || item.image_url} 
-        alt={item.name}
-        className={styles.thumb}
-        loading="lazy"
-        onError={(e) => {
-          (e.target as HTMLImageElement).style.background = '#eee';
-        }}
-      />
+      <picture className={styles.picture}>
+        {item.thumb_srcset?.['image/webp'] && (
+          <source type="image/webp" srcSet={item.thumb_srcset['image/webp']} />
+        )}
+        <img 
+          src={item.thumb_url || undefined} 
+          srcSet={item.thumb_srcset?.['image/jpeg']}
+          alt={item.name}
+          className={styles.thumb}
+          loading="lazy"
+          onError={(e) => {
+            (e.target as HTMLImageElement).style.background = '#eee';
+          }}
+        />
+      </picture>
       
       <div className={styles.info}>
         <div className={styles.name}>{item.name}</div>
@@ -1,6 +1,7 @@
+import { useEffect, useRef } from 'react';
 import { useTranslation } from 'react-i18next';
 import { useAppStore } from '@/store';
-import { downloadModel, deleteGalleryItem } from '@/api';
+import { downloadModel, deleteGalleryItem, fetchGallery } from '@/api';
 import { GalleryItem } from '../GalleryItem';
 import type { GalleryItem as GalleryItemType } from '@/types';
 import styles from './GalleryList.module.css';
@@ -12,7 +13,31 @@ interface GalleryListProps {
 
 export function GalleryList({ items, onSelectModel }: GalleryListProps) {
   const { t } = useTranslation();
-  const { currentModelId, setGalleryItems } = useAppStore();
+  const { currentModelId, galleryCursor, appendGalleryPage, removeGalleryItem } = useAppStore();
+  const listRef = useRef<HTMLDivElement>(null);
+  const sentinelRef = useRef<HTMLDivElement>(null);
+  const loadingPageRef = useRef(false);
+
+  // Load the next page when the end of the list scrolls into view
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!galleryCursor || !sentinel) return;
+
+    const observer = new IntersectionObserver(async (entries) => {
+      if (!entries[0].isIntersecting || loadingPageRef.current) return;
+      loadingPageRef.current = true;
+      try {
+        appendGalleryPage(await fetchGallery({ cursor: galleryCursor }));
+      } catch (error) {
+        console.error('Gallery page error:', error);
+      } finally {
+        loadingPageRef.current = false;
+      }
+    }, { root: listRef.current, rootMargin: '200px' });
+
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [galleryCursor, appendGalleryPage]);
 
   const handlePreview = (item: GalleryItemType) => {
     if (item.image_url) {
@@ -31,7 +56,7 @@ export function GalleryList({ items, onSelectModel }: GalleryListProps) {
       const result = await deleteGalleryItem(item.id);
       if (result.success) {
         // Remove from local state
-        setGalleryItems(items.filter(i => i.id !== item.id));
+        removeGalleryItem(item.id);
       } else {
         alert(`${t('deleteFailed')}: ${result.error}`);
       }
@@ -50,7 +75,7 @@ export function GalleryList({ items, onSelectModel }: GalleryListProps) {
   }
 
   return (
-    <div className={styles.list}>
+    <div className={styles.list} ref={listRef}>
       {items.map((item) => (
         <GalleryItem
           key={item.id}
@@ -62,6 +87,7 @@ export function GalleryList({ items, onSelectModel }: GalleryListProps) {
           onDelete={() => handleDelete(item)}
         />
       ))}
+      {galleryCursor && <div ref={sentinelRef} className={styles.sentinel} />}
     </div>
   );
 }
@@ -116,8 +116,9 @@ export const TaskQueue: React.FC = () => {
                         </div>
 
                         {/* Status Text */}
-                        <div className={styles.statusText}>
+                        <div className={styles.statusText} title={task.status === 'failed' ? task.error : undefined}>
                             {task.status === 'processing' && task.stage ? task.stage : task.status}
+                            {task.status === 'processing' && task.slot !== undefined && ` #${task.slot}`}
                         </div>
 
                         {/* Cancel Button */}
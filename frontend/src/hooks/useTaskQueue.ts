@@ -1,19 +1,27 @@
-import { useEffect, useRef, useCallback } from 'react';
+import { useEffect, useRef, useCallback, useState } from 'react';
 import { useAppStore } from '@/store/useAppStore';
-import { fetchTasks, fetchGallery } from '@/api';
+import { fetchTasks, fetchGallery, openTaskEvents } from '@/api';
+import type { GalleryEvent, Task, TasksResponse } from '@/types';
 
-const POLLING_INTERVAL = 3000; // 3 seconds
+const POLLING_INTERVAL = 3000; // 3 seconds (only while the event stream is down)
 
 export const useTaskQueue = () => {
     const { 
         tasks, 
         hasActiveTasks, 
         setTasks, 
-        setGalleryItems 
+        setGalleryPage,
+        upsertTask,
+        removeTask,
+        upsertGalleryItem,
+        updateGalleryItem,
+        removeGalleryItem,
     } = useAppStore();
     
     const pollingRef = useRef<ReturnType<typeof setInterval> | null>(null);
     const hasActiveRef = useRef(hasActiveTasks);
+    const versionRef = useRef<number | undefined>(undefined);
+    const [streaming, setStreaming] = useState(false);
 
     // Keep ref in sync with state
     useEffect(() => {
@@ -23,22 +31,78 @@ export const useTaskQueue = () => {
     // Polling logic
     const poll = useCallback(async () => {
         try {
-            const data = await fetchTasks();
-            setTasks(data.tasks, data.has_active);
+            const data = await fetchTasks(versionRef.current);
+            if (data.full === false) {
+                // Incremental response: apply only what changed
+                data.tasks.forEach(upsertTask);
+                data.removed?.forEach(removeTask);
+            } else {
+                setTasks(data.tasks, data.has_active);
+            }
+            versionRef.current = data.version;
 
             // If a task just completed (was active, now not), refresh gallery
             if (!data.has_active && hasActiveRef.current) {
-                const gallery = await fetchGallery();
-                setGalleryItems(gallery);
+                setGalleryPage(await fetchGallery());
             }
         } catch (error) {
             console.error('Task polling error:', error);
         }
-    }, [setTasks, setGalleryItems]);
+    }, [setTasks, setGalleryPage, upsertTask, removeTask]);
+
+    // Server-sent events: task transitions, progress and gallery changes as they happen
+    useEffect(() => {
+        if (typeof EventSource === 'undefined') return;
+
+        const source = openTaskEvents();
+        let snapshots = 0;
+
+        source.onopen = () => setStreaming(true);
+        // The browser reconnects on its own; fall back to polling in the meantime
+        source.onerror = () => setStreaming(false);
+
+        source.addEventListener('snapshot', async (event) => {
+            const data = JSON.parse(event.data) as TasksResponse;
+            setTasks(data.tasks, data.has_active);
+            versionRef.current = data.version;
+            // Reconnected: gallery events may have been missed while disconnected
+            if (snapshots++ > 0) {
+                try {
+                    setGalleryPage(await fetchGallery());
+                } catch (error) {
+                    console.error('Gallery refresh error:', error);
+                }
+            }
+        });
+        source.addEventListener('task', (event) => {
+            const task = JSON.parse(event.data) as Task;
+            upsertTask(task);
+            versionRef.current = Math.max(versionRef.current ?? 0, task.version ?? 0);
+        });
+        source.addEventListener('task_removed', (event) => {
+            removeTask((JSON.parse(event.data) as { id: string }).id);
+        });
+        source.addEventListener('gallery', (event) => {
+            const change = JSON.parse(event.data) as GalleryEvent;
+            if (change.action === 'add') {
+                upsertGalleryItem(change.item);
+            } else if (change.action === 'update') {
+                updateGalleryItem(change.item);
+            } else if (change.action === 'delete') {
+                removeGalleryItem(change.id);
+            } else {
+                fetchGallery()
+                    .then(setGalleryPage)
+                    .catch((error) => console.error('Gallery refresh error:', error));
+            }
+        });
+
+        return () => source.close();
+    }, [setTasks, setGalleryPage, upsertTask, removeTask, upsertGalleryItem, updateGalleryItem, removeGalleryItem]);
 
-    // Start/stop polling based on hasActiveTasks
+    // Poll only while there is activity and no event stream
     useEffect(() => {
-        if (hasActiveTasks) {
+        if (hasActiveTasks && !streaming) {
             // Start polling
             if (!pollingRef.current) {
                 pollingRef.current = setInterval(poll, POLLING_INTERVAL);
@@ -57,7 +121,7 @@ export const useTaskQueue = () => {
                 pollingRef.current = null;
             }
         };
-    }, [hasActiveTasks, poll]);
+    }, [hasActiveTasks, streaming, poll]);
 
     // Force refresh
     const forceRefresh = useCallback(async () => {
@@ -3,11 +3,15 @@ import * as THREE from 'three';
 import { Viewer } from '@mkkellogg/gaussian-splats-3d';
 import { useAppStore } from '@/store/useAppStore';
 import { DEFAULT_CAMERA_CONFIG } from '@/utils/camera';
+import { fetchSplat, modelLodUrl } from '@/api';
 import { useKeyboard } from './useKeyboard';
 import { useGyroscope } from './useGyroscope';
 import { useJoystick } from './useJoystick';
 import { useVR } from './useVR';
 
+// LOD requested before upgrading to the full model (see /api/model/<id>.splat?lod=)
+const COARSE_LOD = 0;
+
 export const useViewer = (containerRef: React.RefObject<HTMLDivElement | null>) => {
   const viewerRef = useRef<any>(null);
   const { 
@@ -152,81 +156,105 @@ export const useViewer = (containerRef: React.RefObject<HTMLDivElement | null>)
   }, []);
 
   // Load Model
+  // Scene add/remove calls must not overlap, so they are chained on one promise
+  const sceneOpRef = useRef<Promise<unknown>>(Promise.resolve());
+  const runSceneOp = useCallback(<T>(op: () => Promise<T>): Promise<T> => {
+    const result = sceneOpRef.current.then(op, op);
+    sceneOpRef.current = result.catch(() => undefined);
+    return result;
+  }, []);
+
   useEffect(() => {
     if (!viewerRef.current || !currentModelUrl) return;
 
+    const controller = new AbortController();
+    const viewer = viewerRef.current;
+
+    const sceneOptions = (onProgress?: (percent: number) => void): Record<string, unknown> => ({
+      showLoadingUI: false,
+      position: [0, 0, 0],
+      rotation: [0, 1, 0, 0],
+      scale: DEFAULT_CAMERA_CONFIG.modelScale,
+      // SceneFormat enum: Splat=0, KSplat=1, Ply=2, Spz=3
+      // (needed for blob URLs, the viewer can't detect format from them)
+      ...(currentModelFormat ? { format: currentModelFormat === 'ply' ? 2 : 0 } : {}),
+      ...(onProgress ? { onProgress } : {}),
+    });
+
+    const addScene = (url: string, options: Record<string, unknown>) =>
+      runSceneOp(async () => {
+        if (controller.signal.aborted) return false;
+        // Remove scenes of the previously selected model
+        const count = viewer.getSplatSceneCount ? viewer.getSplatSceneCount() : 0;
+        if (count > 0) {
+          await viewer.removeSplatScenes([...Array(count).keys()], false);
+        }
+        await viewer.addSplatScene(url, options);
+        return true;
+      });
+
+    const showScene = () => {
+      setLoading(false);
+      viewer.start();
+
+      // Apply limits and initial camera
+      applyLimits();
+      resetCamera();
+    };
+
     const load = async () => {
-      const viewer = viewerRef.current;
       // Use static text to avoid t() causing re-render loop
       setLoading(true, 'Loading Scene...');
       setLoadingProgress(0);
 
       try {
-        // Clear previous scenes
-        if (viewer.getSplatSceneCount && viewer.getSplatSceneCount() > 0) {
-           // Some versions have removeSplatScene or clear
-           // If simplistic, dispose and recreate might be safer as per original code
-        }
-        
-        // Per original code: dispose and recreate viewer to avoid overlap issues
-        // But React useEffect cleanup handles dispose. 
-        // We might just need to recreate the viewer instance if the URL changes?
-        // Or finding a way to clear. 
-        // Let's try sticking to "one viewer instance" but effectively clearing it.
-        // Actually original code said: "修复：回退到销毁重建模式，解决模型重叠问题"
-        // So maybe we should reconstruct viewer when URL changes.
-        // But useEffect dependency on `currentModelUrl` would trigger cleanup (dispose) and re-init if we put `currentModelUrl` in the init effect.
-        
-        // However, `init` effect currently only depends on `containerRef`.
-        // Let's keep `init` separate and assume we can clear or we just rely on unmount/remount if we change key of component.
-        // But `App.tsx` likely keeps `ViewerCanvas` mounted.
-        
-        // Let's implement the "Dispose and Recreate" strategy inside the load effect effectively
-        // OR better: make ViewerCanvas accept `url` as key to force remount?
-        // That's a valid React pattern. <ViewerCanvas key={url} />
-        // Let's assume the parent does that OR we handle it here.
-        
-        // If we want to use `addSplatScene`, we should try to remove old ones.
-        // Viewer has `removeSplatScene(index)`.
-        
-        // For now, let's just add. If we need to clear, we might need a reference to the scene index.
-        // Pass format parameter for blob URLs (viewer can't detect format from blob URL)
-        const sceneOptions: Record<string, unknown> = {
-          showLoadingUI: false,
-          position: [0, 0, 0],
-          rotation: [0, 1, 0, 0],
-          scale: DEFAULT_CAMERA_CONFIG.modelScale,
-          onProgress: (percent: number) => {
-             setLoadingProgress(percent);
+        // Cached .splat from the server: show a coarse LOD first, then upgrade in place
+        const progressive = currentModelFormat === 'splat' && currentModelUrl.startsWith('/api/model/');
+        if (!progressive) {
+          if (await addScene(currentModelUrl, sceneOptions(setLoadingProgress))) {
+            showScene();
           }
-        };
-        
-        // Add format hint if available (needed for blob URLs)
-        // SceneFormat enum: Splat=0, KSplat=1, Ply=2, Spz=3
-        if (currentModelFormat) {
-          sceneOptions.format = currentModelFormat === 'ply' ? 2 : 0;
+          return;
         }
-        
-        await viewer.addSplatScene(currentModelUrl, sceneOptions);
 
-        setLoading(false);
-        viewer.start();
-        
-        // Apply limits and initial camera
-        applyLimits();
-        resetCamera();
+        const coarse = await fetchSplat(
+          modelLodUrl(currentModelUrl, COARSE_LOD),
+          controller.signal,
+          setLoadingProgress
+        );
+        const coarseUrl = URL.createObjectURL(coarse.blob);
+        try {
+          if (!(await addScene(coarseUrl, sceneOptions()))) return;
+        } finally {
+          URL.revokeObjectURL(coarseUrl);
+        }
+        showScene();
 
+        if (coarse.points >= coarse.totalPoints) return;
+
+        const full = await fetchSplat(currentModelUrl, controller.signal);
+        const fullUrl = URL.createObjectURL(full.blob);
+        try {
+          // Add the full model before dropping the coarse one to avoid a blank frame
+          await runSceneOp(async () => {
+            if (controller.signal.aborted) return;
+            await viewer.addSplatScene(fullUrl, sceneOptions());
+            await viewer.removeSplatScene(0, false);
+          });
+        } finally {
+          URL.revokeObjectURL(fullUrl);
+        }
       } catch (error) {
+        if (controller.signal.aborted) return;
         console.error("Error loading model:", error);
         setLoading(false); // TODO: Set error state
       }
     };
 
     load();
+    return () => controller.abort();
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [currentModelUrl, currentModelFormat]); // Include format to ensure it's available when loading
-  // Note: We might want to "reload" viewer if URL changes. 
-  // If we follow the "recreate viewer" strategy, we should probably do that by changing the key in the parent.
 
   // Apply Limits
   const applyLimits = useCallback(() => {
@@ -1,5 +1,5 @@
 import { create } from 'zustand';
-import type { GalleryItem, Task } from '@/types';
+import type { GalleryItem, GalleryListResponse, Task } from '@/types';
 
 interface AppState {
   // UI State
@@ -20,6 +20,7 @@ interface AppState {
   
   // Gallery
   galleryItems: GalleryItem[];
+  galleryCursor: string | null; // Cursor of the next page, null when everything is loaded
   currentModelId: string | null;
   currentModelUrl: string | null;
   currentModelFormat: 'ply' | 'splat' | null; // Format hint for blob URLs
@@ -51,9 +52,17 @@ interface AppState {
   setBootError: (error: string) => void;
   
   setGalleryItems: (items: GalleryItem[]) => void;
+  setGalleryPage: (page: GalleryListResponse) => void;
+  appendGalleryPage: (page: GalleryListResponse) => void;
+  upsertGalleryItem: (item: GalleryItem) => void;
+  updateGalleryItem: (item: GalleryItem) => void;
+  removeGalleryItem: (id: string) => void;
   setCurrentModel: (id: string | null, url: string | null, format?: 'ply' | 'splat' | null) => void;
   
   setTasks: (tasks: Task[], hasActive: boolean) => void;
+  addTasks: (tasks: Task[]) => void;
+  upsertTask: (task: Task) => void;
+  removeTask: (id: string) => void;
   
   toggleLimits: () => void;
   toggleGyro: () => void;
@@ -62,6 +71,8 @@ interface AppState {
   setLocalAccess: (isLocal: boolean) => void;
 }
 
+const isActiveTask = (task: Task) => task.status === 'pending' || task.status === 'processing';
+
 export const useAppStore = create<AppState>((set) => ({
   // Initial State
   sidebarOpen: false,
@@ -78,6 +89,7 @@ export const useAppStore = create<AppState>((set) => ({
   bootError: null,
   
   galleryItems: [],
+  galleryCursor: null,
   currentModelId: null,
   currentModelUrl: null,
   currentModelFormat: null,
@@ -116,9 +128,46 @@ export const useAppStore = create<AppState>((set) => ({
   setBootError: (error) => set({ bootError: error }),
   
   setGalleryItems: (items) => set({ galleryItems: items }),
+  // First page: replaces the list
+  setGalleryPage: (page) => set({ galleryItems: page.items, galleryCursor: page.next_cursor }),
+  // Next page: skips items already pushed over the event stream
+  appendGalleryPage: (page) => set((state) => {
+    const known = new Set(state.galleryItems.map(i => i.id));
+    return {
+      galleryItems: [...state.galleryItems, ...page.items.filter(i => !known.has(i.id))],
+      galleryCursor: page.next_cursor,
+    };
+  }),
+  // Newest first: a (re)generated model moves to the top
+  upsertGalleryItem: (item) => set((state) => ({
+    galleryItems: [item, ...state.galleryItems.filter(i => i.id !== item.id)],
+  })),
+  updateGalleryItem: (item) => set((state) => ({
+    galleryItems: state.galleryItems.map(i => (i.id === item.id ? item : i)),
+  })),
+  removeGalleryItem: (id) => set((state) => ({
+    galleryItems: state.galleryItems.filter(i => i.id !== id),
+  })),
   setCurrentModel: (id, url, format = null) => set({ currentModelId: id, currentModelUrl: url, currentModelFormat: format }),
   
   setTasks: (tasks, hasActive) => set({ tasks, hasActiveTasks: hasActive }),
+  // Only adds unknown tasks, so a stale response never overrides a newer pushed update
+  addTasks: (newTasks) => set((state) => {
+    const known = new Set(state.tasks.map(t => t.id));
+    const tasks = [...newTasks.filter(t => !known.has(t.id)), ...state.tasks];
+    return { tasks, hasActiveTasks: tasks.some(isActiveTask) };
+  }),
+  upsertTask: (task) => set((state) => {
+    const exists = state.tasks.some(t => t.id === task.id);
+    const tasks = exists
+      ? state.tasks.map(t => (t.id === task.id ? task : t))
+      : [task, ...state.tasks];
+    return { tasks, hasActiveTasks: tasks.some(isActiveTask) };
+  }),
+  removeTask: (id) => set((state) => {
+    const tasks = state.tasks.filter(t => t.id !== id);
+    return { tasks, hasActiveTasks: tasks.some(isActiveTask) };
+  }),
   
   toggleLimits: () => set((state) => ({ isLimitsOn: !state.isLimitsOn })),
   toggleGyro: () => set((state) => ({ isGyroEnabled: !state.isGyroEnabled })),
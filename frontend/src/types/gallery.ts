@@ -3,13 +3,38 @@ export interface GalleryItem {
   id: string;
   name: string;
   image_url: string;
-  thumb_url?: string;
+  thumb_url?: string; // 1x JPEG thumbnail (never the full-size original)
+  thumb_srcset?: Record<string, string> | null; // srcset (1x/2x/3x density descriptors) per MIME type, e.g. 'image/webp'
+  thumb_pending?: boolean; // Thumbnail still being generated (thumb_url not set yet)
   model_url: string;
+  splat_url?: string; // Compact .splat served from the conversion cache
+  spz_url?: string; // Quantized .spz (about half the size of .splat)
   size?: number;
+  mtime?: number; // Model modification time (seconds), gallery sort key
+  version?: string; // Model version embedded in model_url / splat_url (long-lived cache)
   created_at?: string;
 }
 
-// API response for gallery list
+// Gallery change pushed over /api/events
+export type GalleryEvent =
+  | { action: 'add'; item: GalleryItem }
+  | { action: 'update'; item: GalleryItem } // Same item changed in place (e.g. thumbnail ready)
+  | { action: 'delete'; id: string }
+  | { action: 'reset' }; // Many changes at once: refetch the whole list
+
+// Gallery list query (cursor-based pagination)
+export interface GalleryQuery {
+  limit?: number;
+  cursor?: string | null; // next_cursor from the previous page
+  q?: string; // Name prefix
+  sort?: 'date' | 'size';
+  order?: 'desc' | 'asc';
+}
+
+// API response for one gallery page
 export interface GalleryListResponse {
   items: GalleryItem[];
+  next_cursor: string | null; // null on the last page
+  total: number;
+  version: number;
 }
@@ -71,7 +71,8 @@ declare module '@mkkellogg/gaussian-splats-3d' {
         
         addSplatScene(url: string, options?: any): Promise<void>;
         getSplatSceneCount(): number;
-        removeSplatScene(index: number): void;
+        removeSplatScene(index: number, showLoadingUI?: boolean): Promise<void>;
+        removeSplatScenes(indexes: number[], showLoadingUI?: boolean): Promise<void>;
         
         dispose(): void;
         start(): void;
@@ -8,19 +8,53 @@ export interface Task {
   status: TaskStatus;
   progress?: number;
   stage?: string; // e.g., "preprocessing", "training", etc.
-  error?: string;
+  slot?: number; // worker slot running this task
+  error?: string; // last line only; full log via /api/task/<id>/error
   created_at?: string;
+  version?: number; // change version of this task
+  duplicate?: boolean; // Same image content as an existing model: completed without re-running
+  preprocess?: TaskPreprocess; // Set when the input was normalized before inference
+}
+
+// Input normalization applied before inference (original image is kept as uploaded)
+export interface TaskPreprocess {
+  steps: string[]; // 'orientation' | 'resize' | 'srgb' | 'rgb'
+  original_size: [number, number];
+  size: [number, number];
+  seconds: number; // Time the normalization took when it was computed
+  cached: boolean;
+  saved_seconds?: number; // Reused from the cache: time not spent normalizing again
 }
 
 // API response for tasks
 export interface TasksResponse {
   tasks: Task[];
   has_active: boolean;
+  workers?: WorkerSlot[];
+  version?: number; // pass as ?since= to receive only later changes
+  full?: boolean; // false: tasks holds only changed tasks
+  removed?: string[]; // ids removed since the requested version
+}
+
+// Worker slot occupancy
+export interface WorkerSlot {
+  slot: number;
+  task_id: string | null;
+}
+
+// Chunked upload session (/api/uploads)
+export interface UploadSession {
+  id: string;
+  offset: number; // Bytes received so far: the next chunk starts here
+  size: number;
+  chunk_size?: number; // Suggested chunk size
+  filename?: string;
 }
 
 // Generate API response
 export interface GenerateResponse {
   success: boolean;
   tasks?: Task[];
+  duplicates?: number; // Uploads that matched existing content (no new inference)
   error?: string;
 }
@@ -43,6 +43,7 @@ mkdir "%RELEASE_DIR%"
 
 REM Copy core files
 copy app.py "%RELEASE_DIR%\" >nul
+copy sharp_predictor.py "%RELEASE_DIR%\" >nul
 copy generate_cert.py "%RELEASE_DIR%\" >nul
 copy install.sh "%RELEASE_DIR%\" >nul
 copy install.bat "%RELEASE_DIR%\" >nul
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+常驻 SHARP 预测进程: 模型只加载一次，通过 stdin/stdout 逐个接收任务
+由 app.py 启动和监管 (config.json 中 "predictor_mode": "resident")
+运行: python sharp_predictor.py [--device cuda] [--checkpoint model.pt]
+测试: python sharp_predictor.py --stand-in  (不加载模型，模拟各阶段并生成小的 PLY)
+
+协议 (每条消息占一行 JSON):
+  app → 预测进程 (stdin):
+    {"type": "job", "job": "<id>", "input": "<图片路径>", "output": "<PLY 路径>"}
+    {"type": "cancel", "job": "<id>"}
+    {"type": "shutdown"}
+  预测进程 → app (stdout, 以 "@@sharp " 开头，其余行均视为日志):
+    {"type": "ready", "pid": 123, "rss_mb": 812.5}
+    {"type": "progress", "job": "<id>", "stage": "inference"}
+    {"type": "done", "job": "<id>", "output": "<PLY 路径>", "rss_mb": 1024.0}
+    {"type": "error", "job": "<id>", "error": "..."}
+    {"type": "cancelled", "job": "<id>"}
+    {"type": "unsupported", "error": "..."}  (已安装的 sharp 缺少所需接口，进程退出，app 回退到 sharp predict 命令行)
+"""
+import argparse
+import inspect
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+
+MESSAGE_PREFIX = '@@sharp '
+
+# sharp 的日志 → 进度阶段
+STAGE_LOG_MARKERS = (
+    ('running preprocessing', 'preprocessing'),
+    ('running inference', 'inference'),
+    ('running postprocessing', 'postprocessing'),
+)
+
+# 协议消息使用原始 stdout，库的 print 输出改走 stderr
+protocol_out = sys.stdout
+sys.stdout = sys.stderr
+write_lock = threading.Lock()
+
+current_job = {'id': None}
+cancelled_jobs = set()
+
+
+class JobCancelled(Exception):
+    """任务在阶段边界处被取消"""
+
+
+class SharpUnsupported(Exception):
+    """已安装的 sharp 与常驻进程使用的内部接口不兼容"""
+
+
+def require_signature(func, positional):
+    """确认 sharp 的内部函数仍接受 positional 个位置参数，否则给出明确错误"""
+    try:
+        inspect.signature(func).bind(*range(positional))
+    except (TypeError, ValueError):
+        raise SharpUnsupported(f"{func.__module__}.{func.__qualname__} has an unsupported signature")
+
+
+def send(message):
+    """写出一条协议消息"""
+    with write_lock:
+        protocol_out.write(MESSAGE_PREFIX + json.dumps(message) + '\n')
+        protocol_out.flush()
+
+
+def stage(job_id, name):
+    """报告进度阶段；任务已被取消时在此处中止"""
+    if job_id in cancelled_jobs:
+        raise JobCancelled()
+    send({'type': 'progress', 'job': job_id, 'stage': name})
+
+
+def memory_mb():
+    """当前进程的常驻内存 (MB)，无法获取时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # macOS 上 ru_maxrss 单位为字节，Linux 上为 KB (峰值，近似当前占用)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+class StageLogHandler(logging.Handler):
+    """把 sharp 的日志 ("Running inference." 等) 转成当前任务的进度消息"""
+
+    def emit(self, record):
+        job_id = current_job['id']
+        if job_id is None:
+            return
+        text = record.getMessage().lower()
+        for marker, name in STAGE_LOG_MARKERS:
+            if marker in text:
+                stage(job_id, name)
+                break
+
+
+def load_sharp(device_name, checkpoint_path):
+    """加载 SHARP 模型，返回 run(job_id, input_path, output_path)"""
+    from pathlib import Path
+    # 常驻模式直接调用 sharp 的内部接口 (sharp predict 命令行使用的同一套函数)，
+    # 这些接口不属于公开 API，版本变化时报告 unsupported，由 app 回退到命令行
+    try:
+        import torch
+        from sharp.cli.predict import DEFAULT_MODEL_URL, predict_image
+        from sharp.models import PredictorParams, create_predictor
+        from sharp.utils import io
+        from sharp.utils.gaussians import save_ply
+    except ImportError as e:
+        raise SharpUnsupported(f"cannot import sharp internals: {e}") from e
+    require_signature(predict_image, 4)  # (predictor, image, f_px, device)
+    require_signature(io.load_rgb, 1)  # (path) -> (image, _, f_px)
+    require_signature(save_ply, 4)  # (gaussians, f_px, (height, width), path)
+
+    if device_name == 'default':
+        if torch.cuda.is_available():
+            device_name = 'cuda'
+        elif torch.backends.mps.is_available():
+            device_name = 'mps'
+        else:
+            device_name = 'cpu'
+    device = torch.device(device_name)
+
+    if checkpoint_path:
+        logging.info("Loading checkpoint from %s", checkpoint_path)
+        state_dict = torch.load(checkpoint_path, weights_only=True)
+    else:
+        logging.info("Downloading default model from %s", DEFAULT_MODEL_URL)
+        state_dict = torch.hub.load_state_dict_from_url(DEFAULT_MODEL_URL, progress=True)
+    predictor = create_predictor(PredictorParams())
+    predictor.load_state_dict(state_dict)
+    predictor.eval()
+    predictor.to(device)
+    logging.info("Model loaded on %s", device_name)
+
+    def run(job_id, input_path, output_path):
+        stage(job_id, 'processing')
+        loaded = io.load_rgb(Path(input_path))
+        if not (isinstance(loaded, tuple) and len(loaded) == 3):
+            raise SharpUnsupported("sharp.utils.io.load_rgb returned an unexpected value")
+        image, _, f_px = loaded
+        height, width = image.shape[:2]
+        gaussians = predict_image(predictor, image, f_px, device)
+        stage(job_id, 'saving')
+        save_ply(gaussians, f_px, (height, width), Path(output_path))
+
+    return run
+
+
+def load_stand_in(delay):
+    """模拟模型: 不依赖 torch，按真实阶段顺序报告进度，并用图片颜色生成一个小的 PLY"""
+    import numpy as np
+    from PIL import Image
+    from plyfile import PlyData, PlyElement
+
+    time.sleep(delay)
+
+    def run(job_id, input_path, output_path):
+        stage(job_id, 'processing')
+        with Image.open(input_path) as img:
+            img = img.convert('RGB')
+            img.thumbnail((64, 64))
+            rgb = np.asarray(img, dtype=np.float32) / 255
+        for name in ('preprocessing', 'inference', 'postprocessing'):
+            stage(job_id, name)
+            time.sleep(delay)
+        stage(job_id, 'saving')
+
+        # 每个像素一个高斯点，排布在 z = 2 的平面上
+        h, w = rgb.shape[:2]
+        v, u = np.mgrid[0:h, 0:w].astype(np.float32)
+        names = ['x', 'y', 'z', 'f_dc_0', 'f_dc_1', 'f_dc_2', 'opacity',
+                 'scale_0', 'scale_1', 'scale_2', 'rot_0', 'rot_1', 'rot_2', 'rot_3']
+        vert = np.zeros(h * w, dtype=[(name, 'f4') for name in names])
+        vert['x'] = ((u - w / 2) / w * 2).ravel()
+        vert['y'] = ((h / 2 - v) / w * 2).ravel()
+        vert['z'] = 2
+        for i in range(3):
+            vert[f'f_dc_{i}'] = ((rgb[..., i] - 0.5) / 0.28209479177387814).ravel()
+            vert[f'scale_{i}'] = np.log(1 / w)
+        vert['opacity'] = 2.2
+        vert['rot_0'] = 1
+        PlyData([PlyElement.describe(vert, 'vertex')]).write(output_path)
+
+    return run
+
+
+def read_commands(jobs):
+    """读取 stdin 上的指令；stdin 关闭 (app 退出) 时结束"""
+    for line in sys.stdin:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if message.get('type') == 'job':
+            jobs.put(message)
+        elif message.get('type') == 'cancel':
+            cancelled_jobs.add(message.get('job'))
+        elif message.get('type') == 'shutdown':
+            break
+    jobs.put(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='常驻 SHARP 预测进程')
+    parser.add_argument('--device', default='default', help='cuda / mps / cpu (默认自动选择)')
+    parser.add_argument('--checkpoint', help='模型权重路径 (默认下载官方权重)')
+    parser.add_argument('--stand-in', action='store_true', help='不加载模型，仅模拟协议和进度')
+    parser.add_argument('--stand-in-delay', type=float, default=0.5, help='模拟模式下每个阶段的耗时 (秒)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(message)s')
+    logging.getLogger().addHandler(StageLogHandler())
+
+    try:
+        if args.stand_in:
+            run = load_stand_in(args.stand_in_delay)
+        else:
+            run = load_sharp(args.device, args.checkpoint)
+    except SharpUnsupported as e:
+        logging.error("Installed sharp is not supported by the resident predictor: %s", e)
+        send({'type': 'unsupported', 'error': str(e)})
+        return 1
+
+    jobs = queue.Queue()
+    threading.Thread(target=read_commands, args=(jobs,), daemon=True).start()
+    send({'type': 'ready', 'pid': os.getpid(), 'rss_mb': memory_mb()})
+
+    while True:
+        message = jobs.get()
+        if message is None:
+            break
+        job_id = message.get('job')
+        current_job['id'] = job_id
+        try:
+            if job_id in cancelled_jobs:
+                raise JobCancelled()
+            run(job_id, message['input'], message['output'])
+            send({'type': 'done', 'job': job_id, 'output': message['output'], 'rss_mb': memory_mb()})
+        except JobCancelled:
+            send({'type': 'cancelled', 'job': job_id})
+        except Exception as e:
+            traceback.print_exc()
+            send({'type': 'error', 'job': job_id, 'error': str(e) or e.__class__.__name__})
+        finally:
+            current_job['id'] = None
+            cancelled_jobs.discard(job_id)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""测试公共夹具: 在临时工作目录中导入 app，避免读写仓库里的 config.json / inputs / outputs"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+from plyfile import PlyData, PlyElement
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PLY_PROPERTIES = ['x', 'y', 'z', 'f_dc_0', 'f_dc_1', 'f_dc_2', 'opacity',
+                  'scale_0', 'scale_1', 'scale_2', 'rot_0', 'rot_1', 'rot_2', 'rot_3']
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """以临时工作目录的配置导入 app (导入时会启动后台线程，整个测试会话只导入一次)"""
+    workspace = tmp_path_factory.mktemp('workspace')
+    config_path = workspace / 'config.json'
+    config_path.write_text(json.dumps({'workspace_folder': str(workspace)}))
+    os.environ['SHARP_CONFIG'] = str(config_path)
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def make_tasks(app_module, monkeypatch):
+    """在输入目录生成图片并登记 pending 任务 (不入队，由测试直接运行)，结束时删除输入和输出"""
+    monkeypatch.setattr(app_module, 'PREPROCESS_INPUTS', False)
+    created = []
+
+    def make(*filenames):
+        ids = []
+        for filename in filenames:
+            input_path = os.path.join(app_module.INPUT_FOLDER, filename)
+            Image.new('RGB', (8, 8)).save(input_path)
+            task_id = f'test-{filename}-{time.time_ns()}'
+            with app_module.task_lock:
+                app_module.task_status[task_id] = {
+                    'id': task_id, 'status': 'pending', 'filename': filename, 'input_path': input_path,
+                    'output_folder': app_module.OUTPUT_FOLDER, 'created_at': time.time(), 'error': None,
+                }
+            created.append(filename)
+            ids.append(task_id)
+        return ids
+
+    yield make
+    for filename in created:
+        stem = os.path.splitext(filename)[0]
+        for path in (os.path.join(app_module.INPUT_FOLDER, filename), os.path.join(app_module.OUTPUT_FOLDER, stem + '.ply')):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def task_log_text(client, task_id):
+    return client.get(f'/api/task/{task_id}/log').get_json()['text']
+
+
+def make_gaussians(count, seed=0):
+    """生成随机高斯点 (取值范围接近 sharp 输出的模型)"""
+    rng = np.random.default_rng(seed)
+    vert = np.empty(count, dtype=[(name, '<f4') for name in PLY_PROPERTIES])
+    for axis in 'xyz':
+        vert[axis] = rng.normal(0, 2, count)
+    for i in range(3):
+        vert[f'f_dc_{i}'] = rng.normal(0, 1.5, count)
+        vert[f'scale_{i}'] = rng.uniform(-7, -1, count)
+    vert['opacity'] = rng.normal(0, 3, count)
+    for i in range(4):
+        vert[f'rot_{i}'] = rng.normal(0, 1, count)
+    return vert
+
+
+def write_ply(path, vert):
+    """写出 binary_little_endian PLY (与 sharp 导出的布局一致)"""
+    PlyData([PlyElement.describe(vert, 'vertex')]).write(str(path))
+    return str(path)
@@ -0,0 +1,69 @@
+"""sharp predict 批处理: 输出归属与批次中取消任务"""
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from conftest import make_gaussians, task_log_text, write_ply
+
+# 模拟 sharp 命令行: 输出与 sharp predict 相同格式的日志，为每张图片写出一个 PLY
+FAKE_SHARP = '''#!{python}
+import os, shutil, sys, time
+args = sys.argv[1:]
+inp, out = args[args.index('-i') + 1], args[args.index('-o') + 1]
+print('INFO - No checkpoint provided. Downloading default model', flush=True)
+print('INFO - Loading checkpoint from fake', flush=True)
+files = sorted(os.listdir(inp)) if os.path.isdir(inp) else [os.path.basename(inp)]
+for name in files:
+    print('INFO - Processing', os.path.join(inp, name), flush=True)
+    for stage in ('preprocessing', 'inference', 'postprocessing'):
+        time.sleep({delay})
+        print('INFO - Running', stage, flush=True)
+    print('INFO - Saving 3DGS to', out, flush=True)
+    shutil.copy({ply!r}, os.path.join(out, os.path.splitext(name)[0] + '.ply'))
+'''
+
+
+@pytest.fixture
+def fake_sharp(tmp_path, monkeypatch):
+    import sys
+    ply = write_ply(tmp_path / 'fixture.ply', make_gaussians(100))
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'sharp'
+    script.write_text(FAKE_SHARP.format(python=sys.executable, delay=0.2, ply=ply))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='模拟的 sharp 命令是 POSIX 脚本')
+def test_download_named_file_is_not_global(app_module, client, fake_sharp, make_tasks):
+    first, second = make_tasks('download_01.jpg', 'zz_other.jpg')
+    app_module.run_batch(90, [first, second])
+    assert app_module.task_status[first]['status'] == 'completed'
+    assert app_module.task_status[second]['status'] == 'completed'
+    first_log, second_log = task_log_text(client, first), task_log_text(client, second)
+    # 模型下载/加载输出属于整批，文件的处理输出只属于对应任务
+    assert 'Loading checkpoint' in first_log and 'Loading checkpoint' in second_log
+    assert 'download_01.jpg' in first_log and 'download_01.jpg' not in second_log
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='模拟的 sharp 命令是 POSIX 脚本')
+def test_cancel_in_batch_keeps_shared_process(app_module, client, fake_sharp, make_tasks):
+    first, second, third = make_tasks('a_first.jpg', 'b_second.jpg', 'c_third.jpg')
+    runner = threading.Thread(target=app_module.run_batch, args=(91, [first, second, third]))
+    runner.start()
+    deadline = time.time() + 10
+    while app_module.task_status[second].get('stage') != 'processing' and time.time() < deadline:
+        time.sleep(0.02)
+    assert client.post(f'/api/task/{second}/cancel').get_json()['success']
+    runner.join(timeout=20)
+
+    assert app_module.task_status[first]['status'] == 'completed'
+    assert app_module.task_status[second]['status'] == 'cancelled'
+    assert app_module.task_status[third]['status'] == 'completed'  # 未重新排队，也没有重新加载模型
+    assert not os.path.exists(os.path.join(app_module.OUTPUT_FOLDER, 'b_second.ply'))
+    assert 'Loading checkpoint' in task_log_text(client, third)
+    assert task_log_text(client, third).count('Loading checkpoint') == 1
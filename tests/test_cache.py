@@ -0,0 +1,107 @@
+"""磁盘转换缓存: 每条目锁的回收与淘汰竞争"""
+import os
+import threading
+
+import pytest
+
+
+def write_bytes(data):
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+    return write
+
+
+@pytest.fixture
+def cache_path(app_module):
+    path = os.path.join(app_module.SPLAT_CACHE_FOLDER, 'test-artifact.bin')
+    yield path
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def test_key_lock_released_after_miss_and_hit(app_module, cache_path):
+    with app_module.cached_artifact(cache_path, write_bytes(b'abc')) as f:
+        assert f.read() == b'abc'
+    with app_module.cached_artifact(cache_path, write_bytes(b'unused')) as f:
+        assert f.read() == b'abc'
+    assert cache_path not in app_module.splat_cache_key_locks
+
+
+def test_key_lock_released_when_write_fails(app_module, cache_path):
+    def fail(tmp_path):
+        raise RuntimeError('conversion failed')
+
+    with pytest.raises(RuntimeError):
+        app_module.cached_artifact(cache_path, fail)
+    assert cache_path not in app_module.splat_cache_key_locks
+    assert not [name for name in os.listdir(app_module.SPLAT_CACHE_FOLDER) if name.endswith('.tmp')]
+
+
+def test_concurrent_misses_convert_once(app_module, cache_path):
+    calls = []
+    started = threading.Barrier(4)
+
+    def write(tmp_path):
+        calls.append(tmp_path)
+        write_bytes(b'data')(tmp_path)
+
+    def read():
+        started.wait()
+        with app_module.cached_artifact(cache_path, write) as f:
+            assert f.read() == b'data'
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert cache_path not in app_module.splat_cache_key_locks
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='Windows 上已打开的文件不会被淘汰删除')
+def test_evicted_after_return_is_still_readable(app_module, cache_path):
+    f = app_module.cached_artifact(cache_path, write_bytes(b'x' * 1000))
+    os.remove(cache_path)  # 模拟返回后立即被 LRU 淘汰
+    with f:
+        assert f.read() == b'x' * 1000
+
+
+def test_variants_use_their_own_budget(app_module, tmp_path, monkeypatch):
+    monkeypatch.setitem(app_module.CACHE_BUDGETS, app_module.ENCODED_CACHE_FOLDER, 0)
+    source = tmp_path / 'compressible.ply'
+    source.write_bytes(b'\0' * 100_000)
+    splat_entry = os.path.join(app_module.SPLAT_CACHE_FOLDER, 'test-budget.splat')
+    with app_module.cached_artifact(splat_entry, write_bytes(b'splat')):
+        pass
+    try:
+        app_module.build_encoded_variants(str(source))
+        # 变体目录的预算为 0，变体随即被淘汰，但 .splat 缓存不受影响
+        assert os.path.exists(splat_entry)
+        assert app_module.encoded_variant_base(str(source)).startswith(app_module.ENCODED_CACHE_FOLDER)
+    finally:
+        os.remove(splat_entry)
+
+
+def test_variant_not_worth_keeping_is_skipped(app_module, tmp_path):
+    source = tmp_path / 'random.ply'
+    source.write_bytes(os.urandom(100_000))
+    app_module.build_encoded_variants(str(source))
+    variant_path = app_module.encoded_variant_base(str(source)) + app_module.ENCODING_SUFFIXES['gzip']
+    assert not os.path.exists(variant_path)
+    assert os.path.exists(variant_path + app_module.ENCODING_SKIP_SUFFIX)
+
+    with app_module.app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        assert app_module.select_encoded_variant(str(source)) == (None, None)
+    assert str(source) not in app_module.compress_pending  # 不会重新排队压缩
+
+
+def test_compressible_variant_is_kept(app_module, tmp_path):
+    source = tmp_path / 'zeros.ply'
+    source.write_bytes(b'\0' * 100_000)
+    app_module.build_encoded_variants(str(source))
+    with app_module.app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        encoding, variant_path = app_module.select_encoded_variant(str(source))
+    assert encoding == 'gzip'
+    assert os.path.dirname(variant_path) == app_module.ENCODED_CACHE_FOLDER
@@ -0,0 +1,66 @@
+"""大模型分块转换: 分段排序顺序与内存峰值"""
+import tracemalloc
+
+import numpy as np
+
+from conftest import make_gaussians, write_ply
+
+
+class CountingKeys:
+    """包装键数组，统计读取的元素总数"""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.dtype = keys.dtype
+        self.read = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, item):
+        values = self.keys[item]
+        self.read += len(values)
+        return values
+
+
+def test_bands_match_stable_sort(app_module):
+    rng = np.random.default_rng(3)
+    keys = np.concatenate([
+        rng.integers(0, 50, 5000).astype(np.float32),  # 大量相同的键
+        (1 + rng.random(8000) * 1e-3).astype(np.float32),  # 高 16 位相同，需在桶内再分
+        np.full(3000, 2.0, dtype=np.float32),  # 完全相同的键超过一段
+        np.array([0.0, -0.0] * 2000, dtype=np.float32),
+        -rng.random(2000).astype(np.float32),
+    ])
+    keys = keys[rng.permutation(len(keys))]
+    counting = CountingKeys(keys)
+    bands = list(app_module.iter_importance_bands(counting, chunk_points=1000))
+    assert all(0 < len(band) <= 1000 for band in bands)
+    np.testing.assert_array_equal(np.concatenate(bands), np.argsort(keys, kind='stable'))
+    # 键只读取常数遍，而不是每段重新扫描一遍
+    assert counting.read <= 6 * len(keys)
+
+
+def test_chunked_conversion_memory(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'SPLAT_CHUNK_POINTS', 20_000)
+    ply_path = write_ply(tmp_path / 'large.ply', make_gaussians(300_000, seed=2))
+    vert = app_module.read_ply_vertices(ply_path)
+    assert isinstance(vert, np.memmap)
+
+    def peak(convert):
+        tracemalloc.start()
+        try:
+            with open(tmp_path / 'out.splat', 'wb') as f:
+                convert(f)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    in_memory = peak(lambda f: f.write(app_module.pack_splats(vert, app_module.splat_importance_order(vert)).tobytes()))
+    # 键完全相同的点在分块路径中按索引排序，对照使用稳定排序
+    order = np.argsort(app_module.splat_importance_key(vert), kind='stable')
+    expected = app_module.pack_splats(vert, order).tobytes()
+    chunked = peak(lambda f: app_module.write_splat_chunked(vert, f, str(tmp_path / 'keys.tmp')))
+    assert (tmp_path / 'out.splat').read_bytes() == expected
+    assert not (tmp_path / 'keys.tmp').exists()
+    assert chunked < in_memory / 4
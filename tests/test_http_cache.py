@@ -0,0 +1,98 @@
+"""模型与文件服务: Range (206/416)、If-Range、ETag (304) 与版本化 URL"""
+import os
+
+import pytest
+
+from conftest import make_gaussians, write_ply
+
+POINTS = 500
+RECORD = 32
+
+
+@pytest.fixture
+def model(app_module):
+    ply_path = write_ply(os.path.join(app_module.OUTPUT_FOLDER, 'http-cache.ply'), make_gaussians(POINTS, seed=4))
+    st = os.stat(ply_path)
+    yield 'http-cache', app_module.file_version(st.st_mtime, st.st_size)
+    app_module.discard_cached_splat(ply_path)
+    os.remove(ply_path)
+
+
+def test_splat_full_and_not_modified(client, model):
+    model_id, version = model
+    response = client.get(f'/api/model/{model_id}.splat')
+    assert response.status_code == 200
+    assert len(response.data) == POINTS * RECORD
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['X-Splat-Points'] == str(POINTS)
+    etag = response.headers['ETag']
+    assert version in etag
+    assert 'no-cache' in response.headers['Cache-Control']
+
+    response = client.get(f'/api/model/{model_id}.splat', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_splat_ranges(client, model):
+    model_id, _ = model
+    full = client.get(f'/api/model/{model_id}.splat')
+    body, etag = full.data, full.headers['ETag']
+
+    response = client.get(f'/api/model/{model_id}.splat', headers={'Range': 'bytes=32-95'})
+    assert response.status_code == 206
+    assert response.data == body[32:96]
+    assert response.headers['Content-Range'] == f'bytes 32-95/{len(body)}'
+    assert response.headers['Content-Length'] == '64'
+
+    response = client.get(f'/api/model/{model_id}.splat', headers={'Range': 'bytes=-32'})
+    assert response.status_code == 206
+    assert response.data == body[-32:]
+
+    response = client.get(f'/api/model/{model_id}.splat', headers={'Range': f'bytes={len(body)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(body)}'
+
+    # If-Range 与当前版本一致才按 Range 返回，否则返回完整内容
+    response = client.get(f'/api/model/{model_id}.splat', headers={'Range': 'bytes=0-31', 'If-Range': etag})
+    assert response.status_code == 206
+    response = client.get(f'/api/model/{model_id}.splat', headers={'Range': 'bytes=0-31', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == body
+
+
+def test_splat_prefix_has_own_etag(client, model):
+    model_id, _ = model
+    full = client.get(f'/api/model/{model_id}.splat')
+    response = client.get(f'/api/model/{model_id}.splat?max_points=10')
+    assert response.status_code == 200
+    assert response.data == full.data[:10 * RECORD]
+    assert response.headers['ETag'] != full.headers['ETag']
+    response = client.get(f'/api/model/{model_id}.splat?max_points=10', headers={'If-None-Match': full.headers['ETag']})
+    assert response.status_code == 200
+
+
+def test_versioned_url_is_immutable(client, model):
+    model_id, version = model
+    response = client.get(f'/api/model/v/{version}/{model_id}.splat')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    response = client.get(f'/api/model/v/0000000000000000/{model_id}.splat')
+    assert 'no-cache' in response.headers['Cache-Control']
+
+
+def test_download_range_and_etag(app_module, client, model):
+    model_id, version = model
+    with open(os.path.join(app_module.OUTPUT_FOLDER, f'{model_id}.ply'), 'rb') as f:
+        ply = f.read()
+    response = client.get(f'/api/download/{model_id}', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == ply[100:200]
+    assert response.headers['ETag'] == f'"{version}"'
+
+    response = client.get(f'/api/download/{model_id}', headers={'If-None-Match': f'"{version}"'})
+    assert response.status_code == 304
+
+    response = client.get(f'/api/download/{model_id}', headers={'Range': f'bytes={len(ply)}-'})
+    assert response.status_code == 416
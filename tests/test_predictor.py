@@ -0,0 +1,121 @@
+"""预测子进程: 内存上限与常驻预测进程的协议、取消和崩溃重启"""
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='内存上限仅在 POSIX 系统生效')
+def test_memory_limit_applied_before_exec(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'WORKER_MEMORY_LIMIT_MB', 4096)
+    cmd = app_module.limit_memory([sys.executable, '-c',
+                                   'import os, resource; print(os.getpid(), resource.getrlimit(resource.RLIMIT_AS)[0])'])
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = process.communicate()[0].split()
+    assert output[-2:] == [str(process.pid), str(4096 * 1024 * 1024)]  # exec 后进程号不变
+
+
+def test_no_limit_keeps_command(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'WORKER_MEMORY_LIMIT_MB', 0)
+    assert app_module.limit_memory(['sharp', 'predict']) == ['sharp', 'predict']
+
+
+# --- 常驻预测进程 (sharp_predictor.py --stand-in) ---
+
+@pytest.fixture
+def predictor(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'PREDICTOR_MODE', 'stand-in')
+    monkeypatch.setattr(app_module, 'PREDICTOR_ARGS', ['--stand-in-delay', '0.1'])
+    resident = app_module.ResidentPredictor(95)
+    assert resident.ensure_started()
+    yield resident
+    resident.stop()
+
+
+def run_async(predictor, task_id):
+    runner = threading.Thread(target=predictor.run, args=(task_id,))
+    runner.start()
+    return runner
+
+
+def wait_for_stage(app_module, task_id, stage, timeout=10):
+    deadline = time.time() + timeout
+    while app_module.task_status[task_id].get('stage') != stage:
+        assert time.time() < deadline, f'task never reached {stage}'
+        time.sleep(0.01)
+
+
+def test_resident_job_reports_progress_and_completes(app_module, predictor, make_tasks):
+    task_id, = make_tasks('resident_done.jpg')
+    stages = []
+    original = app_module.task_changed
+
+    def record(tasks, *args, **kwargs):
+        stages.extend(task.get('stage') for task in tasks if task['id'] == task_id)
+        return original(tasks, *args, **kwargs)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(app_module, 'task_changed', record)
+        predictor.run(task_id)
+    task = app_module.task_status[task_id]
+    assert task['status'] == 'completed'
+    assert os.path.exists(os.path.join(app_module.OUTPUT_FOLDER, 'resident_done.ply'))
+    progress = [s for s in stages if s in app_module.PREDICT_STAGE_PROGRESS]
+    assert progress == ['processing', 'preprocessing', 'inference', 'postprocessing', 'saving']
+    assert predictor.jobs == 1
+
+
+def test_resident_job_error(app_module, predictor, make_tasks):
+    task_id, = make_tasks('resident_error.jpg')
+    with open(app_module.task_status[task_id]['input_path'], 'w') as f:
+        f.write('not an image')
+    pid = predictor.process.pid
+    predictor.run(task_id)
+    task = app_module.task_status[task_id]
+    assert task['status'] == 'failed'
+    assert 'cannot identify image file' in task['error']
+    assert predictor.process.pid == pid  # 任务出错不影响常驻进程
+
+
+def test_resident_cancel_keeps_process(app_module, client, predictor, make_tasks):
+    cancelled, following = make_tasks('resident_cancel.jpg', 'resident_after_cancel.jpg')
+    pid = predictor.process.pid
+    runner = run_async(predictor, cancelled)
+    wait_for_stage(app_module, cancelled, 'inference')
+    assert client.post(f'/api/task/{cancelled}/cancel').get_json()['success']
+    runner.join(timeout=10)
+    assert app_module.task_status[cancelled]['status'] == 'cancelled'
+    assert not os.path.exists(os.path.join(app_module.OUTPUT_FOLDER, 'resident_cancel.ply'))
+
+    predictor.run(following)
+    assert app_module.task_status[following]['status'] == 'completed'
+    assert predictor.process.pid == pid
+
+
+def test_resident_restarts_after_crash(app_module, predictor, make_tasks):
+    crashed, following = make_tasks('resident_crash.jpg', 'resident_after_crash.jpg')
+    pid = predictor.process.pid
+    runner = run_async(predictor, crashed)
+    wait_for_stage(app_module, crashed, 'inference')
+    predictor.process.kill()
+    runner.join(timeout=10)
+    assert app_module.task_status[crashed]['status'] == 'failed'
+
+    # 崩溃后立即重启，下一个任务正常完成
+    assert predictor.process and predictor.process.pid != pid
+    predictor.run(following)
+    assert app_module.task_status[following]['status'] == 'completed'
+
+
+@pytest.mark.skipif(importlib.util.find_spec('sharp') is not None, reason='需要未安装 sharp 的环境')
+def test_missing_sharp_falls_back_to_cli(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'PREDICTOR_MODE', 'resident')
+    resident = app_module.ResidentPredictor(96)
+    assert not resident.ensure_started()
+    assert resident.start_failures == app_module.PREDICTOR_MAX_START_FAILURES
+    assert resident.process is None
+    assert not resident.ensure_started()  # 不再重试
@@ -0,0 +1,57 @@
+"""输入预处理: 并发规范化与失败时的清理"""
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def rgba_image(app_module, tmp_path):
+    path = str(tmp_path / 'preprocess-source.png')
+    Image.new('RGBA', (320, 200), (40, 120, 200, 255)).save(path)
+    digest = app_module.hash_file(path)
+    yield path
+    app_module.discard_preprocessed_input(digest)
+
+
+def temp_files(app_module):
+    return [name for name in os.listdir(app_module.PREPROCESS_CACHE_FOLDER) if name.endswith('.tmp')]
+
+
+def test_concurrent_normalization_shares_the_cache(app_module, rgba_image):
+    results, errors = [], []
+    barrier = threading.Barrier(4)
+
+    def normalize():
+        barrier.wait()
+        try:
+            results.append(app_module.get_normalized_input(rgba_image))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=normalize) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    paths = {path for path, _ in results}
+    assert len(paths) == 1 and paths != {rgba_image}
+    with Image.open(paths.pop()) as img:
+        assert img.mode == 'RGB' and img.size == (320, 200)
+    assert not temp_files(app_module)
+
+
+def test_failed_save_leaves_no_temp_file(app_module, rgba_image, monkeypatch):
+    original_save = Image.Image.save
+
+    def failing_save(self, fp, *args, **kwargs):
+        original_save(self, fp, *args, **kwargs)  # 写出部分内容后失败
+        raise OSError('disk full')
+
+    monkeypatch.setattr(Image.Image, 'save', failing_save)
+    with pytest.raises(OSError):
+        app_module.get_normalized_input(rgba_image)
+    assert not temp_files(app_module)
@@ -0,0 +1,67 @@
+"""PLY → .splat 向量化打包与原逐点实现的一致性"""
+import io
+
+import numpy as np
+import pytest
+from plyfile import PlyData
+
+from conftest import make_gaussians, write_ply
+
+
+def reference_ply_to_splat(ply_path):
+    """原逐点打包实现 (向量化之前的 ply_to_splat)，作为对照"""
+    vert = PlyData.read(ply_path)['vertex']
+    sorted_indices = np.argsort(
+        -np.exp(vert['scale_0'] + vert['scale_1'] + vert['scale_2'])
+        / (1 + np.exp(-vert['opacity']))
+    )
+    buffer = io.BytesIO()
+    SH_C0 = 0.28209479177387814
+    for idx in sorted_indices:
+        v = vert[idx]
+        buffer.write(np.array([v['x'], v['y'], v['z']], dtype=np.float32).tobytes())
+        buffer.write(np.exp(np.array([v['scale_0'], v['scale_1'], v['scale_2']], dtype=np.float32)).tobytes())
+        # 原实现在 NumPy 1.x 上的类型提升: 颜色为 float64，exp 为 float32；
+        # 显式转换为 Python float，使对照在 NumPy 2 (NEP 50) 上也按同样的精度计算
+        color = np.array([
+            0.5 + SH_C0 * float(v['f_dc_0']),
+            0.5 + SH_C0 * float(v['f_dc_1']),
+            0.5 + SH_C0 * float(v['f_dc_2']),
+            1 / (1 + float(np.exp(-v['opacity']))),
+        ])
+        buffer.write((color * 255).clip(0, 255).astype(np.uint8).tobytes())
+        rot = np.array([v['rot_0'], v['rot_1'], v['rot_2'], v['rot_3']], dtype=np.float32)
+        buffer.write(((rot / np.linalg.norm(rot)) * 128 + 128).clip(0, 255).astype(np.uint8).tobytes())
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def ply_path(tmp_path):
+    return write_ply(tmp_path / 'model.ply', make_gaussians(2000, seed=1))
+
+
+def test_pack_matches_reference(app_module, ply_path):
+    assert app_module.ply_to_splat(ply_path) == reference_ply_to_splat(ply_path)
+
+
+def test_chunked_writer_matches_reference(app_module, ply_path, tmp_path, monkeypatch):
+    # 调低阈值与分块大小，让小模型也走磁盘键 + 分段打包路径
+    monkeypatch.setattr(app_module, 'SPLAT_CHUNKED_MIN_POINTS', 1)
+    monkeypatch.setattr(app_module, 'SPLAT_CHUNK_POINTS', 300)
+    out_path = tmp_path / 'model.splat'
+    with open(out_path, 'wb') as f:
+        app_module.write_ply_as_splat(ply_path, f)
+    assert out_path.read_bytes() == reference_ply_to_splat(ply_path)
+    assert not (tmp_path / 'model.splat.keys.tmp').exists()
+
+
+def test_pack_matches_reference_at_rounding_edges(app_module, tmp_path):
+    # 这些不透明度在 float32 与 float64 下乘 255 后截断的结果相差 1
+    vert = make_gaussians(3, seed=4)
+    vert['opacity'] = [5.537328243255615, 0.9328199028968811, 4.139155387878418]
+    ply_path = write_ply(tmp_path / 'edges.ply', vert)
+    assert app_module.ply_to_splat(ply_path) == reference_ply_to_splat(ply_path)
+
+
+def test_splat_record_size(app_module, ply_path):
+    assert len(app_module.ply_to_splat(ply_path)) == 2000 * 32
@@ -0,0 +1,95 @@
+"""PLY → .spz: 按 SPZ v2 规范独立解码，与源 PLY 在量化精度内一致"""
+import gzip
+import struct
+
+import numpy as np
+import pytest
+
+from conftest import make_gaussians, write_ply
+
+POINTS = 3000
+
+
+def decode_spz(data):
+    """SPZ v2 解码 (gzip → 16 字节头 → positions / alphas / colors / scales / rotations 分块)"""
+    raw = gzip.decompress(data)
+    magic, version, count, sh_degree, fractional_bits, flags, _ = struct.unpack_from('<IIIBBBB', raw)
+    offset = 16
+
+    def take(width):
+        nonlocal offset
+        block = np.frombuffer(raw, dtype=np.uint8, count=count * width, offset=offset).reshape(count, width)
+        offset += count * width
+        return block
+
+    positions = take(9).reshape(count, 3, 3).astype(np.int32)
+    fixed = positions[:, :, 0] | (positions[:, :, 1] << 8) | (positions[:, :, 2] << 16)
+    fixed = np.where(fixed & 0x800000, fixed - (1 << 24), fixed)
+    alphas, colors, scales, rotations = take(1)[:, 0], take(3), take(3), take(3)
+    assert offset == len(raw)
+    xyz = rotations / 127.5 - 1
+    w = np.sqrt(np.maximum(0, 1 - (xyz ** 2).sum(axis=1)))
+    return {
+        'header': (magic, version, count, sh_degree, flags),
+        'fractional_bits': fractional_bits,
+        'position': fixed / (1 << fractional_bits),
+        'alpha': alphas / 255,
+        'f_dc': (colors / 255 - 0.5) / 0.15,
+        'log_scale': scales / 16 - 10,
+        'rotation': np.concatenate([w[:, None], xyz], axis=1),
+    }
+
+
+@pytest.fixture
+def fixture(tmp_path):
+    vert = make_gaussians(POINTS, seed=5)
+    return vert, write_ply(tmp_path / 'model.ply', vert)
+
+
+def columns(vert, names):
+    return np.stack([vert[name].astype(np.float64) for name in names], axis=1)
+
+
+def test_spz_round_trip(app_module, fixture, tmp_path):
+    vert, ply_path = fixture
+    with open(tmp_path / 'model.spz', 'wb') as f:
+        metrics = app_module.write_ply_as_spz(ply_path, f)
+    decoded = decode_spz((tmp_path / 'model.spz').read_bytes())
+    assert decoded['header'] == (0x5053474e, 2, POINTS, 0, 0)
+    assert metrics['points'] == POINTS
+
+    # 位置: 定点量化，误差不超过半个最小刻度
+    step = 1 / (1 << decoded['fractional_bits'])
+    assert np.abs(decoded['position'] - columns(vert, 'xyz')).max() <= step / 2 + 1e-6
+
+    # 不透明度与对数缩放: 8 位量化，误差不超过半个刻度
+    alpha = 1 / (1 + np.exp(-vert['opacity'].astype(np.float64)))
+    assert np.abs(decoded['alpha'] - alpha).max() <= 0.5 / 255 + 1e-9
+    log_scale = columns(vert, ['scale_0', 'scale_1', 'scale_2'])
+    assert np.abs(decoded['log_scale'] - log_scale).max() <= 0.5 / 16 + 1e-6
+
+    # 颜色: 在可表示范围内误差不超过半个刻度，超出范围的被截断到边界
+    f_dc = columns(vert, ['f_dc_0', 'f_dc_1', 'f_dc_2'])
+    limit = 0.5 / 0.15
+    inside = np.abs(f_dc) < limit
+    assert np.abs(decoded['f_dc'] - f_dc)[inside].max() <= 0.5 / 255 / 0.15 + 1e-6
+    assert np.all(np.abs(decoded['f_dc'][~inside]) >= limit - 1 / 255 / 0.15)
+
+    # 旋转: 同一旋转 (q 与 -q 等价)，平均角度误差很小
+    rot = columns(vert, ['rot_0', 'rot_1', 'rot_2', 'rot_3'])
+    rot /= np.linalg.norm(rot, axis=1)[:, None]
+    decoded_rot = decoded['rotation'] / np.linalg.norm(decoded['rotation'], axis=1)[:, None]
+    angle = np.degrees(2 * np.arccos(np.abs((rot * decoded_rot).sum(axis=1)).clip(0, 1)))
+    assert angle.mean() < 1.5
+    assert angle.max() < 20
+    assert metrics['rotation_max_deg'] == pytest.approx(angle.max(), abs=0.01)
+
+
+def test_spz_output_is_stable(app_module, fixture, tmp_path):
+    _, ply_path = fixture
+    outputs = []
+    for name in ('a.spz', 'b.spz'):
+        with open(tmp_path / name, 'wb') as f:
+            app_module.write_ply_as_spz(ply_path, f)
+        outputs.append((tmp_path / name).read_bytes())
+    assert outputs[0] == outputs[1]
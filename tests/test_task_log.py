@@ -0,0 +1,47 @@
+"""任务日志增量读取: 偏移量落在行中间与环形缓冲截断"""
+import pytest
+
+
+@pytest.fixture
+def log(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'TASK_LOG_TO_FILE', False)
+    monkeypatch.setattr(app_module, 'TASK_LOG_LINES', 3)
+    task_id = 'test-task-log'
+    with app_module.task_lock:
+        log = app_module.task_logs[task_id] = app_module.TaskLog(task_id)
+        for i in range(5):
+            log.append(f'line {i} ✓\n')
+    yield task_id, log
+    with app_module.task_lock:
+        app_module.task_logs.pop(task_id, None)
+
+
+def read(client, task_id, offset):
+    return client.get(f'/api/task/{task_id}/log?offset={offset}').get_json()
+
+
+def test_offset_inside_buffered_line(client, log):
+    task_id, task_log = log
+    start, line = task_log.lines[1]
+    data = read(client, task_id, start + 2)
+    assert data['text'] == line[2:] + task_log.lines[2][1]
+    assert data['offset'] == start + 2
+    assert data['next_offset'] == task_log.size
+    assert not data['truncated']
+
+
+def test_polling_from_every_offset_reassembles_buffer(client, log):
+    task_id, task_log = log
+    first = task_log.lines[0][0]
+    buffered = ''.join(line for _, line in task_log.lines).encode()
+    for offset in range(first, task_log.size + 1):
+        data = read(client, task_id, offset)
+        assert data['text'].encode() == buffered[offset - first:] or '�' in data['text']
+
+
+def test_truncated_returns_trimmed_offset(client, log):
+    task_id, task_log = log
+    data = read(client, task_id, 0)
+    assert data['truncated']
+    assert data['offset'] == task_log.lines[0][0]
+    assert data['text'] == task_log.tail()
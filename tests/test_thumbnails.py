@@ -0,0 +1,73 @@
+"""缩略图生成: 失败时的清理"""
+import os
+
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def source_image(app_module):
+    filename = 'thumb-source.jpg'
+    path = os.path.join(app_module.INPUT_FOLDER, filename)
+    Image.new('RGB', (1200, 800), (200, 120, 40)).save(path)
+    yield path, filename
+    os.remove(path)
+    stem = os.path.splitext(filename)[0]
+    for name in os.listdir(app_module.THUMBNAIL_FOLDER):
+        if name.startswith(stem):
+            os.remove(os.path.join(app_module.THUMBNAIL_FOLDER, name))
+
+
+def test_failed_save_leaves_no_temp_file(app_module, source_image, monkeypatch):
+    path, filename = source_image
+    original_save = Image.Image.save
+    calls = []
+
+    def flaky_save(self, fp, *args, **kwargs):
+        calls.append(fp)
+        if len(calls) == 2:
+            original_save(self, fp, *args, **kwargs)  # 写出部分内容后失败
+            raise OSError('disk full')
+        return original_save(self, fp, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, 'save', flaky_save)
+    assert app_module.generate_thumbnail(path, filename) is None
+    assert not [name for name in os.listdir(app_module.THUMBNAIL_FOLDER) if name.endswith('.tmp')]
+
+
+def test_thumbnail_sizes_cover_the_slot(app_module):
+    assert app_module.thumbnail_sizes(1200, 800) == {1: (60, 40), 2: (120, 80), 3: (180, 120)}
+    assert app_module.thumbnail_sizes(800, 1200) == {1: (40, 60), 2: (80, 120), 3: (120, 180)}
+    # 原图短边不足时只生成可用的倍数
+    assert app_module.thumbnail_sizes(300, 90) == {1: (133, 40), 2: (267, 80)}
+    assert app_module.thumbnail_sizes(30, 20) == {1: (60, 40)}
+
+
+def test_generated_thumbnails_and_srcset(app_module, source_image):
+    path, filename = source_image
+    stem = os.path.splitext(filename)[0]
+    assert app_module.generate_thumbnail(path, filename)
+    for scale, size in app_module.thumbnail_sizes(1200, 800).items():
+        for ext, _, _ in app_module.THUMBNAIL_FORMATS:
+            with Image.open(os.path.join(app_module.THUMBNAIL_FOLDER, app_module.thumbnail_name(stem, scale, ext))) as thumb:
+                assert thumb.size == size
+
+    image, thumb = app_module.find_gallery_images(stem)
+    item = app_module.gallery_item((stem, 0.0, 0, image, thumb))
+    for ext, _, mime in app_module.THUMBNAIL_FORMATS:
+        descriptors = [candidate.rsplit(' ', 1)[1] for candidate in item['thumb_srcset'][mime].split(', ')]
+        assert descriptors == ['1x', '2x', '3x']
+
+
+def test_stale_thumbnails_are_removed(app_module, source_image, monkeypatch):
+    path, filename = source_image
+    assert app_module.generate_thumbnail(path, filename)
+    app_module.invalidate_stale_thumbnails()  # 尺寸未变: 保留
+    assert app_module.find_gallery_images(os.path.splitext(filename)[0])[1]
+
+    monkeypatch.setattr(app_module, 'THUMBNAIL_SIZE', 64)
+    app_module.invalidate_stale_thumbnails()
+    assert app_module.find_gallery_images(os.path.splitext(filename)[0])[1] is None
+    assert os.listdir(app_module.THUMBNAIL_FOLDER) == ['.version']
+    monkeypatch.undo()
+    app_module.invalidate_stale_thumbnails()
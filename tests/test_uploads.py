@@ -0,0 +1,160 @@
+"""上传: 按内容去重的文件命名与分块断点续传"""
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def inputs(app_module):
+    """记录测试写入输入目录的文件，结束时删除"""
+    created = []
+
+    def path(name):
+        created.append(name)
+        return os.path.join(app_module.INPUT_FOLDER, name)
+
+    yield path
+    for name in created:
+        app_module.forget_upload_hashes(os.path.splitext(name)[0])
+        try:
+            os.remove(os.path.join(app_module.INPUT_FOLDER, name))
+        except OSError:
+            pass
+
+
+def stage_upload(app_module, data):
+    tmp_path = os.path.join(app_module.INPUT_FOLDER, f'.upload-test-{hashlib.md5(data).hexdigest()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    return tmp_path, hashlib.sha256(data).hexdigest()
+
+
+def test_claim_never_replaces_existing_inputs(app_module, inputs):
+    data = b'new image content'
+    tmp_path, digest = stage_upload(app_module, data)
+    # 原文件名和所有哈希后缀候选名都被其他内容占用
+    occupied = ['photo.jpg'] + [f'photo-{digest[:n]}.jpg' for n in app_module.UPLOAD_NAME_HASH_CHARS]
+    for i, name in enumerate(occupied):
+        with open(inputs(name), 'wb') as f:
+            f.write(f'other content {i}'.encode())
+
+    with app_module.upload_lock:
+        filename, duplicate = app_module.claim_upload(tmp_path, digest, 'photo.jpg')
+    inputs(filename)
+    assert not duplicate
+    assert filename not in occupied
+    assert filename.startswith('photo-') and filename.endswith('.jpg')
+    with open(os.path.join(app_module.INPUT_FOLDER, filename), 'rb') as f:
+        assert f.read() == data
+    for i, name in enumerate(occupied):
+        with open(os.path.join(app_module.INPUT_FOLDER, name), 'rb') as f:
+            assert f.read() == f'other content {i}'.encode()
+    assert not os.path.exists(tmp_path)
+
+
+def test_claim_reuses_identical_content(app_module, inputs):
+    data = b'same image content'
+    with open(inputs('same.jpg'), 'wb') as f:
+        f.write(data)
+    tmp_path, digest = stage_upload(app_module, data)
+    with app_module.upload_lock:
+        assert app_module.claim_upload(tmp_path, digest, 'same.jpg') == ('same.jpg', True)
+    assert not os.path.exists(tmp_path)
+
+
+def create(client, data, filename):
+    response = client.post('/api/uploads', json={'filename': filename, 'size': len(data)})
+    assert response.status_code == 200
+    return response.get_json()['id']
+
+
+def test_zero_byte_upload_rejected(client):
+    response = client.post('/api/uploads', json={'filename': 'empty.jpg', 'size': 0})
+    assert response.status_code == 400
+
+
+def test_restored_session_finalizes(app_module, client, inputs):
+    data = b'resumed after restart'
+    upload_id = create(client, data, 'restored.jpg')
+    assert client.put(f'/api/uploads/{upload_id}?offset=0', data=data[:5]).status_code == 200
+    # 模拟服务器重启: 内存中的会话丢失，从元数据文件恢复 (没有增量哈希)
+    with app_module.upload_lock:
+        app_module.upload_sessions.pop(upload_id)
+    assert client.get(f'/api/uploads/{upload_id}').get_json()['offset'] == 5
+    assert client.put(f'/api/uploads/{upload_id}?offset=5', data=data[5:]).status_code == 200
+    response = client.post(f'/api/uploads/{upload_id}/finalize')
+    assert response.status_code == 200
+    assert response.get_json()['sha256'] == hashlib.sha256(data).hexdigest()
+    filename = response.get_json()['tasks'][0]['filename']
+    inputs(filename)
+    with app_module.task_lock:
+        for task in response.get_json()['tasks']:
+            app_module.task_status[task['id']]['status'] = 'cancelled'  # 不让后台线程处理
+
+
+@pytest.mark.parametrize('action', ['finalize', 'abort'])
+def test_request_racing_finalize_or_abort_gets_404(app_module, client, inputs, monkeypatch, action):
+    data = b'racing upload'
+    upload_id = create(client, data, f'race-{action}.jpg')
+    client.put(f'/api/uploads/{upload_id}?offset=0', data=data)
+    # 请求在会话结束前取得了会话对象，随后才拿到会话锁
+    stale = app_module.get_upload_session(upload_id)
+    if action == 'finalize':
+        response = client.post(f'/api/uploads/{upload_id}/finalize')
+        inputs(response.get_json()['tasks'][0]['filename'])
+        with app_module.task_lock:
+            for task in response.get_json()['tasks']:
+                app_module.task_status[task['id']]['status'] = 'cancelled'
+    else:
+        assert client.delete(f'/api/uploads/{upload_id}').status_code == 200
+    monkeypatch.setattr(app_module, 'get_upload_session', lambda _: stale)
+
+    assert client.put(f'/api/uploads/{upload_id}?offset=0', data=b'x').status_code == 404
+    assert client.post(f'/api/uploads/{upload_id}/finalize').status_code == 404
+    assert client.delete(f'/api/uploads/{upload_id}').status_code == 404
+    assert client.get(f'/api/uploads/{upload_id}').status_code == 404
+
+
+def test_same_stem_different_extension_gets_its_own_model(app_module, inputs):
+    with open(inputs('stem.jpg'), 'wb') as f:
+        f.write(b'first image')
+    tmp_path, digest = stage_upload(app_module, b'second image')
+    with app_module.upload_lock:
+        filename, duplicate = app_module.claim_upload(tmp_path, digest, 'stem.png')
+    inputs(filename)
+    assert not duplicate
+    assert filename == f'stem-{digest[:app_module.UPLOAD_NAME_HASH_CHARS[0]]}.png'
+    assert os.path.splitext(filename)[0] != 'stem'
+
+
+def age_upload(app_module, upload_id):
+    old = time.time() - app_module.UPLOAD_SESSION_SECONDS - 60
+    for path in (app_module.upload_part_path(upload_id), app_module.upload_meta_path(upload_id)):
+        os.utime(path, (old, old))
+
+
+def test_cleanup_waits_for_the_session_lock(app_module, client):
+    data = b'slow upload'
+    upload_id = create(client, data, 'slow.jpg')
+    age_upload(app_module, upload_id)
+    session = app_module.get_upload_session(upload_id)
+
+    with session['lock']:  # 模拟正在写入分块的请求
+        cleanup = threading.Thread(target=app_module.cleanup_stale_uploads)
+        cleanup.start()
+        cleanup.join(0.2)
+        assert cleanup.is_alive()
+        with open(app_module.upload_part_path(upload_id), 'ab') as f:
+            f.write(data[:4])  # 分块写入刷新了修改时间
+    cleanup.join()
+    assert not session.get('closed')
+    assert client.get(f'/api/uploads/{upload_id}').get_json()['offset'] == 4
+
+    age_upload(app_module, upload_id)
+    app_module.cleanup_stale_uploads()
+    assert session.get('closed')
+    assert not os.path.exists(app_module.upload_part_path(upload_id))
+    assert client.get(f'/api/uploads/{upload_id}').status_code == 404